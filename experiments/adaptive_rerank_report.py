@@ -0,0 +1,129 @@
+"""
+Offline report: confidence-based rerank skipping and adaptive depth over train.csv.
+
+For every query the fused candidates are retrieved once. The report then scores
+the query's retrieval confidence (see confidence.py) and reranks twice: at the
+fixed depth of 20 (the baseline) and at the adaptive depth. For each skip
+threshold it prints the share of rerank LLM calls avoided, Recall@10 and its
+delta vs the baseline, and rerank prompt characters per query. Skipped queries
+are served the fused top 10. The "never" row only applies the adaptive depth.
+
+With --llm fake the reranker keeps retrieval order, so recall cannot move;
+use --llm real or replay for the quality comparison.
+
+Run from the project root:
+    python experiments/adaptive_rerank_report.py [--llm fake|real|replay] [--thresholds 0.6,0.7,0.8,0.9]
+"""
+import os
+import sys
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+from langchain_core.runnables import Runnable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.benchmark import configure_llm, CASSETTE_FILE
+from shl_recommender.src.confidence import AdaptivePolicy
+from shl_recommender.src.llm_doubles import prompt_text
+from shl_recommender.src.metrics import normalize_url, recall_at_k
+
+BASELINE_DEPTH = 20
+
+
+class PromptMeter(Runnable):
+    """Counts the characters of rerank prompts passing through to the wrapped LLM."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.rerank_chars = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, input, config=None, **kwargs):
+        text = prompt_text(input)
+        if "Available Assessments:" in text:
+            with self.lock:
+                self.rerank_chars += len(text)
+        return self.llm.invoke(input, config, **kwargs)
+
+    def take(self) -> int:
+        with self.lock:
+            chars, self.rerank_chars = self.rerank_chars, 0
+        return chars
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", choices=["fake", "real", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9")
+    parser.add_argument("--min-depth", type=int, default=10)
+    parser.add_argument("--max-depth", type=int, default=20)
+    args = parser.parse_args()
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    train_df = pd.read_csv(os.path.join(base_dir, "shl_recommender", "data", "train.csv"))
+    gt = train_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    configure_llm(engine, args.llm, args.cassette)
+    meter = PromptMeter(engine.llm)
+    engine.llm = meter
+    catalog_urls = set(normalize_url(item['url']) for item in engine.metadata)
+
+    policy = AdaptivePolicy(min_depth=args.min_depth, max_depth=args.max_depth)
+    # Fixed-depth probe: scores the confidence features without cutting the candidate list
+    retrieve_depth = max(BASELINE_DEPTH, args.max_depth)
+    engine.adaptive = AdaptivePolicy(skip_threshold=float("inf"), min_depth=retrieve_depth,
+                                     max_depth=retrieve_depth, weights=policy.weights)
+
+    rows = []
+    for query, urls in gt.items():
+        relevant = [u for u in set(normalize_url(u) for u in urls) if u in catalog_urls]
+        if not relevant:
+            continue
+        candidates, probe = engine._hybrid_search(query, retrieve_depth, top_n=10)
+        decision = policy.decide(probe.features)
+
+        def recall(results):
+            return recall_at_k([normalize_url(r['url']) for r in results], relevant, 10)
+
+        meter.take()
+        baseline = recall(engine.rerank_with_full_data(query, candidates[:BASELINE_DEPTH], top_n=10))
+        baseline_chars = meter.take()
+        adaptive = recall(engine.rerank_with_full_data(query, candidates[:decision.depth], top_n=10))
+        adaptive_chars = meter.take()
+        rows.append({
+            "query": " ".join(query.split())[:60], "confidence": decision.score, "depth": decision.depth,
+            **probe.features, "baseline": baseline, "adaptive": adaptive, "skip": recall(candidates[:10]),
+            "baseline_chars": baseline_chars, "adaptive_chars": adaptive_chars,
+        })
+    df = pd.DataFrame(rows).sort_values("confidence", ascending=False)
+
+    print(f"\n{'conf':>5s} {'agree':>5s} {'gap':>5s} {'cons':>5s} {'depth':>5s} {'base':>5s} {'adapt':>5s} "
+          f"{'skip':>5s}  query")
+    for row in df.itertuples():
+        print(f"{row.confidence:5.2f} {row.agreement:5.2f} {row.gap:5.2f} {row.constraints:5.2f} {row.depth:5d} "
+              f"{row.baseline:5.2f} {row.adaptive:5.2f} {row.skip:5.2f}  {row.query}")
+
+    baseline = df["baseline"].mean()
+    baseline_chars = df["baseline_chars"].mean()
+    print(f"\nBaseline (depth {BASELINE_DEPTH}, always rerank): Recall@10 {baseline:.4f}, "
+          f"{baseline_chars:.0f} rerank prompt chars/query")
+    print(f"\n{'threshold':>9s} {'skipped':>8s} {'recall@10':>9s} {'delta':>8s} {'chars/q':>8s} {'vs base':>8s}")
+    for threshold in [float("inf")] + sorted(thresholds):
+        skipped = df["confidence"] >= threshold
+        recall = np.where(skipped, df["skip"], df["adaptive"]).mean()
+        chars = np.where(skipped, 0, df["adaptive_chars"]).mean()
+        label = "never" if threshold == float("inf") else f"{threshold:.2f}"
+        print(f"{label:>9s} {skipped.mean():8.1%} {recall:9.4f} {recall - baseline:+8.4f} {chars:8.0f} "
+              f"{chars / max(baseline_chars, 1) - 1:+8.1%}")
+
+
+if __name__ == "__main__":
+    main()
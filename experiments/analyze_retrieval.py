@@ -2,10 +2,10 @@ import pandas as pd
 import os
 import sys
 
-# Add src to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'shl_recommender', 'src'))
+# Add project root to path (engine uses package-relative imports)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from engine import RecommendationEngine
+from shl_recommender.src.engine import RecommendationEngine
 
 def normalize_url(url):
     if not isinstance(url, str):
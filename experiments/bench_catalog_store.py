@@ -0,0 +1,129 @@
+"""
+Memory and access time of the compact catalog store (catalog_store.py) vs
+the unpickled list of dicts, on synthetic catalogs.
+
+Synthetic assessments take their test types, job levels, languages and flags
+from a random real assessment of raw_assessments.json (so label combinations
+repeat as they do in the catalog), with random names and descriptions. Memory
+is the tracemalloc size of each representation once built; access times cover
+the per-request and startup paths:
+
+    lookup     item['name'] + item.get('duration', 0) on random rows
+    rerank     rerank prompt lines for 20 candidates
+    response   /recommend response fields for 10 results
+    bm25       document_tokens() over the whole catalog (BM25 build)
+    filter     test-type filter over the whole catalog (has_any per row; the
+               store also has a columnar rows_matching())
+
+Run from the project root:
+    python experiments/bench_catalog_store.py [--sizes 10000,100000] [--repeat 5]
+"""
+import os
+import gc
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.catalog_store import CatalogStore, joined, has_any
+from shl_recommender.src.ingest import catalog_paths, document_tokens
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILTER_TYPES = {"Simulations", "Knowledge & Skills"}
+
+
+def synthetic_catalog(size: int, seed: int = 0):
+    with open(catalog_paths(os.path.join(BASE_DIR, "shl_recommender", "data"))["raw"], 'r') as f:
+        real = json.load(f)
+    words = sorted({word for item in real for word in item['description'].split()})
+    rng = random.Random(seed)
+    items = []
+    for i in range(size):
+        # Own copies of the label lists, as in an assessments.pkl written from JSON
+        template = {key: list(value) if isinstance(value, list) else value for key, value in rng.choice(real).items()}
+        items.append(dict(
+            template,
+            name=" ".join(rng.choice(words) for _ in range(rng.randint(2, 5))) + f" {i}",
+            url=f"https://www.shl.com/products/product-catalog/view/synthetic-{i}/",
+            description=" ".join(rng.choice(words) for _ in range(rng.randint(20, 60))),
+            duration=rng.choice([0, 5, 10, 15, 20, 30, 45, 60]),
+        ))
+    # Round-trip through pickle like assessments.pkl, so nothing is shared with the generator
+    return pickle.dumps(items)
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def rerank_lines(candidates):
+    return "".join(
+        f"ID {i}: {cand.get('name', 'Unknown')}\n  - Type: {joined(cand, 'test_type')}\n"
+        f"  - Duration: {cand.get('duration', 0)} mins\n  - Remote: {cand.get('remote_support', 'Unknown')}\n"
+        f"  - Description: {cand.get('description', 'No description')[:200]}\n"
+        for i, cand in enumerate(candidates))
+
+
+def workloads(metadata, rows):
+    candidates = [metadata[row] for row in rows[:20]]
+    results = [metadata[row] for row in rows[:10]]
+    return {
+        "lookup (10k)": lambda: [(metadata[row]['name'], metadata[row].get('duration', 0)) for row in rows],
+        "rerank (x100)": lambda: [rerank_lines(candidates) for _ in range(100)],
+        "response (x1000)": lambda: [[{"name": item['name'], "url": item['url'], "test_type": item['test_type']}
+                                      for item in results] for _ in range(1000)],
+        "bm25 tokens": lambda: [document_tokens(item) for item in metadata],
+        "filter": lambda: [row for row, item in enumerate(metadata) if has_any(item, 'test_type', FILTER_TYPES)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        data = synthetic_catalog(size)
+        items, dict_bytes = traced(lambda: pickle.loads(data))
+        store, store_bytes = traced(lambda: CatalogStore(pickle.loads(data)))
+        rows = np.random.default_rng(0).integers(0, size, 10000).tolist()
+
+        print(f"\n{size} assessments (pickle {len(data) / 1e6:.1f} MB)")
+        print(f"{'':18s} {'dicts':>10s} {'store':>10s} {'ratio':>7s}")
+        print(f"{'memory (MB)':18s} {dict_bytes / 1e6:10.1f} {store_bytes / 1e6:10.1f} {store_bytes / dict_bytes:7.2f}")
+        dict_loads = workloads(items, rows)
+        store_loads = workloads(store, rows)
+        for name in dict_loads:
+            dict_ms = timed(dict_loads[name], args.repeat) * 1000
+            store_ms = timed(store_loads[name], args.repeat) * 1000
+            print(f"{name + ' (ms)':18s} {dict_ms:10.2f} {store_ms:10.2f} {store_ms / dict_ms:7.2f}")
+        vectorized = timed(lambda: np.flatnonzero(store.rows_matching('test_type', FILTER_TYPES)), args.repeat)
+        print(f"{'filter, columnar':18s} {'':10s} {vectorized * 1000:10.2f}")
+        del items, store
+
+
+if __name__ == "__main__":
+    main()
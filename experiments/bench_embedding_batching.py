@@ -0,0 +1,52 @@
+"""
+Throughput of concurrent query encodes + FAISS searches with and without
+the EmbeddingBatcher, at several concurrency levels.
+
+Run from the project root:
+    python experiments/bench_embedding_batching.py
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.batching import EmbeddingBatcher
+
+CONCURRENCY = [1, 4, 8, 16, 32]
+BATCH_SIZES = [1, 8, 32]
+REQUESTS_PER_LEVEL = 200
+
+
+def measure(engine, queries, concurrency):
+    work = [queries[i % len(queries)] for i in range(REQUESTS_PER_LEVEL)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(engine.dense_scores, work))
+    return len(work) / (time.perf_counter() - start)
+
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    queries = list(pd.read_csv(os.path.join(base_dir, "shl_recommender", "data", "train.csv"))['Query'].unique())
+
+    engine = RecommendationEngine()
+    engine.dense_scores(queries[0])  # warm up
+
+    configs = [("unbatched", None)] + [
+        (f"batched max={size}", EmbeddingBatcher(engine.model, window_ms=2.0, max_batch_size=size))
+        for size in BATCH_SIZES
+    ]
+    print(f"\n{'config':20s}" + "".join(f"{f'c={c}':>10s}" for c in CONCURRENCY) + "   (queries/s)")
+    for name, batcher in configs:
+        engine.batcher = batcher
+        row = [measure(engine, queries, c) for c in CONCURRENCY]
+        print(f"{name:20s}" + "".join(f"{qps:10.1f}" for qps in row))
+
+
+if __name__ == "__main__":
+    main()
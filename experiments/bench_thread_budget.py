@@ -0,0 +1,124 @@
+"""
+Throughput and latency of the full pipeline under concurrent load for several
+CPU thread budgets (see thread_budget.py).
+
+Every budget runs in a fresh subprocess, because torch inter-op threads can
+only be set once per process. Clients call engine.recommend() in a closed
+loop; the fake LLM sleeps --llm-ms per call, so request threads spend most of
+their time waiting like they do on a real provider. "library defaults" is
+SHL_THREAD_BUDGET=0 (one torch/FAISS thread per host core). For each
+concurrency, the best point is the highest throughput whose p95 stays within
+1.5x of the lowest p95 measured at that concurrency.
+
+Run from the project root (inside the container, so the cgroup quota applies):
+    python experiments/bench_thread_budget.py [--concurrency 8,32] [--duration 20] [--batching off]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.thread_budget import available_cpus
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(spec):
+    """Load the engine under this budget and drive it with `concurrency` clients."""
+    os.environ.update(spec["env"])
+    from shl_recommender.src.engine import RecommendationEngine
+    from shl_recommender.src.llm_doubles import FakeLLM
+
+    queries = list(pd.read_csv(os.path.join(BASE_DIR, "shl_recommender", "data", "train.csv"))['Query'].unique())
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    engine.llm = FakeLLM(latency_ms=spec["llm_ms"])
+    for query in queries[:3]:
+        engine.recommend(query)  # warm up
+
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + spec["duration"]
+
+    def client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            engine.recommend(queries[i % len(queries)])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            i += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(spec["concurrency"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    print(json.dumps({
+        "throughput": len(latencies) / elapsed,
+        "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+    }))
+
+
+def budgets(cpus: int):
+    """(label, env) pairs: library defaults, then torch/FAISS thread counts around the quota."""
+    host = os.cpu_count() or cpus
+    yield "library defaults", {"SHL_THREAD_BUDGET": "0"}
+    for threads in sorted({1, max(1, cpus // 2), cpus, 2 * cpus, host}):
+        yield f"torch/faiss {threads}", {"SHL_TORCH_THREADS": str(threads), "SHL_FAISS_THREADS": str(threads)}
+    if cpus > 1:
+        yield f"torch {cpus} faiss 1", {"SHL_TORCH_THREADS": str(cpus), "SHL_FAISS_THREADS": "1"}
+    yield "auto", {}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="8,32")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per measurement")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="Fake LLM latency per call")
+    parser.add_argument("--batching", choices=["on", "off"], default="on")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    cpus = max(1, int(available_cpus()))
+    print(f"CPUs available (cgroup quota / affinity): {available_cpus():g}, host cores: {os.cpu_count()}")
+    rows = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        for label, env in budgets(cpus):
+            env = dict(env, SHL_EMBED_BATCHING="1" if args.batching == "on" else "0")
+            spec = {"env": env, "concurrency": concurrency, "duration": args.duration, "llm_ms": args.llm_ms}
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                                    capture_output=True, text=True, cwd=BASE_DIR)
+            if output.returncode != 0:
+                print(f"{label} c={concurrency} failed:\n{output.stderr[-2000:]}")
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            rows.append(dict(budget=label, concurrency=concurrency, **result))
+            print(f"{label:20s} c={concurrency:<4d} {result['throughput']:8.1f} req/s  p50 {result['p50']:7.1f} ms  "
+                  f"p95 {result['p95']:7.1f} ms  p99 {result['p99']:7.1f} ms", flush=True)
+
+    df = pd.DataFrame(rows)
+    print()
+    for concurrency, group in df.groupby("concurrency"):
+        eligible = group[group["p95"] <= 1.5 * group["p95"].min()]
+        best = eligible.loc[eligible["throughput"].idxmax()]
+        print(f"Best at c={concurrency}: {best['budget']} ({best['throughput']:.1f} req/s, p95 {best['p95']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Check the shipped expansion dictionary (data/expansion_dictionary.json): none
+of expansion.PROBE_QUERIES may be served without the LLM, and no alias may be
+a bare version string. Also prints how many train.csv/test.csv queries it
+covers. Exits 1 on failure.
+
+Run from the project root:
+    python experiments/check_expansion_dictionary.py
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.expansion import LocalExpander, load_expansion_dictionary, _VERSION_ONLY
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shl_recommender", "data")
+
+
+def main():
+    dictionary = load_expansion_dictionary(os.path.join(DATA_DIR, "expansion_dictionary.json"))
+    expander = LocalExpander.from_mined(dictionary)
+    print(f"{len(dictionary['terms'])} aliases, {len(dictionary['confident'])} confident")
+
+    failures = [f"probe covered: {query}" for query in expander.covered_probes()]
+    failures += [f"version-only alias: {alias}" for alias in dictionary["terms"] if _VERSION_ONLY.fullmatch(alias)]
+
+    queries = []
+    for split in ("train.csv", "test.csv"):
+        queries += list(pd.read_csv(os.path.join(DATA_DIR, split))['Query'].unique())
+    covered = [query for query in queries if expander.expand(query).covered]
+    print(f"train+test queries served without the LLM: {len(covered)}/{len(queries)}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Offline report: multi-field dense scoring (see field_index.py) vs the
+single-vector FAISS index over train.csv.
+
+Every query is expanded and encoded once. For the single-vector index and each
+field-weight setting, the report prints:
+- the dense-scoring latency: the FAISS search, or the field matrix multiply
+  plus weighting, each excluding the shared query encode;
+- Recall@10 of the dense scores alone;
+- Recall@10 of the fused BM25 + dense candidates, before the rerank.
+
+Expansion is off by default, since the field index is meant to need less of it.
+Field embeddings are built in memory when data/field_embeddings.npy is missing.
+
+Run from the project root:
+    python experiments/field_index_report.py [--expansion off|local|auto] [--llm fake|real|replay]
+        [--weights "name=1;name=0.5,description=0.3,metadata=0.2"]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.benchmark import configure_llm, CASSETTE_FILE
+from shl_recommender.src.field_index import parse_field_weights
+from shl_recommender.src.fusion import fuse_scores, top_k_indices
+from shl_recommender.src.metrics import normalize_url, recall_at_k
+
+DEFAULT_WEIGHTS = ("name=1;description=1;metadata=1;name=0.5,description=0.3,metadata=0.2;"
+                   "name=0.4,description=0.5,metadata=0.1;name=0.3,description=0.6,metadata=0.1")
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", choices=["fake", "real", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    parser.add_argument("--expansion", choices=["auto", "local", "off"], default="off")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="Field-weight settings separated by ';'")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions per query (best is kept)")
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    train_df = pd.read_csv(os.path.join(base_dir, "shl_recommender", "data", "train.csv"))
+    gt = train_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    engine.batcher = None
+    engine.expansion = args.expansion
+    configure_llm(engine, args.llm, args.cassette)
+    fields = engine.catalogs.default.field_index()
+    catalog_urls = [normalize_url(item['url']) for item in engine.metadata]
+
+    queries = []
+    for query, urls in gt.items():
+        relevant = [u for u in set(normalize_url(u) for u in urls) if u in set(catalog_urls)]
+        if relevant:
+            expanded = engine.expand_query(query)
+            queries.append((relevant, engine._encode([expanded]), engine.bm25_scores(expanded)))
+
+    def single(vector):
+        distances, ids = engine.index.search(vector, engine.index.ntotal)
+        return engine._distance_scores(distances[0], ids[0], len(engine.metadata))
+
+    settings = [("single vector", single)]
+    for spec in args.weights.split(";"):
+        weights = parse_field_weights(spec)
+        settings.append((spec, lambda vector, weights=weights: fields.scores(vector, weights)[0]))
+
+    def recall(scores, relevant):
+        return recall_at_k([catalog_urls[i] for i in top_k_indices(scores, 10)], relevant, 10)
+
+    print(f"\n{len(queries)} queries, expansion {args.expansion}, {len(engine.metadata)} assessments, "
+          f"field index {fields.nbytes / 1e6:.1f} MB")
+    print(f"\n{'setting':45s} {'dense ms':>8s} {'dense r@10':>10s} {'fused r@10':>10s}")
+    for label, score in settings:
+        latencies, dense_recall, fused_recall = [], [], []
+        for relevant, vector, bm25_scores in queries:
+            dense_scores, seconds = timed(lambda: score(vector), args.repeat)
+            latencies.append(seconds * 1000)
+            dense_recall.append(recall(dense_scores, relevant))
+            fused_recall.append(recall(fuse_scores(bm25_scores, np.asarray(dense_scores, dtype=np.float64),
+                                                   engine.fusion_config), relevant))
+        print(f"{label:45s} {np.median(latencies):8.3f} {np.mean(dense_recall):10.4f} {np.mean(fused_recall):10.4f}")
+
+
+if __name__ == "__main__":
+    main()
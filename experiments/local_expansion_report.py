@@ -0,0 +1,76 @@
+"""
+Offline report: how many train.csv queries the catalog-mined expansion
+dictionary serves without the LLM, and the Recall@10 delta vs always calling
+the LLM for expansion.
+
+Run from the project root:
+    python experiments/local_expansion_report.py [--llm fake|real|replay]
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.benchmark import configure_llm, CASSETTE_FILE
+from shl_recommender.src.expansion import LocalExpander, mine_expansion_dictionary
+from shl_recommender.src.metrics import normalize_url, recall_at_k
+
+
+def evaluate(engine, gt, catalog_urls):
+    recalls = {}
+    for query, urls in gt.items():
+        relevant = [u for u in set(normalize_url(u) for u in urls) if u in catalog_urls]
+        if not relevant:
+            continue
+        results = engine.recommend(query, top_n=10)
+        recalls[query] = recall_at_k([normalize_url(r['url']) for r in results], relevant, 10)
+    return recalls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", choices=["fake", "real", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    train_df = pd.read_csv(os.path.join(base_dir, "shl_recommender", "data", "train.csv"))
+    gt = train_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    configure_llm(engine, args.llm, args.cassette)
+    catalog_urls = set(normalize_url(item['url']) for item in engine.metadata)
+    expander = engine.local_expander or LocalExpander.from_mined(mine_expansion_dictionary(engine.metadata))
+
+    engine.local_expander = None
+    llm_only = evaluate(engine, gt, catalog_urls)
+    engine.local_expander = expander
+    local_first = evaluate(engine, gt, catalog_urls)
+
+    print(f"\n{'covered':8s} {'llm':>6s} {'local':>6s}  query")
+    skipped = 0
+    for query in llm_only:
+        expansion = expander.expand(query)
+        skipped += expansion.covered
+        short = " ".join(query.split())[:70]
+        print(f"{str(expansion.covered):8s} {llm_only[query]:6.2f} {local_first[query]:6.2f}  {short}")
+        if not expansion.covered and expansion.uncovered:
+            print(f"{'':23s}uncovered: {', '.join(expansion.uncovered[:8])}")
+        if not expansion.covered and expansion.unconfident:
+            print(f"{'':23s}not confident: {', '.join(expansion.unconfident[:8])}")
+
+    before = float(np.mean(list(llm_only.values())))
+    after = float(np.mean(list(local_first.values())))
+    print(f"\nServed without the LLM: {skipped}/{len(llm_only)} ({skipped / len(llm_only):.1%})")
+    print(f"Recall@10 (LLM expansion always): {before:.4f}")
+    print(f"Recall@10 (local expansion first): {after:.4f}  delta {after - before:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
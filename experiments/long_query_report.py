@@ -0,0 +1,88 @@
+"""
+Offline report: chunked scoring of long queries (see long_query.py) on the
+long job descriptions of train.csv.
+
+Each long query is retrieved with the rerank left out, once as one string (the
+old behaviour) and once per pooling setting. The report prints Recall@10 and
+Recall@20 of the fused candidates, the number of chunks scored, and the
+BM25 + encode + FAISS time per query. Expansion defaults to the local dictionary so no
+LLM is needed; --llm real or replay also exercises LLM expansion.
+
+Run from the project root:
+    python experiments/long_query_report.py [--llm fake|real|replay] [--chunk-words 64,96,128]
+"""
+import os
+import sys
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src import timing
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.benchmark import configure_llm, CASSETTE_FILE
+from shl_recommender.src.long_query import LongQueryPolicy
+from shl_recommender.src.metrics import normalize_url, recall_at_k
+
+DEPTH = 20
+
+
+def evaluate(engine, queries, policy):
+    engine.long_query = policy
+    rows = []
+    for query, relevant in queries.items():
+        with timing.collect() as timings:
+            candidates = engine.hybrid_search(query, k=DEPTH)
+        chunks = policy.chunks(query, engine.expand_query(query)) if policy is not None else None
+        urls = [normalize_url(item['url']) for item in candidates]
+        rows.append({"recall@10": recall_at_k(urls, relevant, 10), "recall@20": recall_at_k(urls, relevant, DEPTH),
+                     "chunks": len(chunks) if chunks else 1,
+                     "ms": sum(timings.get(name, 0.0) for name in ("bm25", "encode", "faiss")) * 1000})
+    return pd.DataFrame(rows).mean()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", choices=["fake", "real", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    parser.add_argument("--expansion", choices=["auto", "local", "off"], default="local")
+    parser.add_argument("--min-words", type=int, default=150)
+    parser.add_argument("--chunk-words", default="64,96,128")
+    parser.add_argument("--max-chunks", type=int, default=16)
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    train_df = pd.read_csv(os.path.join(base_dir, "shl_recommender", "data", "train.csv"))
+    gt = train_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    engine.batcher = None
+    engine.expansion = args.expansion
+    configure_llm(engine, args.llm, args.cassette)
+    catalog_urls = set(normalize_url(item['url']) for item in engine.metadata)
+
+    queries = {}
+    for query, urls in gt.items():
+        relevant = [u for u in set(normalize_url(u) for u in urls) if u in catalog_urls]
+        if relevant and len(query.split()) > args.min_words:
+            queries[query] = relevant
+    print(f"\n{len(queries)} queries longer than {args.min_words} words")
+
+    settings = [("one string", None)]
+    for chunk_words in [int(w) for w in args.chunk_words.split(",")]:
+        for pooling, top in (("max", 1), ("mean_top", 2), ("mean_top", 3)):
+            label = f"{chunk_words}w {pooling}" + (f" {top}" if pooling == "mean_top" else "")
+            settings.append((label, LongQueryPolicy(min_words=args.min_words, chunk_words=chunk_words,
+                                                    max_chunks=args.max_chunks, pooling=pooling, pool_top=top)))
+
+    print(f"\n{'setting':18s} {'recall@10':>9s} {'recall@20':>9s} {'chunks':>6s} {'ms/query':>8s}")
+    for label, policy in settings:
+        result = evaluate(engine, queries, policy)
+        print(f"{label:18s} {result['recall@10']:9.4f} {result['recall@20']:9.4f} {result['chunks']:6.1f} "
+              f"{result['ms']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
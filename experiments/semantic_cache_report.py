@@ -0,0 +1,104 @@
+"""
+Offline report: semantic cache hit rate vs Recall@10 loss.
+
+Builds a query stream from train.csv + test.csv where every query is followed
+by a few deterministic paraphrase-like variants (case/punctuation changes,
+dropped words, extra filler), computes fresh recommendations for every
+query once, then replays the stream through a SemanticCache at several
+similarity thresholds. Recall is measured on train queries (variants inherit
+the original's ground truth).
+
+Run from the project root:
+    python experiments/semantic_cache_report.py [--llm fake|real|replay]
+"""
+import os
+import re
+import sys
+import random
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.benchmark import configure_llm, CASSETTE_FILE
+from shl_recommender.src.metrics import normalize_url, recall_at_k
+from shl_recommender.src.semantic_cache import SemanticCache, extract_constraints
+
+THRESHOLDS = [0.80, 0.85, 0.90, 0.92, 0.95, 0.97, 0.99]
+FILLERS = ["Please suggest suitable assessments.", "Thanks in advance!", "What would you recommend?"]
+
+
+def make_variants(query, n, rng):
+    variants = [re.sub(r'[^\w\s]', ' ', query).lower()]
+    words = query.split()
+    for _ in range(max(0, n - 2)):
+        kept = [w for w in words if rng.random() > 0.15 or re.search(r'\d', w)]
+        variants.append(" ".join(kept))
+    variants.append(f"{query} {rng.choice(FILLERS)}")
+    return variants[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", choices=["fake", "real", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    parser.add_argument("--variants", type=int, default=3)
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(base_dir, "shl_recommender", "data")
+    train_df = pd.read_csv(os.path.join(data_dir, "train.csv"))
+    test_df = pd.read_csv(os.path.join(data_dir, "test.csv"))
+    gt = train_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    configure_llm(engine, args.llm, args.cassette)
+    catalog_urls = set(normalize_url(item['url']) for item in engine.metadata)
+
+    rng = random.Random(13)
+    stream = []  # (query, ground-truth key or None)
+    for query in list(gt.keys()) + list(test_df['Query'].unique()):
+        key = query if query in gt else None
+        stream.append((query, key))
+        stream.extend((variant, key) for variant in make_variants(query, args.variants, rng))
+
+    print(f"Computing fresh results for {len(stream)} stream queries...")
+    fresh = {q: engine.recommend(q, top_n=10) for q, _ in stream}
+    vectors = {q: engine.encode_query(q) for q, _ in stream}
+
+    def recall(results, key):
+        relevant = [u for u in set(normalize_url(u) for u in gt[key]) if u in catalog_urls]
+        return recall_at_k([normalize_url(r['url']) for r in results], relevant, 10) if relevant else None
+
+    baseline = [recall(fresh[q], key) for q, key in stream if key is not None]
+    baseline_recall = float(np.mean([r for r in baseline if r is not None]))
+
+    print(f"\n{'threshold':>10s} {'hit rate':>9s} {'recall@10':>10s} {'delta':>8s}")
+    print(f"{'no cache':>10s} {0.0:9.3f} {baseline_recall:10.4f} {0.0:8.4f}")
+    for threshold in THRESHOLDS:
+        cache = SemanticCache(len(next(iter(vectors.values()))), threshold=threshold,
+                              capacity=10000, ttl_seconds=1e9)
+        hits = 0
+        served_recalls = []
+        for query, key in stream:
+            constraints = extract_constraints(query)
+            results = cache.get(vectors[query], constraints)
+            if results is None:
+                results = fresh[query]
+                cache.put(vectors[query], constraints, results, query=query)
+            else:
+                hits += 1
+            if key is not None:
+                r = recall(results, key)
+                if r is not None:
+                    served_recalls.append(r)
+        served = float(np.mean(served_recalls))
+        print(f"{threshold:10.2f} {hits / len(stream):9.3f} {served:10.4f} {served - baseline_recall:+8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Offline report: single-shot vs windowed reranking over train.csv.
+
+Runs every query through the engine twice (SHL_RERANK_MODE single, then
+windowed) and prints rerank-stage latency percentiles, Recall@10 and how often
+each mode fell back to retrieval order. --fail-rate makes a seeded fraction of
+rerank calls fail, to compare how the two modes degrade.
+
+With --llm fake the LLM keeps retrieval order, so the recall columns only show
+what the merge does to an order-preserving ranker; use --llm real or replay
+for the quality comparison. The fake latency is a fixed cost plus a cost per
+1000 prompt characters, since prompt size is what windowing shrinks.
+
+Run from the project root:
+    python experiments/windowed_rerank_report.py [--llm fake|real|replay] [--fail-rate 0.1]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+from langchain_core.runnables import Runnable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shl_recommender.src.engine import RecommendationEngine
+from shl_recommender.src.benchmark import configure_llm, CASSETTE_FILE
+from shl_recommender.src.llm_doubles import FakeLLM, prompt_text
+from shl_recommender.src.metrics import normalize_url, recall_at_k
+from shl_recommender.src import timing
+
+
+class FlakyLLM(Runnable):
+    """Fails a seeded fraction of rerank calls; expansion calls pass through."""
+
+    def __init__(self, llm, fail_rate: float, seed: int = 0):
+        self.llm = llm
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def invoke(self, input, config=None, **kwargs):
+        if "Available Assessments:" in prompt_text(input):
+            with self.lock:
+                fail = self.rng.random() < self.fail_rate
+            if fail:
+                raise RuntimeError("injected rerank failure")
+        return self.llm.invoke(input, config, **kwargs)
+
+
+def run_mode(engine, mode, gt, catalog_urls, llm, fail_rate, seed):
+    engine.rerank_mode = mode
+    engine.llm = FlakyLLM(llm, fail_rate, seed) if fail_rate else llm
+    rerank_ms, recalls, fallbacks = [], [], 0
+    for query, urls in gt.items():
+        relevant = [u for u in set(normalize_url(u) for u in urls) if u in catalog_urls]
+        if not relevant:
+            continue
+        taken = []
+        with timing.collect() as timings:
+            results = engine.recommend(query, top_n=10, fallbacks=taken)
+        rerank_ms.append(timings.get("rerank", 0.0) * 1000)
+        recalls.append(recall_at_k([normalize_url(r['url']) for r in results], relevant, 10))
+        fallbacks += any(stage_name == "rerank" for stage_name, _ in taken)
+    return rerank_ms, recalls, fallbacks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", choices=["fake", "real", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    parser.add_argument("--fake-latency-ms", type=float, default=300.0)
+    parser.add_argument("--fake-ms-per-kchar", type=float, default=150.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of rerank calls to fail")
+    parser.add_argument("--window", type=int, default=None, help="Override SHL_RERANK_WINDOW")
+    parser.add_argument("--overlap", type=int, default=None, help="Override SHL_RERANK_OVERLAP")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    train_df = pd.read_csv(os.path.join(base_dir, "shl_recommender", "data", "train.csv"))
+    gt = train_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+
+    engine = RecommendationEngine()
+    engine.semantic_cache = None
+    if args.llm == "fake":
+        engine.llm = FakeLLM(latency_ms=args.fake_latency_ms, ms_per_kchar=args.fake_ms_per_kchar)
+    else:
+        configure_llm(engine, args.llm, args.cassette)
+    if args.window is not None:
+        engine.rerank_window = args.window
+    if args.overlap is not None:
+        engine.rerank_overlap = args.overlap
+    llm = engine.llm
+    catalog_urls = set(normalize_url(item['url']) for item in engine.metadata)
+
+    rows = {}
+    for mode in ("single", "windowed"):
+        start = time.perf_counter()
+        rows[mode] = run_mode(engine, mode, gt, catalog_urls, llm, args.fail_rate, args.seed)
+        print(f"{mode}: {len(rows[mode][0])} queries in {time.perf_counter() - start:.1f}s")
+
+    print(f"\nWindow {engine.rerank_window}, overlap {engine.rerank_overlap}, "
+          f"LLM {args.llm}, rerank fail rate {args.fail_rate:.0%}")
+    print(f"{'mode':10s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'recall@10':>10s} {'degraded':>10s}")
+    for mode, (rerank_ms, recalls, fallbacks) in rows.items():
+        p50, p95, p99 = np.percentile(rerank_ms, [50, 95, 99])
+        print(f"{mode:10s} {p50:8.0f} {p95:8.0f} {p99:8.0f} {np.mean(recalls):10.4f} "
+              f"{fallbacks:>4d}/{len(recalls):<5d}")
+    delta = np.mean(rows["windowed"][1]) - np.mean(rows["single"][1])
+    print(f"\nRecall@10 delta (windowed - single): {delta:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
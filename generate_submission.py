@@ -1,57 +1,223 @@
+"""
+Batch runner that writes submission.csv for every query in test.csv.
 
-import pandas as pd
-import sys
+Queries are deduplicated and run on a bounded worker pool; LLM calls share a
+requests-per-minute budget. Rows are appended to the output CSV as each query
+finishes and the query is recorded, with its URLs, in a checkpoint file. A rerun
+rewrites the CSV from the checkpoint and skips finished queries. A query whose LLM stages fail is retried with exponential
+backoff, then falls back to retrieval-only results.
+
+Usage:
+    python generate_submission.py [--workers 4] [--llm-rpm 30] [--fresh]
+"""
 import os
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
 
-# Add src to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'shl_recommender', 'src'))
+import pandas as pd
+from langchain_core.runnables import Runnable
 
-from engine import RecommendationEngine
+from shl_recommender.src.engine import RecommendationEngine
 
-def generate_submission():
-    # Paths
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    test_file = os.path.join(base_dir, 'shl_recommender', 'data', 'test.csv')
-    submission_file = os.path.join(base_dir, 'submission.csv')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_FILE = os.path.join(BASE_DIR, 'shl_recommender', 'data', 'test.csv')
+SUBMISSION_FILE = os.path.join(BASE_DIR, 'submission.csv')
 
-    # Load test data
-    print(f"Loading test data from {test_file}...")
-    df_test = pd.read_csv(test_file)
-    
-    # Initialize engine
-    engine = RecommendationEngine()
-    
-    submission_rows = []
-    
-    print("Starting inference...")
-    for index, row in df_test.iterrows():
-        query = row['Query']
-        print(f"Processing Query {index + 1}/{len(df_test)}: {query[:50]}...")
-        
+# Fallback reasons that mean an LLM call actually failed (worth retrying)
+FAILED_REASONS = {"error", "empty_selection"}
+
+
+class RateLimiter:
+    """Token bucket shared by all workers: at most `per_minute` acquisitions per minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self.capacity = max(1.0, per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+class RateLimitedLLM(Runnable):
+    def __init__(self, llm: Any, limiter: RateLimiter):
+        self.llm = llm
+        self.limiter = limiter
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> Any:
+        self.limiter.acquire()
+        return self.llm.invoke(input, config, **kwargs)
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict]:
+    done = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    done[entry["query"]] = entry
+    return done
+
+
+def restore_results(output_file: str, done: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """
+    URLs of every checkpointed query that can be restored: from the checkpoint entry,
+    or, for entries written before checkpoints stored URLs, from the existing CSV when
+    all of the query's rows are still there. Other queries are run again.
+    """
+    csv_urls: Dict[str, List[str]] = defaultdict(list)
+    if os.path.exists(output_file):
         try:
-            recommendations = engine.recommend(query, top_n=10)
-            
-            # Ensure we have at least 5 recommendations as per requirement (min 5, max 10)
-            # The engine returns up to top_n, so we should be good if there are enough candidates.
-            
-            for rec in recommendations:
-                submission_rows.append({
-                    'Query': query,
-                    'Assessment_url': rec.get('url', '')
-                })
-                
+            frame = pd.read_csv(output_file, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            frame = None
+        if frame is not None and {'Query', 'Assessment_url'} <= set(frame.columns):
+            for row in frame.to_dict('records'):
+                csv_urls[row['Query']].append(row['Assessment_url'])
+    restored = {}
+    for query, entry in done.items():
+        urls = entry.get("urls")
+        if urls is None:
+            urls = csv_urls.get(query)
+            if not urls or len(urls) != entry.get("results"):
+                continue
+        restored[query] = urls
+    return restored
+
+
+class SubmissionWriter:
+    """Appends rows + checkpoint entries, one query at a time, under a lock."""
+
+    def __init__(self, output_file: str, checkpoint_file: str, restored: Dict[str, List[str]]):
+        self.checkpoint_file = checkpoint_file
+        self._lock = threading.Lock()
+        # Rewritten from the restored results only: rows of queries that were written but
+        # never checkpointed (crash mid-write) are dropped
+        self._csv_file = open(output_file, 'w', newline='')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=['Query', 'Assessment_url'])
+        self._csv.writeheader()
+        for query, urls in restored.items():
+            self._csv.writerows({'Query': query, 'Assessment_url': url} for url in urls)
+        self._csv_file.flush()
+        self._checkpoint = open(checkpoint_file, 'a')
+
+    def write(self, query: str, urls: List[str], entry: Dict):
+        with self._lock:
+            self._csv.writerows({'Query': query, 'Assessment_url': url} for url in urls)
+            self._csv_file.flush()
+            os.fsync(self._csv_file.fileno())
+            self._checkpoint.write(json.dumps(entry) + "\n")
+            self._checkpoint.flush()
+            os.fsync(self._checkpoint.fileno())
+
+    def close(self):
+        self._csv_file.close()
+        self._checkpoint.close()
+
+
+def run_query(engine: RecommendationEngine, query: str, top_n: int, retries: int, backoff: float) -> Dict:
+    """Full pipeline with retries; retrieval-only results once retries are exhausted."""
+    last_error = None
+    for attempt in range(1, retries + 1):
+        fallbacks = []
+        try:
+            results = engine.recommend(query, top_n=top_n, fallbacks=fallbacks)
+            failed = [f"{stage}:{reason}" for stage, reason in fallbacks if reason in FAILED_REASONS]
+            if not failed:
+                return {"results": results, "status": "ok", "attempts": attempt}
+            last_error = ", ".join(failed)
         except Exception as e:
-            print(f"Error processing query {index + 1}: {e}")
-            # In case of error, maybe add empty rows or handle gracefully? 
-            # For now, let's just print error.
-            
-    # Create submission DataFrame
-    df_submission = pd.DataFrame(submission_rows)
-    
-    # Save to CSV
-    print(f"Saving submission to {submission_file}...")
-    df_submission.to_csv(submission_file, index=False)
-    print("Done!")
+            last_error = repr(e)
+        if attempt < retries:
+            delay = backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+            print(f"Retrying in {delay:.1f}s ({last_error}): {query[:50]}...")
+            time.sleep(delay)
+    print(f"Falling back to retrieval-only after {retries} attempts ({last_error}): {query[:50]}...")
+    results = engine.recommend(query, top_n=top_n, use_llm=False)
+    return {"results": results, "status": "retrieval_only", "attempts": retries, "error": last_error}
+
+
+def generate_submission(test_file: str = TEST_FILE, output_file: str = SUBMISSION_FILE, workers: int = 4,
+                        llm_rpm: float = 30, retries: int = 3, backoff: float = 2.0, top_n: int = 10,
+                        fresh: bool = False):
+    checkpoint_file = output_file + ".checkpoint.jsonl"
+    if fresh and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+    print(f"Loading test data from {test_file}...")
+    queries = list(dict.fromkeys(pd.read_csv(test_file)['Query']))
+    done = restore_results(output_file, load_checkpoint(checkpoint_file))
+    pending = [q for q in queries if q not in done]
+    print(f"{len(queries)} unique queries, {len(queries) - len(pending)} already done, {len(pending)} to run.")
+
+    engine = RecommendationEngine()
+    if engine.llm is not None and llm_rpm > 0:
+        # Each query makes up to two LLM calls (expand + rerank); the budget is per call
+        engine.llm = RateLimitedLLM(engine.llm, RateLimiter(llm_rpm))
+
+    writer = SubmissionWriter(output_file, checkpoint_file, done)
+    start = time.perf_counter()
+    completed = 0
+    statuses: Dict[str, int] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_query, engine, q, top_n, retries, backoff): q for q in pending}
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    # Even retrieval-only failed: leave it out of the checkpoint so a rerun retries it
+                    print(f"Error processing query {query[:50]}...: {e}")
+                    statuses["failed"] = statuses.get("failed", 0) + 1
+                    continue
+                urls = [rec.get('url', '') for rec in outcome["results"]]
+                writer.write(query, urls, {"query": query, "status": outcome["status"],
+                                           "attempts": outcome["attempts"], "results": len(urls), "urls": urls})
+                statuses[outcome["status"]] = statuses.get(outcome["status"], 0) + 1
+                completed += 1
+                elapsed = time.perf_counter() - start
+                rate = completed / elapsed
+                eta = (len(pending) - completed) / rate if rate > 0 else float('inf')
+                print(f"[{completed}/{len(pending)}] {rate * 60:.1f} queries/min, ETA {eta:.0f}s "
+                      f"({outcome['status']}): {query[:50]}...")
+    finally:
+        writer.close()
+
+    print(f"Finished {completed} queries in {time.perf_counter() - start:.1f}s: {statuses}")
+    print(f"Submission saved to {output_file} (checkpoint {checkpoint_file})")
+
 
 if __name__ == "__main__":
-    generate_submission()
+    parser = argparse.ArgumentParser(description="Generate submission.csv from test.csv.")
+    parser.add_argument("--test", default=TEST_FILE)
+    parser.add_argument("--output", default=SUBMISSION_FILE)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-rpm", type=float, default=30, help="LLM requests per minute (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=3, help="Full-pipeline attempts before retrieval-only")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Initial retry delay in seconds")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+    generate_submission(args.test, args.output, args.workers, args.llm_rpm, args.retries,
+                        args.backoff, args.top_n, args.fresh)
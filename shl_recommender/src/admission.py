@@ -0,0 +1,186 @@
+"""
+Admission control for /recommend.
+
+Sync endpoints queue on AnyIO's worker threads without bound, so under a spike
+requests wait behind slow LLM calls until their clients give up. The
+controller runs on the event loop, before a worker thread is taken:
+
+- at most `max_in_flight` requests run the full pipeline;
+- up to `max_queue` more wait (FIFO) for at most `max_queue_wait` seconds;
+- anything beyond that is shed at once: 429 when the queue is full, 503 when
+  the wait ran out, both with a Retry-After estimated from recent service times;
+- when `degrade_queue_depth` > 0 and at least that many requests are waiting,
+  new requests skip the queue and are served retrieval-only (no LLM stages),
+  at most `max_degraded` at once; beyond that they are shed with 503.
+
+Settings (environment variables, per worker process):
+    SHL_MAX_IN_FLIGHT        full-pipeline requests running at once (default 32, 0 disables admission control)
+    SHL_MAX_QUEUE            requests allowed to wait for a slot (default 64)
+    SHL_MAX_QUEUE_WAIT       seconds a request may wait before it is shed (default 5)
+    SHL_DEGRADE_QUEUE_DEPTH  queue depth at which requests are served retrieval-only (default 0 = never)
+    SHL_MAX_DEGRADED         retrieval-only requests running at once (default 32)
+"""
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+from .observability import Counter, Gauge, Histogram
+
+QUEUE_DEPTH = Gauge("shl_admission_queue_depth", "Requests waiting for an in-flight slot.")
+IN_FLIGHT = Gauge("shl_admission_in_flight", "Full-pipeline requests currently running.")
+DEGRADED_IN_FLIGHT = Gauge("shl_admission_degraded_in_flight", "Retrieval-only requests currently running.")
+SHED = Counter("shl_admission_shed_total", "Requests rejected by admission control.", ["reason"])
+DEGRADED = Counter("shl_admission_degraded_total", "Requests served retrieval-only because the queue was deep.")
+CANCELLED = Counter("shl_admission_cancelled_total", "Requests abandoned by a disconnected client.", ["phase"])
+QUEUE_WAIT = Histogram("shl_admission_queue_wait_seconds", "Time admitted requests waited for a slot.")
+
+# How often a queued request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.1
+
+
+class Overloaded(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(f"{reason} (retry after {retry_after}s)")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class Ticket:
+    """Admission decision for one request."""
+
+    def __init__(self, degraded: bool, queue_wait: float):
+        self.degraded = degraded
+        self.queue_wait = queue_wait
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 32, max_queue: int = 64, max_queue_wait: float = 5.0,
+                 degrade_queue_depth: int = 0, max_degraded: int = 32):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.degrade_queue_depth = degrade_queue_depth
+        self.max_degraded = max_degraded
+        self.in_flight = 0
+        self.degraded = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        # Exponential moving average of full-pipeline service time, for Retry-After
+        self._service_seconds = 1.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_in_flight=int(os.environ.get("SHL_MAX_IN_FLIGHT", "32")),
+            max_queue=int(os.environ.get("SHL_MAX_QUEUE", "64")),
+            max_queue_wait=float(os.environ.get("SHL_MAX_QUEUE_WAIT", "5")),
+            degrade_queue_depth=int(os.environ.get("SHL_DEGRADE_QUEUE_DEPTH", "0")),
+            max_degraded=int(os.environ.get("SHL_MAX_DEGRADED", "32")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained."""
+        backlog = (self.queue_depth + 1) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(backlog * self._service_seconds))
+
+    def _update_gauges(self):
+        QUEUE_DEPTH.set(self.queue_depth)
+        IN_FLIGHT.set(self.in_flight)
+        DEGRADED_IN_FLIGHT.set(self.degraded)
+
+    def _shed(self, status_code: int, reason: str) -> Overloaded:
+        SHED.inc(reason=reason)
+        return Overloaded(status_code, reason, self.retry_after())
+
+    def _release(self, service_seconds: float):
+        self._service_seconds = 0.8 * self._service_seconds + 0.2 * service_seconds
+        # Hand the slot straight to the oldest live waiter
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    async def _wait_for_slot(self, is_disconnected: Optional[Callable[[], Awaitable[bool]]]):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        deadline = time.monotonic() + self.max_queue_wait
+        try:
+            while not waiter.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._shed(503, "queue_timeout")
+                done, _ = await asyncio.wait({waiter}, timeout=min(remaining, DISCONNECT_POLL_SECONDS))
+                if not done and is_disconnected is not None and await is_disconnected():
+                    CANCELLED.inc(phase="queued")
+                    raise ClientDisconnected()
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self._release(self._service_seconds)
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._update_gauges()
+            raise
+
+    @asynccontextmanager
+    async def admit(self, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """
+        Yield a Ticket once the request may run; raise Overloaded when it is shed
+        and ClientDisconnected when its client went away while queued.
+        """
+        if not self.enabled:
+            yield Ticket(degraded=False, queue_wait=0.0)
+            return
+        if self.degrade_queue_depth and self.queue_depth >= self.degrade_queue_depth:
+            # Retrieval-only work is cheaper but not free: it has its own bound
+            if self.degraded >= self.max_degraded:
+                raise self._shed(503, "degraded_full")
+            DEGRADED.inc()
+            self.degraded += 1
+            self._update_gauges()
+            try:
+                yield Ticket(degraded=True, queue_wait=0.0)
+            finally:
+                self.degraded -= 1
+                self._update_gauges()
+            return
+
+        start = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+        elif self.queue_depth >= self.max_queue:
+            raise self._shed(429, "queue_full")
+        else:
+            await self._wait_for_slot(is_disconnected)
+        queue_wait = time.monotonic() - start
+        QUEUE_WAIT.observe(queue_wait)
+
+        started = time.monotonic()
+        try:
+            yield Ticket(degraded=False, queue_wait=queue_wait)
+        finally:
+            self._release(time.monotonic() - started)
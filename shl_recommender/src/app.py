@@ -1,21 +1,68 @@
 import os
+import json
+import time
+import uuid
+import hashlib
+import asyncio
+import secrets
+import threading
 import requests
 from bs4 import BeautifulSoup
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Header, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse
+from urllib.parse import urlencode
 from pydantic import BaseModel
 from typing import Optional, List
-from .engine import RecommendationEngine
+from .engine import RecommendationEngine, RequestCancelled, UnknownAssessmentError
+from .catalogs import UnknownCatalogError
+from . import timing
+from .tracing import TRACER
+from .profiling import PROFILER, MODES as PROFILE_MODES
+from . import tracing
+from .process_memory import read_memory, worker_group_memory
+from .observability import REGISTRY, CONTENT_TYPE, REQUESTS, REQUEST_LATENCY, server_timing_header
+from .admission import AdmissionController, Overloaded, ClientDisconnected, CANCELLED, DISCONNECT_POLL_SECONDS
+from .shadow import ShadowRunner
+from .llm_providers import LLMUsage
 
 app = FastAPI(title="SHL Assessment Recommender")
 
+# Shared secret for /debug endpoints and privileged request headers (unset: all disabled)
+DEBUG_TOKEN = os.environ.get("SHL_DEBUG_TOKEN")
+
 # Initialize Engine
 engine = RecommendationEngine()
 
+# Bounded in-flight limit + wait queue for /recommend (see admission.py)
+admission = AdmissionController.from_env()
+
+# Mirrors sampled requests to alternative pipeline configurations off the response path (see shadow.py)
+shadow = ShadowRunner.from_env(engine, busy=lambda: admission.queue_depth > 0)
+
+# Shared-cache lifetime of GET /recommend answers (the ETag changes with the catalog anyway)
+RECOMMEND_MAX_AGE = int(os.environ.get("SHL_RECOMMEND_MAX_AGE", "300"))
+
+@app.on_event("startup")
+def configure_threadpool():
+    # Sync endpoints and /recommend run on AnyIO's worker threads, sized by the thread budget
+    # (SHL_THREADPOOL_SIZE, else derived from the CPU quota; AnyIO's own default is 40)
+    if engine.thread_budget.enabled or os.environ.get("SHL_THREADPOOL_SIZE"):
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = engine.thread_budget.io_threads
+
 class RecommendRequest(BaseModel):
     query: Optional[str] = None
     url: Optional[str] = None
+    # Catalog id (default: individual tests); `catalogs` fans out to several and merges
+    catalog: Optional[str] = None
+    catalogs: Optional[List[str]] = None
 
 def scrape_url(url: str) -> str:
+    with timing.stage("scrape"):
+        return _scrape_url(url)
+
+def _scrape_url(url: str) -> str:
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
@@ -35,8 +82,261 @@ def health_check():
 def root():
     return {"message": "SHL Assessment Recommender API is running. Go to /docs for Swagger UI."}
 
+@app.get("/catalogs")
+def list_catalogs():
+    loaded = engine.catalogs.loaded()
+    return {
+        "default": engine.catalog_id,
+        "catalogs": [
+            {"id": catalog_id, "loaded": catalog_id in loaded, "memory_bytes": loaded.get(catalog_id)}
+            for catalog_id in engine.catalogs.available()
+        ],
+        "memory_limit_bytes": engine.catalogs.memory_limit_bytes,
+    }
+
+@app.get("/similar/{assessment_id}")
+def similar(assessment_id: str, limit: int = Query(10, ge=1, le=50), max_duration: Optional[int] = None,
+            test_type: Optional[List[str]] = Query(None), catalog: Optional[str] = None):
+    """Assessments most like this one (id = last URL segment), from the precomputed graph."""
+    start = time.perf_counter()
+    status = 200
+    try:
+        results = engine.similar(assessment_id, limit=limit, max_duration=max_duration,
+                                 test_types=test_type, catalog=catalog)
+        return [
+            {"id": item['id'], "name": item['name'], "url": item['url'], "test_type": item['test_type'],
+             "duration": item.get('duration', 0), "score": item['score']}
+            for item in results
+        ]
+    except (UnknownAssessmentError, UnknownCatalogError) as e:
+        status = 404
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    finally:
+        REQUESTS.inc(endpoint="/similar", status=status)
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint="/similar")
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def is_privileged(token: Optional[str]) -> bool:
+    return DEBUG_TOKEN is not None and token is not None and secrets.compare_digest(token, DEBUG_TOKEN)
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    if DEBUG_TOKEN is None:
+        # Debug endpoints do not exist unless a token is configured
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_privileged(x_debug_token):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Debug-Token.")
+
+@app.get("/debug/traces", dependencies=[Depends(require_debug_token)])
+def list_traces(limit: int = 50):
+    return {
+        "sample_rate": TRACER.sample_rate,
+        "buffer_size": TRACER.buffer_size,
+        "traces": [trace.summary() for trace in TRACER.recent(limit)],
+    }
+
+@app.put("/debug/traces/sampling", dependencies=[Depends(require_debug_token)])
+def set_trace_sampling(rate: float):
+    if not 0.0 <= rate <= 1.0:
+        raise HTTPException(status_code=400, detail="rate must be between 0 and 1.")
+    TRACER.sample_rate = rate
+    return {"sample_rate": TRACER.sample_rate}
+
+@app.get("/debug/traces/{request_id}", dependencies=[Depends(require_debug_token)])
+def get_trace(request_id: str):
+    trace = TRACER.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (not sampled or evicted).")
+    return trace.to_dict()
+
+@app.get("/debug/profiles", dependencies=[Depends(require_debug_token)])
+def list_profiles(limit: int = 20):
+    return {
+        "max_per_minute": PROFILER.max_per_minute,
+        "armed": PROFILER.armed(),
+        "profiles": [profile.summary() for profile in PROFILER.recent(limit)],
+    }
+
+@app.put("/debug/profiles/arm", dependencies=[Depends(require_debug_token)])
+def arm_profiling(mode: str = "wall", count: int = Query(1, ge=0, le=20)):
+    """Profile the next `count` /recommend calls (still subject to the rate limit)."""
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(PROFILE_MODES)}.")
+    PROFILER.arm(mode, count)
+    return {"armed": PROFILER.armed()}
+
+@app.get("/debug/profiles/{request_id}", dependencies=[Depends(require_debug_token)])
+def get_profile(request_id: str):
+    """cpu profiles download as pstats, wall profiles as collapsed stacks."""
+    profile = PROFILER.get(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (not profiled or evicted).")
+    media_type = "application/octet-stream" if profile.mode == "cpu" else "text/plain"
+    return Response(content=profile.data, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{profile.filename}"'})
+
+@app.get("/debug/shadow", dependencies=[Depends(require_debug_token)])
+def shadow_report():
+    """Latency, LLM usage and top-10 overlap of each shadow configuration vs the served pipeline."""
+    return shadow.report()
+
+@app.get("/debug/memory", dependencies=[Depends(require_debug_token)])
+def memory_usage():
+    """RSS/PSS of this worker and, under serve.py, of the master and all workers."""
+    master_pid = os.environ.get("SHL_MASTER_PID")
+    report = {"worker": {"pid": os.getpid(), **read_memory()}}
+    if master_pid:
+        report["group"] = worker_group_memory(int(master_pid))
+    return report
+
 @app.post("/recommend")
-def recommend(request: RecommendRequest):
+async def recommend(request: RecommendRequest, response: Response, http_request: Request,
+                    x_request_id: Optional[str] = Header(None),
+                    x_trace: Optional[str] = Header(None),
+                    x_profile: Optional[str] = Header(None),
+                    x_debug_token: Optional[str] = Header(None)):
+    return await _handle_recommend(request, response, http_request, x_request_id, x_trace, x_debug_token,
+                                   x_profile)
+
+@app.get("/recommend")
+async def recommend_get(response: Response, http_request: Request,
+                        query: str = Query(..., min_length=1),
+                        catalog: Optional[str] = None,
+                        catalogs: Optional[List[str]] = Query(None),
+                        if_none_match: Optional[str] = Header(None),
+                        x_request_id: Optional[str] = Header(None),
+                        x_trace: Optional[str] = Header(None),
+                        x_profile: Optional[str] = Header(None),
+                        x_debug_token: Optional[str] = Header(None)):
+    """
+    Cacheable variant of POST /recommend (query + catalog selection only, no `url`).
+    Non-canonical parameters redirect to the canonical URL so caches key on one form;
+    the strong ETag covers the query, the catalog index versions and the pipeline config.
+    """
+    params = canonical_recommend_params(query, catalog, catalogs)
+    if list(http_request.query_params.multi_items()) != params:
+        return RedirectResponse(f"/recommend?{urlencode(params)}", status_code=301,
+                                headers={"Cache-Control": f"public, max-age={RECOMMEND_MAX_AGE}"})
+    try:
+        etag = recommend_etag(params)
+    except UnknownCatalogError as e:
+        REQUESTS.inc(endpoint="/recommend", status=404)
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    if if_none_match and not x_profile and etag_matches(if_none_match, etag):
+        REQUESTS.inc(endpoint="/recommend", status=304)
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": recommend_cache_control()})
+
+    request = RecommendRequest(query=dict(params)["query"], catalog=dict(params).get("catalog"),
+                               catalogs=[value for key, value in params if key == "catalogs"] or None)
+    results = await _handle_recommend(request, response, http_request, x_request_id, x_trace, x_debug_token,
+                                      x_profile)
+    if isinstance(results, Response):
+        return results
+    fallbacks = response.headers.get("X-Fallbacks")
+    if fallbacks and any(not entry.endswith(":disabled") for entry in fallbacks.split(",")):
+        # Degraded answers (LLM failure, load shedding) must not be pinned in shared caches
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = recommend_cache_control()
+    return results
+
+def canonical_recommend_params(query: str, catalog: Optional[str] = None,
+                               catalogs: Optional[List[str]] = None) -> List[tuple]:
+    """Canonical GET /recommend parameters: collapsed whitespace, sorted unique catalogs, default omitted."""
+    params = [("query", " ".join(query.split()))]
+    catalog_ids = sorted(set(catalogs or [])) or ([catalog] if catalog else [])
+    if len(catalog_ids) == 1:
+        if catalog_ids[0] != engine.catalog_id:
+            params.append(("catalog", catalog_ids[0]))
+    else:
+        params.extend(("catalogs", catalog_id) for catalog_id in catalog_ids)
+    return params
+
+def recommend_etag(params: List[tuple]) -> str:
+    """Strong ETag: canonical parameters + index version of every catalog involved + pipeline config."""
+    catalog_ids = [value for key, value in params if key in ("catalog", "catalogs")] or [engine.catalog_id]
+    versions = [engine.catalogs.get(catalog_id).index_version for catalog_id in catalog_ids]
+    payload = json.dumps({"params": params, "versions": versions, "pipeline": engine.pipeline_fingerprint()})
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def recommend_cache_control() -> str:
+    return f"public, max-age={RECOMMEND_MAX_AGE}"
+
+async def _handle_recommend(request: RecommendRequest, response: Response, http_request: Request,
+                            x_request_id: Optional[str], x_trace: Optional[str], x_debug_token: Optional[str],
+                            x_profile: Optional[str] = None):
+    start = time.perf_counter()
+    status = 200
+    # Traces and profiles are stored under a server-generated id; the client's id is only recorded
+    request_id = uuid.uuid4().hex
+    response.headers["X-Request-ID"] = request_id
+    force_trace = x_trace == "1" and is_privileged(x_debug_token)
+    # X-Profile: cpu|wall, honoured only with a valid X-Debug-Token
+    profile_mode = x_profile if x_profile in PROFILE_MODES and is_privileged(x_debug_token) else None
+    try:
+        # Admission runs on the event loop, before the request takes a worker thread
+        async with admission.admit(http_request.is_disconnected) as ticket:
+            # Armed profiles (/debug/profiles/arm) go to admitted requests only, so a 503/429 does not use one up
+            profile_mode = profile_mode or PROFILER.take_armed()
+            cancelled = threading.Event()
+            work = asyncio.ensure_future(run_in_threadpool(
+                _serve_recommend, request, response, request_id, force_trace, start,
+                not ticket.degraded, cancelled, profile_mode, x_request_id))
+            # Stop the pipeline at its next LLM stage if the client goes away
+            while not work.done() and not cancelled.is_set():
+                await asyncio.wait({work}, timeout=DISCONNECT_POLL_SECONDS)
+                if not work.done() and await http_request.is_disconnected():
+                    CANCELLED.inc(phase="running")
+                    cancelled.set()
+            return await work
+    except Overloaded as e:
+        status = e.status_code
+        raise HTTPException(status_code=e.status_code, detail=f"Server overloaded ({e.reason}), retry later.",
+                            headers={"Retry-After": str(e.retry_after), "X-Request-ID": request_id})
+    except (ClientDisconnected, RequestCancelled):
+        # Nobody is waiting for this answer (nginx's "client closed request")
+        status = 499
+        return Response(status_code=499)
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except Exception:
+        status = 500
+        raise
+    finally:
+        REQUESTS.inc(endpoint="/recommend", status=status)
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint="/recommend")
+
+def _serve_recommend(request: RecommendRequest, response: Response, request_id: str, force_trace: bool,
+                     start: float, use_llm: bool = True, cancelled: Optional[threading.Event] = None,
+                     profile_mode: Optional[str] = None, client_request_id: Optional[str] = None):
+    with PROFILER.profile(request_id, profile_mode) as profiled:
+        with TRACER.trace("/recommend", request_id=request_id, force=force_trace) as trace:
+            if trace is not None and client_request_id:
+                trace.annotate(None, {"client_request_id": client_request_id})
+            with timing.collect() as timings:
+                fallbacks = []
+                results = _recommend(request, fallbacks, use_llm=use_llm, cancelled=cancelled)
+            if trace is not None:
+                response.headers["X-Trace-ID"] = trace.request_id
+    if profiled:
+        # "profiled" (download from /debug/profiles/<X-Request-ID>), "rate_limited" or "busy"
+        response.headers["X-Profile"] = profiled
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start)
+    if fallbacks:
+        # Degraded answer: which LLM stages fell back and why (used by loadtest.py)
+        response.headers["X-Fallbacks"] = ",".join(f"{stage}:{reason}" for stage, reason in fallbacks)
+    return results
+
+def _recommend(request: RecommendRequest, fallbacks: Optional[list] = None, use_llm: bool = True,
+               cancelled: Optional[threading.Event] = None):
     query_text = request.query
     
     if request.url:
@@ -49,20 +349,39 @@ def recommend(request: RecommendRequest):
                 
     if not query_text:
         raise HTTPException(status_code=400, detail="Please provide either a query or a valid URL.")
+    tracing.annotate(query=request.query, url=request.url, query_chars=len(query_text))
         
     # New Pipeline: Query Expansion -> Hybrid Search (BM25+FAISS) -> Full-Data LLM Rerank
-    final_results = engine.recommend(query_text, top_n=10)
+    usage = LLMUsage()
+    pipeline_start = time.perf_counter()
+    try:
+        if request.catalogs:
+            final_results = engine.recommend_fanout(query_text, request.catalogs, top_n=10, use_llm=use_llm,
+                                                    fallbacks=fallbacks, cancelled=cancelled, usage=usage)
+        else:
+            final_results = engine.recommend(query_text, top_n=10, use_llm=use_llm, fallbacks=fallbacks,
+                                             catalog=request.catalog, cancelled=cancelled, usage=usage)
+    except UnknownCatalogError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    # Load-shed (retrieval-only) answers are not a fair baseline for shadow configurations
+    if use_llm and shadow.sampled():
+        shadow.mirror(query_text, request.catalog, request.catalogs, final_results,
+                      time.perf_counter() - pipeline_start, usage)
     
     # Format response
-    response = []
+    results = []
     for item in final_results:
-        response.append({
+        result = {
             "name": item['name'],
             "url": item['url'],
             "test_type": item['test_type']
-        })
+        }
+        if 'catalog' in item:
+            result["catalog"] = item['catalog']
+        results.append(result)
+    tracing.annotate(results=[item['name'] for item in results])
         
-    return response
+    return results
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,138 @@
+"""
+Dynamic micro-batching of query encodes.
+
+Concurrent requests each used to run their own single-sentence
+model.encode() and FAISS search. EmbeddingBatcher queues those calls, waits
+up to `window_ms` (or until `max_batch_size` requests are queued), runs one
+batched encode and one multi-row FAISS search per index, and resolves each
+caller's future with its own row.
+
+The worker thread is started lazily and restarted after fork, so a batcher
+created in a pre-fork master (serve.py) works in every worker.
+"""
+import os
+import time
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .observability import Histogram
+
+BATCH_SIZE = Histogram(
+    "shl_encode_batch_size", "Query encodes per batched forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+QUEUE_WAIT = Histogram(
+    "shl_encode_queue_wait_seconds", "Time an encode request waited for its batch.",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+BatchResult = namedtuple(
+    "BatchResult", ["vector", "distances", "ids", "queue_wait", "encode_seconds", "search_seconds", "batch_size"])
+
+
+class _Pending:
+    __slots__ = ("text", "index", "k", "future", "enqueued")
+
+    def __init__(self, text: str, index: Any, k: int):
+        self.text = text
+        self.index = index
+        self.k = k
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    def __init__(self, model, window_ms: float = 2.0, max_batch_size: int = 16):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # Fresh queue/thread per process: neither survives fork()
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str, index: Any = None, k: int = 0) -> Future:
+        """Queue one encode (and optional FAISS search of `index` for `k` neighbours)."""
+        self._ensure_worker()
+        pending = _Pending(text, index, k)
+        self._queue.put(pending)
+        return pending.future
+
+    def search(self, text: str, index: Any, k: int) -> BatchResult:
+        return self.submit(text, index, k).result()
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result().vector
+
+    def _collect(self) -> List[_Pending]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._process(batch)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+    def _process(self, batch: List[_Pending]):
+        started = time.perf_counter()
+        BATCH_SIZE.observe(len(batch))
+        for pending in batch:
+            QUEUE_WAIT.observe(started - pending.enqueued)
+
+        vectors = np.asarray(
+            self.model.encode([p.text for p in batch], batch_size=len(batch)), dtype='float32')
+        encode_seconds = time.perf_counter() - started
+
+        # One multi-row search per distinct index
+        groups: Dict[int, Tuple[Any, List[int]]] = {}
+        for row, pending in enumerate(batch):
+            if pending.index is not None and pending.k > 0:
+                groups.setdefault(id(pending.index), (pending.index, []))[1].append(row)
+
+        searched: Dict[int, Tuple[np.ndarray, np.ndarray, int]] = {}
+        search_seconds = 0.0
+        for index, rows in groups.values():
+            k = max(batch[row].k for row in rows)
+            search_start = time.perf_counter()
+            distances, ids = index.search(vectors[rows], k)
+            search_seconds += time.perf_counter() - search_start
+            for position, row in enumerate(rows):
+                searched[row] = (distances[position], ids[position], batch[row].k)
+
+        for row, pending in enumerate(batch):
+            distances = ids = None
+            if row in searched:
+                row_distances, row_ids, k = searched[row]
+                distances, ids = row_distances[:k], row_ids[:k]
+            pending.future.set_result(BatchResult(
+                vectors[row], distances, ids, started - pending.enqueued,
+                encode_seconds, search_seconds, len(batch)))
@@ -0,0 +1,191 @@
+"""
+In-process offline benchmark for RecommendationEngine.
+
+Drives engine.recommend() directly over train.csv (no HTTP server) and reports
+Recall@K, MAP@K and NDCG@K together with p50/p95/p99 latency for every pipeline
+stage (expand, bm25, encode, faiss, fuse, rerank). Results are written as JSON
+so runs can be diffed, and --baseline turns the run into a regression gate.
+
+LLM modes:
+    fake    deterministic stand-in, no network (default)
+    real    the configured LLM provider (see llm_providers.py)
+    record  real model, responses saved to --cassette
+    replay  responses served from --cassette
+
+Usage (from the project root):
+    python -m shl_recommender.src.benchmark --llm fake --output bench.json
+    python -m shl_recommender.src.benchmark --llm replay --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List
+
+from .engine import RecommendationEngine
+from .llm_doubles import FakeLLM, RecordingLLM, ReplayLLM
+from .metrics import normalize_url, recall_at_k, average_precision_at_k, ndcg_at_k
+from . import timing
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+TRAIN_FILE = os.path.join(DATA_DIR, "train.csv")
+CASSETTE_FILE = os.path.join(DATA_DIR, "llm_cassette.json")
+
+STAGES = ["expand", "bm25", "encode_queue", "encode", "faiss", "fuse", "rerank"]
+K_VALUES = [3, 5, 10]
+
+
+def configure_llm(engine: RecommendationEngine, mode: str, cassette: str, fake_latency_ms: float = 0.0):
+    if mode == "fake":
+        engine.llm = FakeLLM(latency_ms=fake_latency_ms)
+    elif mode == "replay":
+        engine.llm = ReplayLLM(cassette)
+    elif mode in ("real", "record"):
+        if engine.llm is None:
+            raise RuntimeError(f"--llm {mode} requires a configured LLM provider (GOOGLE_API_KEY or SHL_LLM_PROVIDER)")
+        if mode == "record":
+            engine.llm = RecordingLLM(engine.llm, cassette)
+    else:
+        raise ValueError(f"Unknown LLM mode: {mode}")
+
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"count": 0}
+    values = np.asarray(samples_ms)
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def run_benchmark(engine: RecommendationEngine, gt_df: pd.DataFrame, top_n: int = 10,
+                  repeat: int = 1, warmup: int = 1) -> Dict[str, Any]:
+    gt_grouped = gt_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+    catalog_urls = set(normalize_url(item['url']) for item in engine.metadata)
+
+    queries = list(gt_grouped.keys())
+    for query in queries[:warmup]:
+        engine.recommend(query, top_n=top_n)
+
+    stage_samples: Dict[str, List[float]] = {name: [] for name in STAGES + ["total"]}
+    per_query = []
+    for query in queries:
+        # Pre-packaged solutions are not in the catalog, so they are excluded like in metrics.py
+        relevant = [u for u in set(normalize_url(u) for u in gt_grouped[query]) if u in catalog_urls]
+        for _ in range(repeat):
+            with timing.collect() as timings:
+                start = time.perf_counter()
+                results = engine.recommend(query, top_n=top_n)
+                total = time.perf_counter() - start
+            for name, seconds in timings.items():
+                stage_samples.setdefault(name, []).append(seconds * 1000)
+            stage_samples["total"].append(total * 1000)
+
+        pred_urls = [normalize_url(item['url']) for item in results]
+        row = {"query": query, "n_relevant": len(relevant),
+               "latency_ms": {name: round(seconds * 1000, 3) for name, seconds in timings.items()}}
+        for k in K_VALUES:
+            row[f"recall@{k}"] = recall_at_k(pred_urls, relevant, k)
+            row[f"map@{k}"] = average_precision_at_k(pred_urls, relevant, k)
+            row[f"ndcg@{k}"] = ndcg_at_k(pred_urls, relevant, k)
+        per_query.append(row)
+
+    scored = [row for row in per_query if row["n_relevant"] > 0]
+    quality = {}
+    for k in K_VALUES:
+        for metric in ("recall", "map", "ndcg"):
+            name = f"{metric}@{k}"
+            quality[name] = round(float(np.mean([row[name] for row in scored])), 4) if scored else 0.0
+
+    return {
+        "quality": quality,
+        "latency_ms": {name: latency_summary(samples) for name, samples in stage_samples.items()},
+        "per_query": per_query,
+    }
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                        max_quality_drop: float, max_latency_increase: float) -> List[str]:
+    """Return human-readable regressions of this run against a baseline report."""
+    regressions = []
+    for name, value in baseline.get("quality", {}).items():
+        current = report["quality"].get(name)
+        if current is not None and current < value - max_quality_drop:
+            regressions.append(f"{name}: {value:.4f} -> {current:.4f}")
+    for name, summary in baseline.get("latency_ms", {}).items():
+        current = report["latency_ms"].get(name, {})
+        if "p95" in summary and "p95" in current and summary["p95"] > 0:
+            if current["p95"] > summary["p95"] * (1 + max_latency_increase):
+                regressions.append(f"{name} p95: {summary['p95']:.1f}ms -> {current['p95']:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline quality + latency benchmark.")
+    parser.add_argument("--llm", choices=["fake", "real", "record", "replay"], default="fake")
+    parser.add_argument("--cassette", default=CASSETTE_FILE, help="Cassette file for record/replay")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0, help="Simulated latency per fake LLM call")
+    parser.add_argument("--train", default=TRAIN_FILE)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per query")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed queries before measuring")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Previous JSON report to gate regressions against")
+    parser.add_argument("--max-quality-drop", type=float, default=0.0)
+    parser.add_argument("--max-latency-increase", type=float, default=0.25,
+                        help="Allowed relative p95 increase per stage")
+    args = parser.parse_args()
+
+    engine = RecommendationEngine()
+    configure_llm(engine, args.llm, args.cassette, args.fake_latency_ms)
+    gt_df = pd.read_csv(args.train)
+
+    report = run_benchmark(engine, gt_df, top_n=args.top_n, repeat=args.repeat, warmup=args.warmup)
+    report["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "llm": args.llm,
+        "queries": len(report["per_query"]),
+        "repeat": args.repeat,
+        "top_n": args.top_n,
+        "fusion_config": engine.fusion_config,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"Saved benchmark report to {args.output}")
+    else:
+        print(output)
+
+    print("\n--- Quality ---")
+    for name, value in report["quality"].items():
+        print(f"  {name}: {value:.4f}")
+    print("--- Latency (ms) ---")
+    for name, summary in report["latency_ms"].items():
+        if summary.get("count"):
+            print(f"  {name:8s} p50={summary['p50']:.1f} p95={summary['p95']:.1f} p99={summary['p99']:.1f}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.max_quality_drop, args.max_latency_increase)
+        if regressions:
+            print("\nREGRESSIONS vs baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nNo regressions vs baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Compact in-memory catalog: columns instead of a list of dicts.
+
+The unpickled metadata was one dict per assessment, each with its own lists
+repeating the same test type, job level and language strings and its own
+"Yes"/"No" flags. Every stage re-joined those lists for prompts, BM25 text and
+filters. CatalogStore keeps one column per field:
+
+    name, url, description         lists of str
+    duration                       int32 array
+    test_type, job_levels,         int32 code per row into a table of distinct
+    languages                      label tuples (labels interned), each with a
+                                   bitmask over the field's labels and its
+                                   precomputed ", "-joined display string
+    remote_support,                int32 code per row into the distinct values
+    adaptive_support
+
+Existing callers keep working: store[row] is an AssessmentRecord, a read-only
+Mapping over one row (item['name'], item.get('duration', 0), dict(item, ...)).
+List fields read as fresh lists and missing fields as empty. joined() and
+has_any() use the precomputed strings and bitmasks when given a record and
+fall back to the dict code path otherwise. Fewer objects per row also means
+fewer pages dirtied by refcounting after serve.py forks its workers.
+
+experiments/bench_catalog_store.py compares memory and access times against
+the list of dicts at 100k synthetic assessments.
+
+Settings (environment variables):
+    SHL_COMPACT_CATALOG  0 to keep the unpickled list of dicts (default 1)
+"""
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+LIST_FIELDS = ("test_type", "job_levels", "languages")
+CATEGORY_FIELDS = ("remote_support", "adaptive_support")
+TEXT_FIELDS = ("name", "url", "description")
+
+
+class _Categories:
+    """Distinct values of one field, with a code per row."""
+
+    def __init__(self, values: Iterable[Any]):
+        self.table: List[Any] = []
+        lookup: Dict[Any, int] = {}
+        codes = []
+        for value in values:
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self.table)
+                self.table.append(value)
+            codes.append(code)
+        # array('i') rather than numpy: per-row indexing returns a plain int, ~3x faster
+        self.codes = array('i', codes)
+
+
+class _LabelSets(_Categories):
+    """Distinct label tuples of a list field, with their bitmasks and display strings."""
+
+    def __init__(self, values: Iterable[List[str]]):
+        super().__init__(tuple(sys.intern(label) for label in labels) for labels in values)
+        self.bits: Dict[str, int] = {}
+        for labels in self.table:
+            for label in labels:
+                self.bits.setdefault(label, len(self.bits))
+        self.masks = [self.mask(labels) for labels in self.table]
+        self.joined = [", ".join(labels) for labels in self.table]
+
+    def mask(self, labels: Iterable[str]) -> int:
+        """Bitmask of the known labels among `labels` (unknown labels are ignored)."""
+        mask = 0
+        for label in labels:
+            bit = self.bits.get(label)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+
+class AssessmentRecord(Mapping):
+    """Read-only dict view of one catalog row."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "CatalogStore", row: int):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, key: str) -> Any:
+        getter = self.store.getters.get(key)
+        if getter is None:
+            return self.store.extra_value(self.row, key)
+        return getter(self.row)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        getter = self.store.getters.get(key)
+        if getter is None:
+            try:
+                return self.store.extra_value(self.row, key)
+            except KeyError:
+                return default
+        return getter(self.row)
+
+    def __iter__(self):
+        return iter(self.store.keys(self.row))
+
+    def __len__(self) -> int:
+        return len(self.store.keys(self.row))
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __reduce__(self):
+        # Pickles (and deep-copies) as a plain dict rather than the whole store
+        return dict, (dict(self),)
+
+
+class CatalogStore(Sequence):
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.fields: List[str] = []
+        for item in items:
+            for key in item:
+                if key not in self.fields:
+                    self.fields.append(key)
+        self.size = len(items)
+        self.text = {field: [item.get(field, "") for item in items] for field in TEXT_FIELDS}
+        self.durations = array('i', [item.get('duration') or 0 for item in items])
+        self.labels = {field: _LabelSets(item.get(field) or () for item in items) for field in LIST_FIELDS}
+        self.categories = {field: _Categories(item.get(field) for item in items) for field in CATEGORY_FIELDS}
+        # Fields outside the schema above, kept per row as given
+        known = set(TEXT_FIELDS) | set(LIST_FIELDS) | set(CATEGORY_FIELDS) | {"duration"}
+        self.extra: Dict[int, Dict[str, Any]] = {}
+        for row, item in enumerate(items):
+            extra = {key: value for key, value in item.items() if key not in known}
+            if extra:
+                self.extra[row] = extra
+        # field -> row accessor, used by AssessmentRecord
+        self.getters = {field: column.__getitem__ for field, column in self.text.items()}
+        self.getters["duration"] = self.durations.__getitem__
+        for field, sets in self.labels.items():
+            self.getters[field] = lambda row, table=sets.table, codes=sets.codes: list(table[codes[row]])
+        for field, categories in self.categories.items():
+            self.getters[field] = lambda row, table=categories.table, codes=categories.codes: table[codes[row]]
+        self._schema = [field for field in self.fields if field in known]
+        # One record object per row, so metadata[row] is a plain list lookup
+        self.records = [AssessmentRecord(self, row) for row in range(self.size)]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, row):
+        return self.records[row]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def keys(self, row: int) -> List[str]:
+        extra = self.extra.get(row)
+        return self._schema + list(extra) if extra else self._schema
+
+    def extra_value(self, row: int, key: str) -> Any:
+        extra = self.extra.get(row)
+        if extra is not None and key in extra:
+            return extra[key]
+        raise KeyError(key)
+
+    def joined(self, row: int, field: str) -> str:
+        return self.labels[field].joined[self.labels[field].codes[row]]
+
+    def label_mask(self, field: str, labels: Iterable[str]) -> int:
+        return self.labels[field].mask(labels)
+
+    def row_mask(self, row: int, field: str) -> int:
+        sets = self.labels[field]
+        return sets.masks[sets.codes[row]]
+
+    def rows_matching(self, field: str, labels: Iterable[str]) -> np.ndarray:
+        """Boolean array: rows with any of `labels` in `field`."""
+        sets = self.labels[field]
+        wanted = sets.mask(labels)
+        matching = np.array([mask & wanted != 0 for mask in sets.masks], dtype=bool)
+        if not len(matching):
+            return np.zeros(self.size, dtype=bool)
+        return matching[np.frombuffer(sets.codes, dtype=np.int32)]
+
+    def memory_bytes(self) -> int:
+        """Rough resident size of the columns and tables."""
+        total = sum(sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+                    for column in self.text.values())
+        total += sys.getsizeof(self.durations) + sys.getsizeof(self.records) + len(self.records) * 56
+        for sets in self.labels.values():
+            total += sys.getsizeof(sets.codes) + sys.getsizeof(sets.masks) + len(sets.masks) * 32 + sum(sys.getsizeof(s) for s in sets.joined)
+            total += sum(sys.getsizeof(labels) for labels in sets.table)
+            total += sum(sys.getsizeof(label) for label in sets.bits)
+        total += sum(sys.getsizeof(categories.codes) for categories in self.categories.values())
+        total += sum(sys.getsizeof(extra) for extra in self.extra.values())
+        return total
+
+
+def joined(item: Any, field: str) -> str:
+    """", "-joined labels of a list field (precomputed for catalog records)."""
+    if isinstance(item, AssessmentRecord):
+        sets = item.store.labels[field]
+        return sets.joined[sets.codes[item.row]]
+    return ", ".join(item.get(field) or [])
+
+
+def has_any(item: Any, field: str, labels: Optional[set]) -> bool:
+    """True when the list field of `item` contains any of `labels` (a bitmask test for records)."""
+    if not labels:
+        return False
+    if isinstance(item, AssessmentRecord):
+        return item.store.row_mask(item.row, field) & item.store.label_mask(field, labels) != 0
+    return bool(set(labels) & set(item.get(field) or []))
@@ -0,0 +1,310 @@
+"""
+Catalog registry: several assessment catalogs served by one engine.
+
+Each catalog is a directory with its own raw_assessments.json and the files
+ingest.py builds from it (FAISS index, metadata, BM25 corpus, expansion
+dictionary). The default catalog lives in data/ and is loaded at startup;
+every other catalog is loaded on first use with the engine's shared embedding
+model and evicted least-recently-used once the estimated memory of loaded
+catalogs exceeds the ceiling.
+
+Layout:
+    data/                                   default catalog ("individual")
+    data/catalogs/<id>/raw_assessments.json other catalogs, e.g. "prepackaged"
+                                            (python -m shl_recommender.src.scraper prepackaged)
+    data/catalogs.json                      optional variants filtered from another catalog:
+        {"individual-es": {"source": "individual", "languages": ["Latin American Spanish"]}}
+    data/shadow/<model>/                    default catalog indexed with another embedding
+                                            model (shadow evaluation, see shadow.py)
+
+Settings (environment variables):
+    SHL_DEFAULT_CATALOG    id of the catalog in data/ (default "individual")
+    SHL_CATALOG_MEMORY_MB  ceiling for lazily loaded catalogs (default 512)
+    SHL_COMPACT_CATALOG    0 to keep metadata as a list of dicts (default 1, see catalog_store.py)
+"""
+import os
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import faiss
+from rank_bm25 import BM25Okapi
+
+from .models import model_fingerprint, DEFAULT_MODEL_NAME
+from .ingest import DATA_DIR, catalog_paths, ingest_data, document_text, document_tokens
+from .similarity import SimilarityGraph, build_similarity_graph, assessment_id, content_hash
+from .expansion import LocalExpander, mine_expansion_dictionary, load_expansion_dictionary
+from .catalog_store import CatalogStore
+from .field_index import FieldIndex, build_field_embeddings
+from .observability import Counter, Gauge
+
+DEFAULT_CATALOG = os.environ.get("SHL_DEFAULT_CATALOG", "individual")
+CATALOGS_DIR = os.path.join(DATA_DIR, "catalogs")
+CATALOGS_FILE = os.path.join(DATA_DIR, "catalogs.json")
+SHADOW_DIR = os.path.join(DATA_DIR, "shadow")
+# Item fields a variant may filter on (an item matches if it has any listed value)
+VARIANT_FILTERS = ("languages", "job_levels", "test_type")
+
+CATALOG_LOADS = Counter("shl_catalog_loads_total", "Catalog bundles loaded.", ["catalog"])
+CATALOG_EVICTIONS = Counter("shl_catalog_evictions_total", "Catalog bundles evicted (LRU).", ["catalog"])
+CATALOG_MEMORY = Gauge("shl_catalog_memory_bytes", "Estimated memory of lazily loaded catalogs.")
+
+
+class UnknownCatalogError(KeyError):
+    pass
+
+
+def discover_catalogs() -> Dict[str, Dict[str, Any]]:
+    """Catalog id -> spec ({"path": dir, optional "source" + filters})."""
+    specs = {DEFAULT_CATALOG: {"path": DATA_DIR}}
+    if os.path.isdir(CATALOGS_DIR):
+        for name in sorted(os.listdir(CATALOGS_DIR)):
+            path = os.path.join(CATALOGS_DIR, name)
+            if os.path.exists(catalog_paths(path)["raw"]) or os.path.exists(catalog_paths(path)["index"]):
+                specs[name] = {"path": path}
+    if os.path.exists(CATALOGS_FILE):
+        with open(CATALOGS_FILE, 'r') as f:
+            for catalog_id, spec in json.load(f).items():
+                spec = dict(spec)
+                spec.setdefault("path", os.path.join(CATALOGS_DIR, catalog_id))
+                specs[catalog_id] = spec
+    return specs
+
+
+def materialize_variant(spec: Dict[str, Any], specs: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    Write a variant's raw_assessments.json by filtering its source catalog.
+    Returns True when the file changed (so its index must be rebuilt).
+    """
+    source = specs.get(spec["source"])
+    if source is None:
+        raise UnknownCatalogError(f"Variant source catalog '{spec['source']}' not found")
+    with open(catalog_paths(source["path"])["raw"], 'r') as f:
+        items = json.load(f)
+    for field in VARIANT_FILTERS:
+        if field in spec:
+            wanted = set(spec[field])
+            items = [item for item in items if wanted & set(item.get(field, []))]
+    data = json.dumps(items, indent=2).encode()
+
+    raw_file = catalog_paths(spec["path"])["raw"]
+    if os.path.exists(raw_file):
+        with open(raw_file, 'rb') as f:
+            if f.read() == data:
+                return False
+    os.makedirs(spec["path"], exist_ok=True)
+    with open(raw_file, 'wb') as f:
+        f.write(data)
+    print(f"Wrote {len(items)} assessments for variant of '{spec['source']}' to {raw_file}")
+    return True
+
+
+def build_bm25_index(metadata: List[Dict]) -> BM25Okapi:
+    """BM25 index over name, description and test types."""
+    print("Building BM25 index...")
+    # Combine name, description, and test types for BM25
+    corpus = [document_tokens(item) for item in metadata]
+    bm25 = BM25Okapi(corpus)
+    print(f"BM25 index built with {len(corpus)} documents.")
+    return bm25
+
+
+def verify_manifest(manifest_file: str, model_name: str) -> Dict[str, Any]:
+    """Refuse to serve an index built with a different embedding model."""
+    if not os.path.exists(manifest_file):
+        print(f"WARNING: {manifest_file} not found; cannot verify the index was built with this model.")
+        return {}
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    fingerprint = model_fingerprint(model_name)
+    if manifest.get("model_fingerprint") != fingerprint:
+        raise RuntimeError(
+            f"Embedding model mismatch: index built with {manifest.get('model_name')} "
+            f"({str(manifest.get('model_fingerprint'))[:12]}), loaded {model_name} ({fingerprint[:12]}). "
+            "Re-run ingest.py with the current model."
+        )
+    return manifest
+
+
+class CatalogBundle:
+    """FAISS index, metadata, BM25 index and expansion dictionary of one catalog."""
+
+    def __init__(self, catalog_id: str, data_dir: str, model: Any, model_name: str = DEFAULT_MODEL_NAME,
+                 rebuild: bool = False):
+        self.catalog_id = catalog_id
+        self.data_dir = data_dir
+        paths = catalog_paths(data_dir)
+
+        # Build missing (or stale variant) indices, reusing the loaded model
+        if rebuild or not os.path.exists(paths["index"]) or not os.path.exists(paths["metadata"]):
+            print(f"Indices for catalog '{catalog_id}' not found. Rebuilding from raw data...")
+            ingest_data(model=model, model_name=model_name, data_dir=data_dir)
+        self.manifest = verify_manifest(paths["manifest"], model_name)
+        self.index_version = self.manifest.get("index_version", "unversioned")
+
+        # mmap the index so pre-forked workers share its pages (see serve.py)
+        if os.environ.get("SHL_MMAP_INDEX", "1") == "1":
+            io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+            self.index = faiss.read_index(paths["index"], io_flags)
+        else:
+            self.index = faiss.read_index(paths["index"])
+        with open(paths["metadata"], 'rb') as f:
+            metadata_bytes = f.read()
+        self.metadata = pickle.loads(metadata_bytes)
+        if os.environ.get("SHL_COMPACT_CATALOG", "1") == "1":
+            self.metadata = CatalogStore(self.metadata)
+
+        self.bm25 = build_bm25_index(self.metadata)
+
+        # Catalog-mined alias dictionary for LLM-free query expansion (see expansion.py)
+        self.local_expander = None
+        if os.environ.get("SHL_LOCAL_EXPANSION", "1") == "1":
+            if os.path.exists(paths["expansion"]):
+                dictionary = load_expansion_dictionary(paths["expansion"])
+            else:
+                # Index built before the dictionary existed: mine it in memory
+                dictionary = mine_expansion_dictionary(self.metadata)
+            self.local_expander = LocalExpander.from_mined(dictionary)
+            print(f"Local expansion dictionary loaded with {len(dictionary['terms'])} terms "
+                  f"({len(dictionary['confident'])} confident).")
+
+        # Precomputed neighbour graph for /similar (see similarity.py)
+        if os.path.exists(paths["similarity"]):
+            self.similarity = SimilarityGraph.load(paths["similarity"])
+        else:
+            # Index built before the graph existed: build it in memory from the stored vectors
+            print(f"Similarity graph for catalog '{catalog_id}' not found. Building in memory...")
+            self.similarity, _ = build_similarity_graph(
+                self.index.reconstruct_n(0, self.index.ntotal), [document_tokens(item) for item in self.metadata],
+                [assessment_id(item) for item in self.metadata],
+                [content_hash(document_text(item)) for item in self.metadata],
+            )
+        
+        # Per-field embeddings for field-weighted dense scoring (see field_index.py)
+        self.fields = None
+        if os.path.exists(paths["fields"]):
+            self.fields = FieldIndex.load(paths["fields"])
+            if self.fields.size != len(self.metadata):
+                print(f"Ignoring stale field embeddings for catalog '{catalog_id}' "
+                      f"({self.fields.size} rows, {len(self.metadata)} assessments). Re-run ingest.py.")
+                self.fields = None
+        # Otherwise embedded in memory by field_index() on first use (any engine or variant with field weights)
+        self._model = model
+        self._fields_lock = threading.Lock()
+        
+        # Rough resident size: vectors + metadata + BM25 term frequencies
+        bm25_terms = sum(len(freqs) for freqs in self.bm25.doc_freqs)
+        if isinstance(self.metadata, CatalogStore):
+            metadata_memory = self.metadata.memory_bytes()
+        else:
+            metadata_memory = len(metadata_bytes) * 3
+        self.memory_bytes = (self.index.ntotal * self.index.d * 4 + metadata_memory + bm25_terms * 120
+                             + self.similarity.neighbors.size * 40
+                             + (self.fields.nbytes if self.fields is not None else 0))
+
+    def field_index(self) -> FieldIndex:
+        """Per-field embeddings; built in memory on first use when field_embeddings.npy is missing."""
+        if self.fields is None:
+            with self._fields_lock:
+                if self.fields is None:
+                    print(f"Field embeddings for catalog '{self.catalog_id}' not found. Building in memory...")
+                    fields = FieldIndex(build_field_embeddings(self._model, self.metadata))
+                    self.memory_bytes += fields.nbytes
+                    self.fields = fields
+        return self.fields
+
+
+class CatalogRegistry:
+    def __init__(self, model: Any, model_name: str = DEFAULT_MODEL_NAME, default_id: str = DEFAULT_CATALOG,
+                 memory_limit_mb: Optional[float] = None, specs: Optional[Dict[str, Dict[str, Any]]] = None,
+                 rebuild_default: bool = False):
+        self.model = model
+        self.model_name = model_name
+        if memory_limit_mb is None:
+            memory_limit_mb = float(os.environ.get("SHL_CATALOG_MEMORY_MB", "512"))
+        self.memory_limit_bytes = int(memory_limit_mb * 1024 * 1024)
+        self.specs = discover_catalogs() if specs is None else specs
+        self.default = CatalogBundle(default_id, self.specs[default_id]["path"], model, model_name,
+                                     rebuild=rebuild_default)
+        self._loaded: "OrderedDict[str, CatalogBundle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def available(self) -> List[str]:
+        return list(self.specs.keys())
+
+    def loaded(self) -> Dict[str, int]:
+        """Resident catalogs and their estimated memory (bytes)."""
+        with self._lock:
+            report = {self.default.catalog_id: self.default.memory_bytes}
+            report.update({cid: bundle.memory_bytes for cid, bundle in self._loaded.items()})
+            return report
+
+    def get(self, catalog_id: Optional[str] = None) -> CatalogBundle:
+        if catalog_id is None or catalog_id == self.default.catalog_id:
+            return self.default
+        if catalog_id not in self.specs:
+            raise UnknownCatalogError(f"Unknown catalog '{catalog_id}'. Available: {', '.join(self.available())}")
+        with self._lock:
+            bundle = self._loaded.get(catalog_id)
+            if bundle is not None:
+                self._loaded.move_to_end(catalog_id)
+                return bundle
+            load_lock = self._load_locks.setdefault(catalog_id, threading.Lock())
+        # Load outside the registry lock so other catalogs stay available meanwhile
+        with load_lock:
+            with self._lock:
+                bundle = self._loaded.get(catalog_id)
+            if bundle is None:
+                bundle = self._load(catalog_id)
+                with self._lock:
+                    self._loaded[catalog_id] = bundle
+                    self._evict(keep=catalog_id)
+        return bundle
+
+    def _load(self, catalog_id: str) -> CatalogBundle:
+        spec = self.specs[catalog_id]
+        rebuild = materialize_variant(spec, self.specs) if "source" in spec else False
+        print(f"Loading catalog '{catalog_id}' from {spec['path']}...")
+        bundle = CatalogBundle(catalog_id, spec["path"], self.model, self.model_name, rebuild=rebuild)
+        CATALOG_LOADS.inc(catalog=catalog_id)
+        return bundle
+
+    def _evict(self, keep: str):
+        total = sum(bundle.memory_bytes for bundle in self._loaded.values())
+        for catalog_id in list(self._loaded.keys()):
+            if total <= self.memory_limit_bytes:
+                break
+            if catalog_id == keep:
+                continue
+            bundle = self._loaded.pop(catalog_id)
+            total -= bundle.memory_bytes
+            CATALOG_EVICTIONS.inc(catalog=catalog_id)
+            print(f"Evicted catalog '{catalog_id}' ({bundle.memory_bytes / 1e6:.1f} MB) to stay under "
+                  f"{self.memory_limit_bytes / 1e6:.0f} MB")
+        CATALOG_MEMORY.set(total)
+
+
+def ingest_catalog(catalog_id: str, full_similarity: bool = False):
+    """Build (or rebuild) the indices of one catalog from its raw_assessments.json."""
+    from .models import get_model
+    specs = discover_catalogs()
+    if catalog_id not in specs:
+        raise UnknownCatalogError(f"Unknown catalog '{catalog_id}'. Available: {', '.join(specs)}")
+    spec = specs[catalog_id]
+    if "source" in spec:
+        materialize_variant(spec, specs)
+    ingest_data(model=get_model(DEFAULT_MODEL_NAME), data_dir=spec["path"], full_similarity=full_similarity)
+
+
+def shadow_registry(registry: CatalogRegistry, model: Any, model_name: str) -> CatalogRegistry:
+    """
+    A registry serving only `registry`'s default catalog, indexed with another
+    embedding model in data/shadow/<model>/ (built on first use).
+    """
+    catalog_id = registry.default.catalog_id
+    spec = {"source": catalog_id, "path": os.path.join(SHADOW_DIR, os.path.basename(model_name.rstrip("/")))}
+    rebuild = materialize_variant(spec, registry.specs)
+    return CatalogRegistry(model, model_name, catalog_id, specs={catalog_id: spec}, rebuild_default=rebuild)
@@ -0,0 +1,138 @@
+"""
+Retrieval confidence: adaptive candidate depth and rerank skipping.
+
+When BM25 and FAISS agree on an obvious answer ("Core Java developer"), the
+LLM rerank rarely changes the top 10, so it is paid for nothing. The
+confidence of a query is a weighted mean of three features of its score
+distributions, each in [0, 1]:
+
+    agreement    share of the BM25 top n that is also in the FAISS top n
+    gap          how sharply fused scores drop after position n, relative to
+                 the average step over the top 2n (no drop = 0, 4x = 1)
+    constraints  share of the fused top n satisfying the hard constraints in
+                 the query (max duration, test types, job levels); 1 without any
+
+From it the policy picks the candidate depth handed to the reranker (between
+max_depth for no confidence and min_depth for full confidence) and skips the
+rerank altogether at or above skip_threshold, serving the fused order.
+experiments/adaptive_rerank_report.py sweeps the threshold on train.csv.
+
+Settings (environment variables):
+    SHL_ADAPTIVE_RERANK          1 to enable (default 0: fixed depth, always rerank)
+    SHL_RERANK_SKIP_CONFIDENCE   skip the rerank at or above this confidence (default 0.8)
+    SHL_ADAPTIVE_MIN_DEPTH       candidates reranked at full confidence (default 10)
+    SHL_ADAPTIVE_MAX_DEPTH       candidates reranked at zero confidence (default 20, the fixed depth)
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .fusion import top_k_indices
+from .semantic_cache import extract_constraints
+from .observability import Counter
+from .catalog_store import has_any
+
+ADAPTIVE_RERANKS = Counter("shl_adaptive_rerank_total", "Adaptive rerank decisions.", ["decision"])
+
+# extract_constraints() names -> catalog labels that satisfy them
+TEST_TYPE_LABELS = {
+    "ability": {"Ability & Aptitude"},
+    "personality": {"Personality & Behavior", "Personality"},
+    "simulation": {"Simulations"},
+    "knowledge": {"Knowledge & Skills"},
+}
+JOB_LEVEL_LABELS = {
+    "entry": {"Entry-Level", "Graduate"},
+    "mid": {"Mid-Professional", "Professional Individual Contributor"},
+    "senior": {"Mid-Professional", "Professional Individual Contributor", "Manager"},
+    "manager": {"Manager", "Front Line Manager", "Supervisor"},
+    "executive": {"Executive", "Director"},
+}
+
+DEFAULT_WEIGHTS = {"agreement": 0.4, "gap": 0.3, "constraints": 0.3}
+
+
+def _wanted_labels(found: Tuple[str, ...], labels: Dict[str, set]) -> set:
+    return set().union(*(labels[name] for name in found)) if found else set()
+
+
+def constraint_match(query: str, items: List[Dict]) -> float:
+    """Mean share of `items` satisfying each hard constraint in the query (unknown values pass)."""
+    constraints = dict(extract_constraints(query))
+    checks = []
+    if constraints["duration"]:
+        limit = max(constraints["duration"])
+        checks.append([0 < item.get('duration', 0) <= limit or not item.get('duration') for item in items])
+    for group, labels, field in (("test_types", TEST_TYPE_LABELS, "test_type"),
+                                 ("job_levels", JOB_LEVEL_LABELS, "job_levels")):
+        wanted = _wanted_labels(constraints[group], labels)
+        if wanted:
+            checks.append([not item.get(field) or has_any(item, field, wanted) for item in items])
+    if not checks or not items:
+        return 1.0
+    return float(np.mean([np.mean(check) for check in checks]))
+
+
+class RetrievalConfidence:
+    """Confidence of one query and the depth/rerank decision derived from it."""
+
+    def __init__(self, score: float, features: Dict[str, float], depth: int, skip_rerank: bool):
+        self.score = score
+        self.features = features
+        self.depth = depth
+        self.skip_rerank = skip_rerank
+
+    def to_dict(self) -> Dict:
+        return {"confidence": round(self.score, 4), "depth": self.depth, "skip_rerank": self.skip_rerank,
+                **{name: round(value, 4) for name, value in self.features.items()}}
+
+
+class AdaptivePolicy:
+    def __init__(self, skip_threshold: float = 0.8, min_depth: int = 10, max_depth: int = 20,
+                 weights: Optional[Dict[str, float]] = None):
+        self.skip_threshold = skip_threshold
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+
+    @classmethod
+    def from_env(cls) -> Optional["AdaptivePolicy"]:
+        """The configured policy, or None when adaptive reranking is off."""
+        if os.environ.get("SHL_ADAPTIVE_RERANK", "0") != "1":
+            return None
+        return cls(
+            skip_threshold=float(os.environ.get("SHL_RERANK_SKIP_CONFIDENCE", "0.8")),
+            min_depth=int(os.environ.get("SHL_ADAPTIVE_MIN_DEPTH", "10")),
+            max_depth=int(os.environ.get("SHL_ADAPTIVE_MAX_DEPTH", "20")),
+        )
+
+    def settings(self) -> Dict:
+        return {"skip_threshold": self.skip_threshold, "min_depth": self.min_depth, "max_depth": self.max_depth,
+                "weights": self.weights}
+
+    def features(self, query: str, bm25_scores: np.ndarray, dense_scores: np.ndarray, fused_scores: np.ndarray,
+                 metadata: List[Dict], top_n: int) -> Dict[str, float]:
+        n = min(top_n, len(fused_scores))
+        if n == 0:
+            return {"agreement": 0.0, "gap": 0.0, "constraints": 1.0}
+        agreement = len(set(top_k_indices(bm25_scores, n).tolist()) & set(top_k_indices(dense_scores, n).tolist())) / n
+
+        head = fused_scores[top_k_indices(fused_scores, min(2 * n, len(fused_scores)))]
+        gap = 0.0
+        if len(head) > n and head[0] > head[-1]:
+            average_step = (head[0] - head[-1]) / (len(head) - 1)
+            gap = float(np.clip(((head[n - 1] - head[n]) / average_step - 1.0) / 3.0, 0.0, 1.0))
+
+        top = [metadata[i] for i in top_k_indices(fused_scores, n)]
+        return {"agreement": agreement, "gap": gap, "constraints": constraint_match(query, top)}
+
+    def decide(self, features: Dict[str, float]) -> RetrievalConfidence:
+        total = sum(self.weights.values())
+        score = sum(self.weights[name] * features[name] for name in self.weights) / total
+        depth = int(round(self.max_depth - (self.max_depth - self.min_depth) * score))
+        return RetrievalConfidence(score, features, depth, score >= self.skip_threshold)
+
+    def assess(self, query: str, bm25_scores: np.ndarray, dense_scores: np.ndarray, fused_scores: np.ndarray,
+               metadata: List[Dict], top_n: int) -> RetrievalConfidence:
+        return self.decide(self.features(query, bm25_scores, dense_scores, fused_scores, metadata, top_n))
@@ -1,15 +1,31 @@
 import os
+import copy
 import json
-import pickle
+import hashlib
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+from .models import get_model, DEFAULT_MODEL_NAME
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from typing import Optional, Dict, Any, List
-from rank_bm25 import BM25Okapi
+from typing import Optional, Dict, Any, List, Tuple
 import re
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from .fusion import fuse_scores, load_fusion_config, top_k_indices, window_spans, merge_window_rankings
+from .timing import stage, record, observed
+from .batching import EmbeddingBatcher
+from .observability import LLM_FAILURES, LLM_FALLBACKS
+from . import tracing
+from .semantic_cache import SemanticCache, extract_constraints
+from .expansion import EXPANSIONS
+from .catalogs import CatalogRegistry, UnknownCatalogError, shadow_registry
+from .similarity import UnknownAssessmentError, assessment_id
+from .llm_providers import LLMUsage, configured_provider, create_llm
+from .confidence import AdaptivePolicy, RetrievalConfidence, ADAPTIVE_RERANKS
+from .thread_budget import ThreadBudget
+from .catalog_store import joined
+from .field_index import parse_field_weights
+from .long_query import LongQueryPolicy, LONG_QUERY_CHUNKS
 
 # Load environment variables
 load_dotenv()
@@ -17,60 +33,236 @@ load_dotenv()
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
-INDEX_FILE = os.path.join(DATA_DIR, "assessments.index")
-METADATA_FILE = os.path.join(DATA_DIR, "assessments.pkl")
-RAW_DATA_FILE = os.path.join(DATA_DIR, "raw_assessments.json")
+
+# Fallback reasons recorded during the current recommend() call
+_request_fallbacks = contextvars.ContextVar("request_fallbacks", default=None)
+# False while serving a retrieval-only recommend(use_llm=False) call
+_request_use_llm = contextvars.ContextVar("request_use_llm", default=True)
+# CatalogBundle of the current request (None = the engine's default catalog)
+_request_catalog = contextvars.ContextVar("request_catalog", default=None)
+# threading.Event set when the client of the current request went away
+_request_cancelled = contextvars.ContextVar("request_cancelled", default=None)
+# LLMUsage accumulating the LLM calls of the current request
+_request_usage = contextvars.ContextVar("request_usage", default=None)
+
+# "auto": local dictionary, LLM when it does not cover the query; "local": never the LLM; "off": no expansion
+EXPANSION_MODES = ("auto", "local", "off")
+# "none" serves the fused retrieval order without an LLM rerank
+RERANK_MODES = ("single", "windowed", "none")
+# Settings a variant() may override
+VARIANT_SETTINGS = ("embedding_model", "expansion", "candidates", "fusion", "rerank_mode", "rerank_window",
+                    "rerank_overlap", "llm", "adaptive", "long_query", "field_weights")
+
+
+class RequestCancelled(Exception):
+    pass
+
 
 class RecommendationEngine:
     def __init__(self):
         print("Loading Recommendation Engine...")
-        self.model = SentenceTransformer('all-mpnet-base-v2')
+        # torch/FAISS thread counts from the container's CPU quota, before any encode (see thread_budget.py)
+        self.thread_budget = ThreadBudget.from_env()
+        self.thread_budget.apply()
+        # Bounds concurrent unbatched encodes (the batcher already runs one at a time)
+        self.encode_slots = None
+        if self.thread_budget.enabled:
+            self.encode_slots = threading.BoundedSemaphore(self.thread_budget.encode_threads)
         
-        # Check if indices exist, if not rebuild
-        if not os.path.exists(INDEX_FILE) or not os.path.exists(METADATA_FILE):
-            print("Indices not found. Rebuilding from raw data...")
-            from .ingest import ingest_data
-            ingest_data()
-            
-        self.index = faiss.read_index(INDEX_FILE)
-        with open(METADATA_FILE, 'rb') as f:
-            self.metadata = pickle.load(f)
+        # Shared, offline model instance (see models.py)
+        self.model_name = DEFAULT_MODEL_NAME
+        self.model = get_model(self.model_name)
         
-        # Build BM25 index for hybrid retrieval
-        self._build_bm25_index()
-            
-        # Configure Gemini via LangChain
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if api_key:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemma-3-27b-it",
-                google_api_key=api_key,
-                temperature=0.1
+        # Catalog registry: the default catalog is loaded now, others on first use (see catalogs.py)
+        self.catalogs = CatalogRegistry(self.model, self.model_name)
+        self._use_default_catalog()
+        
+        # Micro-batch concurrent query encodes + FAISS searches (SHL_EMBED_BATCHING=0 to disable)
+        self.batcher = None
+        if os.environ.get("SHL_EMBED_BATCHING", "1") == "1":
+            self.batcher = EmbeddingBatcher(
+                self.model,
+                window_ms=float(os.environ.get("SHL_BATCH_WINDOW_MS", "2")),
+                max_batch_size=int(os.environ.get("SHL_BATCH_MAX_SIZE", "16")),
+            )
+        
+        # Semantic cache of final results for near-duplicate queries (see semantic_cache.py)
+        self.semantic_cache = None
+        if os.environ.get("SHL_SEMANTIC_CACHE", "0") == "1":
+            self.semantic_cache = SemanticCache(
+                self.model.get_sentence_embedding_dimension(),
+                threshold=float(os.environ.get("SHL_SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                capacity=int(os.environ.get("SHL_SEMANTIC_CACHE_SIZE", "1000")),
+                ttl_seconds=float(os.environ.get("SHL_SEMANTIC_CACHE_TTL", "3600")),
             )
+        
+        # Fusion parameters (tuned offline by tune_fusion.py)
+        self.fusion_config = load_fusion_config()
+        print(f"Fusion config: {self.fusion_config}")
+        
+        # Query expansion mode (see EXPANSION_MODES) and retrieval depth handed to the reranker
+        self.expansion = os.environ.get("SHL_EXPANSION", "auto")
+        self.candidate_k = int(os.environ.get("SHL_CANDIDATES", "20"))
+        
+        # Field weights for multi-field dense scoring; None = single-vector FAISS (see field_index.py)
+        self.field_weights = parse_field_weights(os.environ.get("SHL_FIELD_WEIGHTS"))
+        self._field_index()
+            
+        # Rerank mode: "single" sends every candidate in one prompt, "windowed" reranks
+        # overlapping windows concurrently and merges them (see _rerank_windowed)
+        self.rerank_mode = os.environ.get("SHL_RERANK_MODE", "single")
+        self.rerank_window = int(os.environ.get("SHL_RERANK_WINDOW", "8"))
+        self.rerank_overlap = int(os.environ.get("SHL_RERANK_OVERLAP", "2"))
+        
+        # Per-query candidate depth and rerank skipping from retrieval confidence (see confidence.py)
+        self.adaptive = AdaptivePolicy.from_env()
+        
+        # Chunked scoring of long queries such as full job descriptions (see long_query.py)
+        self.long_query = LongQueryPolicy.from_env()
+        
+        # LLM provider for expansion + rerank (Gemini or a local OpenAI-compatible server, see llm_providers.py)
+        provider = configured_provider()
+        self.llm = create_llm(provider)
+        if self.llm is None:
+            print("WARNING: no LLM provider configured (GOOGLE_API_KEY / SHL_LLM_PROVIDER). LLM features will be disabled.")
         else:
-            print("WARNING: GOOGLE_API_KEY not found. LLM features will be disabled.")
-            self.llm = None
+            print(f"LLM provider: {provider} (model {getattr(self.llm, 'model', 'unknown')})")
+    
+    def _use_default_catalog(self):
+        default = self.catalogs.default
+        self.catalog_id = default.catalog_id
+        self.manifest = default.manifest
+        self.index_version = default.index_version
+        self.index = default.index
+        self.metadata = default.metadata
+        self.bm25 = default.bm25
+        self.local_expander = default.local_expander
+        self.similarity = default.similarity
+    
+    def variant(self, overrides: Dict[str, Any]) -> "RecommendationEngine":
+        """
+        Copy of this engine with some settings replaced (keys of VARIANT_SETTINGS), sharing
+        the model, catalogs and LLM it does not override. Variants have no batcher and no
+        semantic cache, so they never touch the serving path's queues or cached answers.
+        An `embedding_model` variant serves only the default catalog, re-indexed under
+        data/shadow/. `llm` is a dict of create_llm() arguments, e.g. {"provider": "none"};
+        `adaptive` and `long_query` dicts of AdaptivePolicy / LongQueryPolicy arguments,
+        or None to turn them off; `field_weights` a dict of field -> weight, or None.
+        """
+        unknown = set(overrides) - set(VARIANT_SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown variant setting(s) {', '.join(sorted(unknown))}")
+        if overrides.get("expansion", self.expansion) not in EXPANSION_MODES:
+            raise ValueError(f"expansion must be one of {', '.join(EXPANSION_MODES)}")
+        if overrides.get("rerank_mode", self.rerank_mode) not in RERANK_MODES:
+            raise ValueError(f"rerank_mode must be one of {', '.join(RERANK_MODES)}")
+        
+        variant = copy.copy(self)
+        variant.batcher = None
+        variant.semantic_cache = None
+        if "embedding_model" in overrides and overrides["embedding_model"] != self.model_name:
+            variant.model_name = overrides["embedding_model"]
+            variant.model = get_model(variant.model_name)
+            variant.catalogs = shadow_registry(self.catalogs, variant.model, variant.model_name)
+            variant._use_default_catalog()
+        if "fusion" in overrides:
+            variant.fusion_config = dict(self.fusion_config, **overrides["fusion"])
+        if "expansion" in overrides:
+            variant.expansion = overrides["expansion"]
+        if "candidates" in overrides:
+            variant.candidate_k = int(overrides["candidates"])
+        for setting in ("rerank_mode", "rerank_window", "rerank_overlap"):
+            if setting in overrides:
+                setattr(variant, setting, overrides[setting])
+        if "llm" in overrides:
+            variant.llm = create_llm(**overrides["llm"])
+        if "adaptive" in overrides:
+            variant.adaptive = AdaptivePolicy(**overrides["adaptive"]) if overrides["adaptive"] else None
+        if "field_weights" in overrides:
+            variant.field_weights = parse_field_weights(overrides["field_weights"])
+            # Embed the default catalog's fields now rather than on the variant's first request
+            variant._field_index()
+        if "long_query" in overrides:
+            variant.long_query = LongQueryPolicy(**overrides["long_query"]) if overrides["long_query"] else None
+        return variant
+    
+    def pipeline_fingerprint(self) -> str:
+        """Hash of the settings that shape an answer besides the query and the index (used for ETags)."""
+        config = {
+            "fusion": self.fusion_config,
+            "retrieval": [self.expansion, self.candidate_k, self.field_weights],
+            "rerank": [self.rerank_mode, self.rerank_window, self.rerank_overlap],
+            "adaptive": self.adaptive.settings() if self.adaptive is not None else None,
+            "long_query": self.long_query.settings() if self.long_query is not None else None,
+            "llm": [type(self.llm).__name__, getattr(self.llm, "model", None)] if self.llm else None,
+            "local_expansion": self.local_expander is not None,
+            "semantic_cache": self.semantic_cache.threshold if self.semantic_cache is not None else None,
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
     
-    def _build_bm25_index(self):
-        """Build BM25 index from assessment metadata for keyword matching."""
-        print("Building BM25 index...")
-        corpus = []
-        for item in self.metadata:
-            # Combine name, description, and test types for BM25
-            text = f"{item['name']} {item.get('description', '')} {' '.join(item.get('test_type', []))}"
-            # Tokenize
-            tokens = re.findall(r'\w+', text.lower())
-            corpus.append(tokens)
-        self.bm25 = BM25Okapi(corpus)
-        print(f"BM25 index built with {len(corpus)} documents.")
+    def _catalog(self):
+        """Catalog of the current request: a CatalogBundle, or the engine itself for the default one."""
+        return _request_catalog.get() or self
+
+    def _fallback(self, stage_name: str, reason: str, failed: bool = False):
+        """Record that a stage fell back to its non-LLM result."""
+        if observed():
+            if failed:
+                LLM_FAILURES.inc(stage=stage_name)
+            LLM_FALLBACKS.inc(stage=stage_name, reason=reason)
+        tracing.record_fallback(stage_name, reason)
+        fallbacks = _request_fallbacks.get()
+        if fallbacks is not None:
+            fallbacks.append((stage_name, reason))
+
+    def _check_cancelled(self, stage_name: str):
+        """Stop work for a request whose client disconnected (checked before costly stages)."""
+        cancelled = _request_cancelled.get()
+        if cancelled is not None and cancelled.is_set():
+            tracing.annotate(None, cancelled_before=stage_name)
+            raise RequestCancelled(f"Request cancelled before {stage_name}")
+
+    def _record_usage(self, prompt_chars: int, response: Any):
+        usage = _request_usage.get()
+        if usage is not None:
+            usage.add(prompt_chars, response)
+
+    def _skip_llm(self, stage_name: str) -> bool:
+        """True (and the fallback recorded) when this request must not call the LLM."""
+        self._check_cancelled(stage_name)
+        if not self.llm:
+            self._fallback(stage_name, "disabled")
+            return True
+        if not _request_use_llm.get():
+            self._fallback(stage_name, "retrieval_only")
+            return True
+        return False
 
     def expand_query(self, query: str) -> str:
         """
         Use LLM to expand user query with awareness of available assessment types and skills.
-        Includes catalog context for better vocabulary matching.
+        Includes catalog context for better vocabulary matching. The LLM is skipped when
+        the local expansion dictionary covers every skill term in the query, or always
+        with expansion="local".
         """
-        if not self.llm:
+        if self.expansion == "off":
+            self._count_expansion("none")
             return query
+        local_expander = self._catalog().local_expander
+        local = local_expander.expand(query) if local_expander is not None else None
+        fallback_query = local.text if local is not None else query
+        if local is not None and (local.covered or self.expansion == "local"):
+            self._count_expansion("local" if local.matched else "none")
+            print(f"Expanded Query (local): {local.text}")
+            tracing.annotate("expand", input=query, output=local.text, source="local", matched=local.matched)
+            return local.text
+        if self.expansion == "local":
+            self._count_expansion("none")
+            return query
+
+        if self._skip_llm("expand"):
+            self._count_expansion("local" if local is not None and local.matched else "none")
+            return fallback_query
 
         # Catalog context - available assessment types and common skill keywords
         catalog_context = """
@@ -89,6 +281,8 @@ Technical: Engineering, Data, Analytics, QA, Testing, Automation
 Soft Skills: Communication, Leadership, Interpersonal, Collaboration
 Levels: Entry Level, Advanced, Professional, Manager, Executive
 """
+        if local is not None and local.matched:
+            catalog_context += "\nCATALOG TESTS MATCHING TERMS IN THIS QUERY:\n" + ", ".join(local.phrases) + "\n"
 
         template = """
         You are an expert at understanding job requirements and matching them to SHL assessment tests.
@@ -117,67 +311,183 @@ Levels: Entry Level, Advanced, Professional, Manager, Executive
         
         try:
             response = chain.invoke({"query": query, "catalog_context": catalog_context})
+            self._record_usage(len(template) + len(catalog_context) + len(query), response)
             expanded = response.content.strip()
             print(f"Expanded Query: {expanded}")
+            self._count_expansion("llm")
+            tracing.annotate("expand", input=query, output=expanded, source="llm")
             return expanded
         except Exception as e:
             print(f"Query expansion failed: {e}")
-            return query
+            self._fallback("expand", "error", failed=True)
+            tracing.annotate("expand", input=query, error=repr(e))
+            return fallback_query
+
+    def _count_expansion(self, source: str):
+        if observed():
+            EXPANSIONS.inc(source=source)
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        """BM25 score for every document in the catalog."""
+        with stage("bm25"):
+            return self._bm25_scores(query)
+
+    def _bm25_scores(self, text: str) -> np.ndarray:
+        query_tokens = re.findall(r'\w+', text.lower())
+        return np.asarray(self._catalog().bm25.get_scores(query_tokens), dtype=np.float64)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed a single query (through the batcher when enabled)."""
+        if self.batcher is not None:
+            result = self.batcher.submit(query).result()
+            record("encode_queue", result.queue_wait)
+            record("encode", result.encode_seconds)
+            return result.vector
+        with stage("encode"):
+            return self._encode([query])[0]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Unbatched encode, within the thread budget's concurrent-encode limit."""
+        if self.encode_slots is None:
+            return self.model.encode(texts).astype('float32')
+        with self.encode_slots:
+            return self.model.encode(texts).astype('float32')
+
+    def dense_scores(self, query: str) -> np.ndarray:
+        """
+        Semantic score for every document in the catalog (negated L2 distance,
+        so higher is better like BM25; field-weighted cosine similarity when
+        field weights are set, see field_index.py).
+        """
+        catalog = self._catalog()
+        fields = self._field_index()
+        if fields is not None:
+            query_vector = self.encode_query(query)
+            with stage("faiss"):
+                scores = fields.scores(query_vector, self.field_weights)[0].astype(np.float64)
+            tracing.annotate("faiss", index="fields", field_weights=self.field_weights)
+            return scores
+        if self.batcher is not None:
+            result = self.batcher.search(query, catalog.index, catalog.index.ntotal)
+            record("encode_queue", result.queue_wait)
+            record("encode", result.encode_seconds)
+            record("faiss", result.search_seconds)
+            distances, faiss_indices = result.distances, result.ids
+        else:
+            with stage("encode"):
+                query_vector = self._encode([query])
+            with stage("faiss"):
+                distances, faiss_indices = catalog.index.search(query_vector, catalog.index.ntotal)
+            distances, faiss_indices = distances[0], faiss_indices[0]
+        return self._distance_scores(distances, faiss_indices, len(catalog.metadata))
+
+    def _field_index(self):
+        """The catalog's FieldIndex when field weights are configured (built on first use), else None."""
+        if self.field_weights is None:
+            return None
+        return (_request_catalog.get() or self.catalogs.default).field_index()
+
+    @staticmethod
+    def _distance_scores(distances: np.ndarray, faiss_indices: np.ndarray, size: int) -> np.ndarray:
+        valid = (faiss_indices >= 0) & (faiss_indices < size)
+        # Documents missing from the index get the worst observed score
+        scores = np.full(size, -float(distances[valid].max(initial=0.0)))
+        scores[faiss_indices[valid]] = -distances[valid]
+        return scores
+
+    def chunked_scores(self, chunks: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 and dense scores of a chunked long query, pooled per document (see long_query.py).
+        All chunks go through one batched encode and one multi-row FAISS search, outside
+        the micro-batcher, whose batches are sized for single-sentence queries.
+        """
+        catalog = self._catalog()
+        with stage("bm25"):
+            bm25_scores = self.long_query.pool(np.stack([self._bm25_scores(chunk) for chunk in chunks]))
+        with stage("encode"):
+            vectors = self._encode(chunks)
+        fields = self._field_index()
+        with stage("faiss"):
+            if fields is not None:
+                dense_matrix = fields.scores(vectors, self.field_weights).astype(np.float64)
+            else:
+                distances, faiss_indices = catalog.index.search(vectors, catalog.index.ntotal)
+                size = len(catalog.metadata)
+                dense_matrix = np.stack([self._distance_scores(distances[row], faiss_indices[row], size)
+                                         for row in range(len(chunks))])
+        dense_scores = self.long_query.pool(dense_matrix)
+        if observed():
+            LONG_QUERY_CHUNKS.observe(len(chunks))
+        tracing.annotate("encode", chunks=len(chunks), pooling=self.long_query.pooling)
+        return bm25_scores, dense_scores
 
     def hybrid_search(self, query: str, k: int = 20) -> List[Dict]:
         """
         Hybrid retrieval using BM25 (keyword) + FAISS (semantic).
         Returns top-k candidates combining both methods.
         """
+        return self._hybrid_search(query, k)[0]
+
+    def _hybrid_search(self, query: str, k: int,
+                       top_n: Optional[int] = None) -> Tuple[List[Dict], Optional[RetrievalConfidence]]:
+        """
+        hybrid_search() plus, when adaptive reranking is on and `top_n` is given, the
+        retrieval confidence of the query; its depth replaces k.
+        """
         # 1. Expand query for better retrieval
-        expanded_query = self.expand_query(query)
-        
-        # 2. BM25 keyword search
-        query_tokens = re.findall(r'\w+', expanded_query.lower())
-        bm25_scores = self.bm25.get_scores(query_tokens)
-        bm25_top_indices = np.argsort(bm25_scores)[::-1][:k]
-        
-        # 3. FAISS semantic search
-        query_vector = self.model.encode([expanded_query]).astype('float32')
-        distances, faiss_indices = self.index.search(query_vector, k)
-        faiss_top_indices = faiss_indices[0]
-        
-        # 4. Combine results using Reciprocal Rank Fusion (RRF)
-        rrf_scores = {}
-        rrf_k = 60  # RRF constant
-        
-        for rank, idx in enumerate(bm25_top_indices):
-            if idx not in rrf_scores:
-                rrf_scores[idx] = 0
-            rrf_scores[idx] += 1.0 / (rrf_k + rank + 1)
-            
-        for rank, idx in enumerate(faiss_top_indices):
-            if idx not in rrf_scores:
-                rrf_scores[idx] = 0
-            rrf_scores[idx] += 1.0 / (rrf_k + rank + 1)
+        with stage("expand"):
+            expanded_query = self.expand_query(query)
         
-        # Sort by RRF score and get top-k
-        sorted_indices = sorted(rrf_scores.keys(), key=lambda x: rrf_scores[x], reverse=True)[:k]
+        # 2 & 3. BM25 keyword + FAISS semantic search over the full catalog; long queries
+        # are scored chunk by chunk and pooled per document
+        chunks = self.long_query.chunks(query, expanded_query) if self.long_query is not None else None
+        if chunks is not None:
+            bm25_scores, dense_scores = self.chunked_scores(chunks)
+        else:
+            bm25_scores = self.bm25_scores(expanded_query)
+            dense_scores = self.dense_scores(expanded_query)
         
-        results = [self.metadata[idx] for idx in sorted_indices if idx < len(self.metadata)]
-        print(f"Hybrid search returned {len(results)} candidates (BM25 + FAISS with RRF)")
+        # 4. Fuse the full score arrays (strategy and weights from fusion_config.json)
+        with stage("fuse"):
+            fused_scores = fuse_scores(bm25_scores, dense_scores, self.fusion_config)
+            confidence = None
+            if self.adaptive is not None and top_n is not None:
+                confidence = self.adaptive.assess(query, bm25_scores, dense_scores, fused_scores,
+                                                  self._catalog().metadata, top_n)
+                k = confidence.depth
+            top_indices = top_k_indices(fused_scores, k)
         
-        return results
+        results = [self._catalog().metadata[idx] for idx in top_indices]
+        if tracing.active():
+            self._trace_candidates(bm25_scores, dense_scores, fused_scores, top_indices)
+            if confidence is not None:
+                tracing.annotate("fuse", **confidence.to_dict())
+        print(f"Hybrid search returned {len(results)} candidates (BM25 + FAISS, {self.fusion_config['strategy']} fusion)")
+        
+        return results, confidence
 
-    def rerank_with_full_data(self, query: str, candidates: List[Dict], top_n: int = 10) -> List[Dict]:
-        """
-        Use LLM to rerank candidates with FULL assessment data (name, description, duration, test_type).
-        """
-        if not self.llm:
-            return candidates[:top_n]
-            
+    def _trace_candidates(self, bm25_scores, dense_scores, fused_scores, top_indices):
+        """Attach the per-retriever candidate lists and fused scores to the current trace."""
+        n = len(top_indices)
+        metadata = self._catalog().metadata
+        for stage_name, scores in (("bm25", bm25_scores), ("faiss", dense_scores)):
+            top = top_k_indices(scores, n)
+            tracing.annotate(stage_name, candidates=[
+                {"id": int(i), "name": metadata[i]['name'], "score": round(float(scores[i]), 4)} for i in top
+            ])
+        tracing.annotate("fuse", strategy=self.fusion_config["strategy"], candidates=[
+            {"id": int(i), "name": metadata[i]['name'], "score": round(float(fused_scores[i]), 5)} for i in top_indices
+        ])
+
+    def _rerank_select(self, query: str, candidates: List[Dict], top_n: int) -> List[int]:
+        """Ask the LLM for the top_n candidates; returns their valid indices, best first."""
         # Construct detailed candidate info
         candidates_text = ""
         for i, cand in enumerate(candidates):
             name = cand.get('name', 'Unknown')
             desc = cand.get('description', 'No description')[:200]  # Limit description length
             duration = cand.get('duration', 0)
-            test_types = ', '.join(cand.get('test_type', []))
+            test_types = joined(cand, 'test_type')
             remote = cand.get('remote_support', 'Unknown')
             
             candidates_text += f"""
@@ -211,49 +521,204 @@ ID {i}: {name}
         
         prompt = ChatPromptTemplate.from_template(template)
         chain = prompt | self.llm
+        prompt_chars = len(template) + len(candidates_text) + len(query)
+        tracing.annotate("rerank", prompt_chars=prompt_chars)
+        response = chain.invoke({
+            "query": query,
+            "candidates": candidates_text,
+            "top_n": top_n
+        })
+        self._record_usage(prompt_chars, response)
+        
+        text = response.content.replace("```json", "").replace("```", "").strip()
+        selected_ids = []
+        for idx in json.loads(text):
+            try:
+                idx = int(idx)
+                if 0 <= idx < len(candidates):
+                    selected_ids.append(idx)
+            except ValueError:
+                continue
+        return selected_ids
+
+    def rerank_with_full_data(self, query: str, candidates: List[Dict], top_n: int = 10) -> List[Dict]:
+        """
+        Use LLM to rerank candidates with FULL assessment data (name, description, duration, test_type).
+        With SHL_RERANK_MODE=windowed, long candidate lists are reranked in overlapping windows;
+        with "none" the retrieval order is served as is.
+        """
+        if self.rerank_mode == "none":
+            return candidates[:top_n]
+        if self._skip_llm("rerank"):
+            return candidates[:top_n]
+        if self.rerank_mode == "windowed" and len(candidates) > self.rerank_window:
+            return self._rerank_windowed(query, candidates, top_n)
         
+        tracing.annotate("rerank", candidates=len(candidates))
         try:
             print(f"Reranking {len(candidates)} candidates with full data...")
-            response = chain.invoke({
-                "query": query,
-                "candidates": candidates_text,
-                "top_n": top_n
-            })
-            
-            text = response.content.replace("```json", "").replace("```", "").strip()
-            selected_ids = json.loads(text)
+            selected_ids = self._rerank_select(query, candidates, top_n)
             print(f"LLM Selected IDs: {selected_ids}")
+            tracing.annotate("rerank", selected_ids=selected_ids)
             
-            final_results = []
-            for idx in selected_ids:
-                try:
-                    idx = int(idx)
-                    if 0 <= idx < len(candidates):
-                        final_results.append(candidates[idx])
-                except ValueError:
-                    continue
-            
-            if len(final_results) < 1:
+            if len(selected_ids) < 1:
+                self._fallback("rerank", "empty_selection", failed=True)
                 return candidates[:top_n]
                 
-            return final_results[:top_n]
+            return [candidates[idx] for idx in selected_ids][:top_n]
             
         except Exception as e:
             print(f"Reranking failed: {e}")
+            self._fallback("rerank", "error", failed=True)
+            tracing.annotate("rerank", error=repr(e))
+            return candidates[:top_n]
+
+    def _rerank_windowed(self, query: str, candidates: List[Dict], top_n: int) -> List[Dict]:
+        """
+        Rerank overlapping windows of candidates concurrently with smaller prompts and
+        merge the partial rankings (see fusion.merge_window_rankings). A failed window
+        only costs its own ranking: its candidates keep their retrieval positions.
+        """
+        spans = window_spans(len(candidates), self.rerank_window, self.rerank_overlap)
+        print(f"Reranking {len(candidates)} candidates in {len(spans)} windows of {self.rerank_window}...")
+        usage = _request_usage.get()
+        
+        def rank_window(span):
+            window = candidates[span[0]:span[1]]
+            usage_token = _request_usage.set(usage)
+            try:
+                selected_ids = self._rerank_select(query, window, len(window))
+            finally:
+                _request_usage.reset(usage_token)
+            if not selected_ids:
+                raise ValueError("empty selection")
+            return selected_ids
+        
+        rankings: List[Optional[List[int]]] = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(spans)) as pool:
+            futures = [pool.submit(rank_window, span) for span in spans]
+            for span, future in zip(spans, futures):
+                try:
+                    rankings.append(future.result())
+                except Exception as e:
+                    print(f"Rerank window {span} failed: {e}")
+                    errors.append(f"{span}: {e!r}")
+                    rankings.append(None)
+        tracing.annotate("rerank", candidates=len(candidates), windows=[list(span) for span in spans],
+                         window_rankings=rankings, window_errors=errors)
+        
+        if len(errors) == len(spans):
+            self._fallback("rerank", "error", failed=True)
             return candidates[:top_n]
+        if errors:
+            self._fallback("rerank", "window_error", failed=True)
+        order = merge_window_rankings(len(candidates), spans, rankings)
+        print(f"Merged window ranking: {order[:top_n]}")
+        return [candidates[idx] for idx in order[:top_n]]
     
-    def recommend(self, query: str, top_n: int = 10) -> List[Dict]:
+    def recommend(self, query: str, top_n: int = 10, use_llm: bool = True,
+                  fallbacks: Optional[List] = None, catalog: Optional[str] = None,
+                  cancelled: Optional[threading.Event] = None, usage: Optional[LLMUsage] = None) -> List[Dict]:
         """
         Full pipeline: Query Expansion -> Hybrid Search (BM25+FAISS) -> LLM Rerank with Full Data
+        use_llm=False serves retrieval-only results. Pass a list as `fallbacks` to
+        receive the (stage, reason) of every LLM fallback taken. `catalog` selects a
+        catalog id from the registry (default: the catalog in data/). Setting the
+        `cancelled` event stops the request with RequestCancelled before its next LLM
+        stage. LLM calls and tokens are added to `usage` when given.
         """
-        # Step 1 & 2: Hybrid search (includes query expansion)
-        candidates = self.hybrid_search(query, k=20)
+        bundle = self.catalogs.get(catalog)
         
-        # Step 3: Rerank with full candidate data
-        results = self.rerank_with_full_data(query, candidates, top_n=top_n)
+        # Step 0: Reuse results of a near-duplicate query with the same hard constraints
+        if self.semantic_cache is not None and use_llm:
+            with stage("cache_lookup"):
+                query_vector = self.encode_query(query)
+                constraints = extract_constraints(query) + (("catalog", bundle.catalog_id),
+                                                            ("index", bundle.index_version))
+                cached = self.semantic_cache.get(query_vector, constraints, top_n)
+            tracing.annotate(None, semantic_cache="hit" if cached is not None else "miss")
+            if cached is not None:
+                return cached
+        
+        fallbacks = [] if fallbacks is None else fallbacks
+        token = _request_fallbacks.set(fallbacks)
+        llm_token = _request_use_llm.set(use_llm)
+        catalog_token = _request_catalog.set(None if bundle is self.catalogs.default else bundle)
+        cancelled_token = _request_cancelled.set(cancelled)
+        usage_token = _request_usage.set(usage)
+        try:
+            # Step 1 & 2: Hybrid search (includes query expansion)
+            candidates, confidence = self._hybrid_search(query, self.candidate_k, top_n=top_n)
+            
+            # Step 3: Rerank with full candidate data, unless retrieval is confident enough
+            with stage("rerank"):
+                if confidence is not None and confidence.skip_rerank:
+                    print(f"Rerank skipped (retrieval confidence {confidence.score:.2f})")
+                    results = candidates[:top_n]
+                else:
+                    results = self.rerank_with_full_data(query, candidates, top_n=top_n)
+            if confidence is not None and observed():
+                ADAPTIVE_RERANKS.inc(decision="skipped" if confidence.skip_rerank else "reranked")
+        finally:
+            _request_usage.reset(usage_token)
+            _request_cancelled.reset(cancelled_token)
+            _request_catalog.reset(catalog_token)
+            _request_use_llm.reset(llm_token)
+            _request_fallbacks.reset(token)
+        
+        # Only cache complete answers, not results degraded by an LLM failure
+        if self.semantic_cache is not None and use_llm and all(reason == "disabled" for _, reason in fallbacks):
+            self.semantic_cache.put(query_vector, constraints, results, top_n, query)
         
         return results
 
+    def recommend_fanout(self, query: str, catalogs: List[str], top_n: int = 10,
+                         use_llm: bool = True, rrf_k: int = 60,
+                         fallbacks: Optional[List] = None,
+                         cancelled: Optional[threading.Event] = None,
+                         usage: Optional[LLMUsage] = None) -> List[Dict]:
+        """
+        Run recommend() on several catalogs concurrently and merge the ranked lists
+        by reciprocal rank (deduplicated by URL). Each result gets a "catalog" key.
+        """
+        catalogs = list(dict.fromkeys(catalogs))
+        unknown = [catalog_id for catalog_id in catalogs if catalog_id not in self.catalogs.specs]
+        if unknown:
+            raise UnknownCatalogError(f"Unknown catalog(s) {', '.join(unknown)}. "
+                                      f"Available: {', '.join(self.catalogs.available())}")
+        with ThreadPoolExecutor(max_workers=len(catalogs)) as pool:
+            # Run each branch in a copy of this context so timings/traces reach the request
+            futures = {
+                catalog_id: pool.submit(contextvars.copy_context().run, self.recommend,
+                                        query, top_n, use_llm, fallbacks, catalog_id, cancelled, usage)
+                for catalog_id in catalogs
+            }
+            ranked = {catalog_id: future.result() for catalog_id, future in futures.items()}
+        
+        scores: Dict[str, float] = {}
+        merged: Dict[str, Dict] = {}
+        for catalog_id, results in ranked.items():
+            for rank, item in enumerate(results):
+                url = item['url']
+                scores[url] = scores.get(url, 0.0) + 1.0 / (rrf_k + rank + 1)
+                if url not in merged:
+                    merged[url] = dict(item, catalog=catalog_id)
+        order = sorted(merged, key=lambda url: scores[url], reverse=True)
+        return [merged[url] for url in order[:top_n]]
+
+    def similar(self, key: str, limit: int = 10, max_duration: Optional[int] = None,
+                test_types: Optional[List[str]] = None, catalog: Optional[str] = None) -> List[Dict]:
+        """
+        "More like this": precomputed neighbours of an assessment id (see similarity.py),
+        no retrieval or LLM calls. Raises UnknownAssessmentError for unknown ids.
+        """
+        bundle = self.catalogs.get(catalog)
+        neighbors = bundle.similarity.similar(key, bundle.metadata, limit=limit,
+                                              max_duration=max_duration, test_types=test_types)
+        return [dict(bundle.metadata[row], id=assessment_id(bundle.metadata[row]), score=round(score, 4))
+                for row, score in neighbors]
+
     # Keep old methods for backward compatibility
     def search(self, query, k=100, apply_filters=True):
         """Legacy search method - redirects to hybrid_search."""
@@ -0,0 +1,370 @@
+"""
+Local query expansion from a dictionary mined out of the catalog.
+
+At ingest time every assessment name (and acronyms defined in descriptions,
+e.g. "Search Engine Optimization (SEO)") is turned into aliases that map to
+catalog vocabulary: "excel" -> "MS Excel", "python" -> "Python", "aws" ->
+"Amazon Web Services". At query time an Aho-Corasick automaton finds every
+alias in one pass.
+
+Name words that also read as hiring or job-ad language ("sales", "hiring",
+"email") are never aliases. An alias is confident when it names few
+assessments (at most MAX_EXPANSIONS_PER_ALIAS) and its precision is at least
+CONFIDENT_ALIAS_PRECISION. Precision is the share of the alias's catalog
+occurrences that are in assessment names rather than other assessments'
+descriptions. Full names and acronyms whose letters match the defining phrase
+are confident. Some aliases are never confident and are only hints:
+- "java", which names nine assessments;
+- initialisms generated from names ("ads" for "Automata Data Science");
+- ordinary English words (COMMON_ENGLISH: "anywhere", "accent").
+
+Version strings such as "4.5" are never aliases. A short alias of up to
+SHORT_ALIAS_LENGTH letters is confident only when the raw query spells it as a
+skill term ("AWS", not "ads" in running text).
+
+The engine skips the LLM expansion call only when every match is confident and
+the dictionary covers every skill-like term detected in the query. Otherwise
+the matches are passed to the LLM as catalog hints. PROBE_QUERIES are job-ad
+sentences that must never count as covered. ingest.py warns when they do, and
+experiments/check_expansion_dictionary.py fails.
+
+Settings (environment variables, read by the engine):
+    SHL_LOCAL_EXPANSION   1 to expand locally when possible (default 1)
+"""
+import re
+import json
+from collections import Counter as TokenCounter, defaultdict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .observability import Counter
+
+EXPANSIONS = Counter(
+    "shl_query_expansions_total", "Query expansions by source (local, llm, none).", ["source"])
+
+# Name tokens that describe the test rather than a skill
+GENERIC_WORDS = {
+    "new", "test", "tests", "testing", "programming", "development", "developer", "engineering",
+    "simulation", "solution", "solutions", "report", "reports", "level", "advanced", "entry",
+    "basic", "skills", "skill", "assessment", "assessments", "concepts", "fundamentals",
+    "essentials", "and", "of", "the", "for", "with", "in", "to", "on", "us", "uk", "professional",
+    "interactive", "short", "form", "general", "knowledge", "ability", "profile", "questionnaire",
+    "instrument", "edition", "version", "online", "standard", "framework", "frameworks", "split",
+    "screen", "pro", "plus", "job", "focused", "sift", "out", "series", "universal", "based",
+    "is", "it", "what", "your", "an", "at", "by", "as", "or", "from", "value", "different", "kind",
+}
+# Name words that are hiring or job-ad language in a query, not a skill
+ALIAS_STOPWORDS = {
+    "hiring", "interview", "interviewing", "sales", "email", "writing", "executive", "graduate",
+    "office", "front", "end", "global", "next", "generation", "key", "call", "live", "human",
+    "resources", "employee", "guide", "smart", "action", "power", "production", "forms", "basis",
+    "reviewing", "implementation", "enterprise", "phone", "instructions", "reading", "core",
+    "essential", "cards", "styles", "comparison", "money", "risk", "retail", "media", "virtual",
+    "customer", "service", "manager", "managerial", "management", "team", "business", "support",
+}
+# Name words that are ordinary English in a query: still hints, never confident
+COMMON_ENGLISH = {
+    "a", "about", "all", "an", "and", "any", "anywhere", "are", "as", "at", "be", "by", "can", "for",
+    "from", "have", "in", "is", "it", "more", "new", "not", "of", "on", "one", "or", "our", "out",
+    "run", "so", "that", "the", "their", "this", "to", "up", "we", "will", "with", "you", "your",
+    "accent", "accounting", "advertising", "agile", "banking", "beans", "beverage", "calculation",
+    "capital", "cashier", "centers", "checking", "chemical", "chemistry", "civil", "cloud",
+    "communications", "computing", "contributor", "conversational", "count", "demand",
+    "dependability", "desk", "desktop", "distribution", "electrical", "emotional", "engine",
+    "european", "exercises", "filing", "financial", "fire", "fix", "food", "functional",
+    "fundamental", "health", "hotel", "housekeeping", "indian", "infrastructure", "intelligence",
+    "intermediate", "interpersonal", "lab", "literacy", "load", "manual", "marketing", "maximising",
+    "mechanical", "medical", "micro", "mining", "mobility", "multitasking", "names", "north",
+    "nursing", "objects", "pack", "paint", "payable", "planner", "premium", "prism", "profiler",
+    "profiling", "readiness", "receivable", "runner", "safety", "search", "shell", "social",
+    "spelling", "statistics", "sterling", "ten", "unified", "unlocking", "windows", "u.s.", "u.k.",
+}
+# Aliases of at most this many letters ("ads", "aws") need skill-term spelling in the query
+SHORT_ALIAS_LENGTH = 4
+# Job-ad sentences the dictionary must not cover (ordinary words, initialisms, version numbers)
+PROBE_QUERIES = (
+    "hiring for accounting roles anywhere",
+    "Candidates will run ads for our agile team",
+    "We need someone with 4.5 years of experience, version 1.4 is fine",
+    "Looking for an accent neutral cashier with anc and apc experience",
+)
+# Aliases that point at more assessments than this are too vague to expand
+MAX_NAMES_PER_ALIAS = 25
+# A name word that other assessments' descriptions use this often is ordinary
+# English ("team", "business"), not a skill term
+MAX_OTHER_DESCRIPTION_MENTIONS = 4
+# Catalog phrases appended per matched alias
+MAX_EXPANSIONS_PER_ALIAS = 3
+# Share of a name word's catalog occurrences that must be in names for the alias to skip the LLM
+CONFIDENT_ALIAS_PRECISION = 0.5
+
+# Capitalised words that carry no skill on their own
+COMMON_CAPITALIZED = {
+    "i", "we", "our", "you", "the", "a", "an", "hi", "hello", "please", "need", "looking", "want",
+    "can", "could", "would", "also", "and", "or", "with", "for", "in", "of", "am", "is", "are",
+    "job", "role", "description", "candidate", "candidates", "team", "company", "about", "us",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+}
+_NAME_SUFFIX = re.compile(r'\s*(\(new\)|\(adaptive\)|-\s*us|-\s*uk)\s*$', re.I)
+_ACRONYM_DEFINITION = re.compile(
+    r'\b([A-Z][A-Za-z]+(?:\s+(?:[A-Z][A-Za-z]+|and|of|&)){1,5})\s*\(([A-Z][A-Za-z0-9]{1,7})\)')
+_QUERY_TOKEN = re.compile(r'(?<![\w.+#])([A-Za-z.][A-Za-z0-9]*(?:[.+#][A-Za-z0-9+#]*)*)')
+_SENTENCE_END = re.compile(r'[.!?:;\n]\s*$')
+_CONNECTORS = {"and", "of", "&"}
+_VERSION_ONLY = re.compile(r'[a-z]?\d+(?:\.\d+)*\W*')
+
+
+def clean_name(name: str) -> str:
+    """Assessment name without catalog suffixes such as "(New)"."""
+    previous = None
+    while previous != name:
+        previous, name = name, _NAME_SUFFIX.sub("", name).strip()
+    return name
+
+
+def _name_tokens(name: str) -> List[str]:
+    tokens = []
+    for raw in re.split(r'[\s/,()]+', name):
+        token = raw.strip("-:'\"").lower()
+        if len(token) < 2 and not re.search(r'[+#]', token):
+            continue
+        if token in GENERIC_WORDS or token.isdigit():
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def _acronym_phrase(phrase: str, acronym: str) -> Optional[str]:
+    """
+    Trailing words of `phrase` whose initials spell `acronym` ("Microsoft Structure
+    Query Language", "SQL" -> "Structure Query Language"), or None.
+    """
+    letters = re.sub(r'[^A-Z]', '', acronym)
+    if len(letters) < 2 or not re.fullmatch(r'[A-Z][A-Z0-9]+', acronym):
+        return None
+    words = phrase.split()
+    for start in range(len(words)):
+        tail = words[start:]
+        for initials in ("".join(w[0] for w in tail),
+                         "".join(w[0] for w in tail if w.lower() not in _CONNECTORS)):
+            if initials.upper() == letters and tail[0][0].isupper():
+                return " ".join(tail)
+    return None
+
+
+def mine_expansion_dictionary(assessments: List[Dict]) -> Dict[str, Any]:
+    """
+    {"terms": alias -> catalog phrases, "confident": aliases that may skip the LLM},
+    mined from assessment names and descriptions. Aliases are lower-case; phrases
+    keep catalog spelling.
+    """
+    aliases: Dict[str, List[str]] = defaultdict(list)
+    # Aliases with at least one low-confidence source
+    weak = set()
+
+    def add(alias: str, phrase: str, confident: bool = True):
+        alias = alias.lower().strip()
+        # "4.5", "v1.1", "360°": version strings match numbers in any query
+        if len(alias) < 2 or alias in ALIAS_STOPWORDS or _VERSION_ONLY.fullmatch(alias):
+            return
+        if phrase not in aliases[alias]:
+            aliases[alias].append(phrase)
+        if not confident or alias in COMMON_ENGLISH:
+            weak.add(alias)
+
+    names = [clean_name(item.get("name", "")) for item in assessments]
+    name_tokens = [set(_name_tokens(name)) for name in names]
+    description_words = [set(re.findall(r'[\w+#.]+', item.get("description", "").lower())) for item in assessments]
+    support = TokenCounter(token for tokens in name_tokens for token in tokens)
+    mentions: Dict[str, int] = defaultdict(int)
+    for tokens, words in zip(name_tokens, description_words):
+        for word in words - tokens:
+            mentions[word] += 1
+
+    for item, name, tokens in zip(assessments, names, name_tokens):
+        if not name:
+            continue
+        add(name, name)
+        for token in tokens:
+            if mentions[token] <= MAX_OTHER_DESCRIPTION_MENTIONS:
+                precision = support[token] / (support[token] + mentions[token])
+                add(token, name, confident=precision >= CONFIDENT_ALIAS_PRECISION)
+        words = [w for w in re.findall(r'[A-Za-z]+', name) if w.lower() not in GENERIC_WORDS]
+        if len(words) >= 3 and all(w[0].isupper() for w in words):
+            # "Search Engine Optimization" -> "seo"; a guess, so never confident ("ads", "anc")
+            add("".join(w[0] for w in words), name, confident=False)
+        for phrase, acronym in _ACRONYM_DEFINITION.findall(name + " " + item.get("description", "")):
+            # Only real acronyms of the words before them: not "Email Writing (Sales)"
+            phrase = _acronym_phrase(phrase, acronym)
+            if phrase is None:
+                continue
+            add(acronym, phrase)
+            add(phrase, phrase)
+            add(acronym, name)
+
+    terms = {}
+    for alias, phrases in aliases.items():
+        if len(phrases) > MAX_NAMES_PER_ALIAS:
+            continue
+        # Shorter names are the canonical ones ("Java 8" before "Java Frameworks")
+        terms[alias] = sorted(phrases, key=len)[:MAX_EXPANSIONS_PER_ALIAS]
+    confident = [alias for alias, phrases in aliases.items()
+                 if alias in terms and alias not in weak and len(phrases) <= MAX_EXPANSIONS_PER_ALIAS]
+    return {"terms": dict(sorted(terms.items())), "confident": sorted(confident)}
+
+
+def save_expansion_dictionary(dictionary: Dict[str, Any], path: str):
+    with open(path, 'w') as f:
+        json.dump({"version": 2, "terms": dictionary["terms"], "confident": dictionary["confident"]}, f, indent=2)
+
+
+def load_expansion_dictionary(path: str) -> Dict[str, Any]:
+    """Version 1 files have no confidence data: none of their aliases skip the LLM."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {"terms": data["terms"], "confident": data.get("confident", [])}
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: every dictionary alias found in one pass over the text."""
+
+    def __init__(self, patterns: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str):
+        node = 0
+        for char in pattern:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._output[node].append(pattern)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """All (start, end, pattern) occurrences, overlapping ones included."""
+        matches = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for pattern in self._output[node]:
+                matches.append((position - len(pattern) + 1, position + 1, pattern))
+        return matches
+
+
+class LocalExpansion:
+    def __init__(self, query: str, phrases: List[str], matched: List[str], uncovered: List[str],
+                 unconfident: Optional[List[str]] = None):
+        self.phrases = phrases
+        self.matched = matched
+        self.uncovered = uncovered
+        self.unconfident = unconfident or []
+        self.text = f"{query}. {', '.join(phrases)}" if phrases else query
+
+    @property
+    def covered(self) -> bool:
+        """
+        True when the dictionary matched something, every match is confident and
+        every skill-like term is accounted for.
+        """
+        return bool(self.matched) and not self.uncovered and not self.unconfident
+
+
+class LocalExpander:
+    def __init__(self, dictionary: Dict[str, List[str]], confident: Optional[Iterable[str]] = None):
+        self.dictionary = dictionary
+        # None: every alias is confident (hand-written dictionaries)
+        self.confident = set(dictionary) if confident is None else set(confident)
+        self.matcher = AhoCorasick(list(dictionary.keys()))
+
+    @classmethod
+    def from_mined(cls, mined: Dict[str, Any]) -> "LocalExpander":
+        """From the output of mine_expansion_dictionary() or load_expansion_dictionary()."""
+        return cls(mined["terms"], mined["confident"])
+
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isalnum()
+
+    def match(self, query: str) -> List[Tuple[int, int, str]]:
+        """Leftmost-longest whole-word alias matches."""
+        text = query.lower()
+        candidates = []
+        for start, end, alias in self.matcher.find(text):
+            before = text[start - 1] if start > 0 else " "
+            after = text[end] if end < len(text) else " "
+            if (alias[0].isalnum() and self._is_word_char(before)) or self._is_word_char(after):
+                continue
+            candidates.append((start, end, alias))
+        candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        selected, last_end = [], -1
+        for start, end, alias in candidates:
+            if start >= last_end:
+                selected.append((start, end, alias))
+                last_end = end
+        return selected
+
+    def skill_terms(self, query: str) -> List[Tuple[int, int, str]]:
+        """Tool-like tokens: acronyms, tokens with digits/symbols, mid-sentence capitalised words."""
+        terms = []
+        for match in _QUERY_TOKEN.finditer(query):
+            token = match.group(1).strip(".")
+            if len(token) < 2 and not re.search(r'[+#]', token):
+                continue
+            if token.lower() in COMMON_CAPITALIZED:
+                continue
+            starts_sentence = match.start() == 0 or bool(_SENTENCE_END.search(query[:match.start()]))
+            technical = bool(re.search(r'[0-9+#.]', token)) and not token.isdigit()
+            acronym = token.isupper() and 2 <= len(token) <= 6
+            capitalised = token[0].isupper() and not starts_sentence
+            if technical or acronym or capitalised:
+                terms.append((match.start(), match.start() + len(token), token))
+        return terms
+
+    def _is_confident(self, alias: str, start: int, end: int, terms: List[Tuple[int, int, str]]) -> bool:
+        if alias not in self.confident:
+            return False
+        if alias.isalpha() and len(alias) <= SHORT_ALIAS_LENGTH:
+            # "AWS" or mid-sentence "Ruby", not "ads" in running text
+            return any(s <= start and end <= e for s, e, _ in terms)
+        return True
+
+    def expand(self, query: str) -> LocalExpansion:
+        matches = self.match(query)
+        spans = [(start, end) for start, end, _ in matches]
+        terms = self.skill_terms(query)
+        uncovered = [
+            token for start, end, token in terms
+            if not any(s <= start and end <= e for s, e in spans)
+        ]
+        phrases = []
+        for _, _, alias in matches:
+            for phrase in self.dictionary[alias]:
+                if phrase not in phrases:
+                    phrases.append(phrase)
+        matched = [alias for _, _, alias in matches]
+        unconfident = [alias for start, end, alias in matches if not self._is_confident(alias, start, end, terms)]
+        return LocalExpansion(query, phrases, matched, uncovered, unconfident)
+
+    def covered_probes(self) -> List[str]:
+        """PROBE_QUERIES this dictionary would serve without the LLM (should be none)."""
+        return [query for query in PROBE_QUERIES if self.expand(query).covered]
@@ -0,0 +1,138 @@
+"""
+Local stand-in for the LLM API, used by load tests.
+
+Serves an OpenAI-style POST /v1/chat/completions endpoint that answers like
+FakeLLM (expansion echoes the query, rerank keeps retrieval order) after a
+sleep drawn from a configurable latency distribution, and fails a
+configurable fraction of calls. GET /stats returns call and error counts.
+
+Latency specs (milliseconds):
+    fixed:800
+    uniform:200-1500
+    lognormal:800,0.5      median 800ms, sigma 0.5
+    exponential:800        mean 800ms
+
+Usage:
+    python -m shl_recommender.src.fake_llm_server --port 8900 --latency lognormal:800,0.5 --error-rate 0.02
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from .llm_doubles import FakeLLM
+
+
+def parse_latency(spec: str, seed: int = 0) -> Callable[[], float]:
+    """Latency sampler (seconds) from a spec such as "lognormal:800,0.5"."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    kind, _, args = spec.partition(":")
+    if kind == "fixed":
+        value = float(args or 0)
+        sample = lambda: value
+    elif kind == "uniform":
+        low, high = (float(x) for x in args.split("-"))
+        sample = lambda: rng.uniform(low, high)
+    elif kind == "lognormal":
+        median, sigma = (float(x) for x in args.split(","))
+        sample = lambda: rng.lognormvariate(0.0, sigma) * median
+    elif kind == "exponential":
+        mean = float(args)
+        sample = lambda: rng.expovariate(1.0 / mean)
+    else:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sampler() -> float:
+        with lock:
+            return max(0.0, sample()) / 1000.0
+    return sampler
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: str = "fixed:0", error_rate: float = 0.0, seed: int = 0):
+        super().__init__(address, FakeLLMHandler)
+        self.sample_latency = parse_latency(latency, seed)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed + 1)
+        self.llm = FakeLLM()
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    server: FakeLLMServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": "not found"})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        server = self.server
+        with server.lock:
+            server.stats["calls"] += 1
+            server.stats["in_flight"] += 1
+            server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.stats["in_flight"])
+            fail = server.rng.random() < server.error_rate
+        try:
+            time.sleep(server.sample_latency())
+            if fail:
+                with server.lock:
+                    server.stats["errors"] += 1
+                self._send_json(503, {"error": {"message": "injected failure", "type": "server_error"}})
+                return
+            content = server.llm.respond(prompt)
+            # Token counts approximated from characters, like a real server's usage block
+            prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+            self._send_json(200, {
+                "object": "chat.completion",
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        finally:
+            with server.lock:
+                server.stats["in_flight"] -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake LLM server with configurable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:800,0.5", help="Latency distribution spec (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = FakeLLMServer((args.host, args.port), args.latency, args.error_rate, args.seed)
+    print(f"Fake LLM server on http://{args.host}:{args.port} (latency {args.latency}, errors {args.error_rate:.1%})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
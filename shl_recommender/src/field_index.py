@@ -0,0 +1,109 @@
+"""
+Multi-field dense index: one embedding per assessment field, weighted at query time.
+
+The FAISS index holds one vector per assessment, embedded from the whole
+"Title/Description/Test Type/Job Levels/Languages" text (ingest.document_text).
+Short, specific names such as ".NET MVC (New)" are diluted by long
+descriptions. ingest.py also writes data/field_embeddings.npy: one
+L2-normalized float32 matrix per field, stacked into a single contiguous
+(fields, documents, dim) array:
+
+    name         the assessment name
+    description  the description
+    metadata     test types, job levels and languages
+
+Query vectors are scored against every field of every document with one
+matrix multiply ((queries, dim) x (dim, fields * documents)). The per-field
+cosine similarities are then combined with the configured field weights into
+one dense score per document, which takes the place of the FAISS score in
+fusion. experiments/field_index_report.py compares latency and Recall@10 with
+the single-vector index.
+
+Settings (environment variables):
+    SHL_FIELD_WEIGHTS  e.g. "name=0.5,description=0.3,metadata=0.2" to score with
+                       the field index (default: unset, single-vector FAISS)
+"""
+import os
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .catalog_store import joined
+
+FIELDS = ("name", "description", "metadata")
+
+
+def field_texts(item) -> Dict[str, str]:
+    """Text embedded for each field of an assessment."""
+    return {
+        "name": item.get('name', ''),
+        "description": item.get('description', ''),
+        "metadata": (f"Test Type: {joined(item, 'test_type')}\n"
+                     f"Job Levels: {joined(item, 'job_levels')}\n"
+                     f"Languages: {joined(item, 'languages')}"),
+    }
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype('float32')
+
+
+def build_field_embeddings(model, assessments: List) -> np.ndarray:
+    """(fields, documents, dim) normalized embeddings, from one batched encode of every field text."""
+    texts = [field_texts(item) for item in assessments]
+    flat = [text[field] for field in FIELDS for text in texts]
+    embeddings = np.asarray(model.encode(flat, show_progress_bar=len(flat) > 1000), dtype='float32')
+    return np.ascontiguousarray(normalize_rows(embeddings).reshape(len(FIELDS), len(assessments), -1))
+
+
+def parse_field_weights(value: Union[str, Dict[str, float], None]) -> Optional[Dict[str, float]]:
+    """
+    "name=0.5,description=0.3" (or the same as a dict) -> {"name": 0.5, "description": 0.3,
+    "metadata": 0.0}; None when unset.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = dict(part.partition("=")[::2] for part in value.split(","))
+    weights = {field: 0.0 for field in FIELDS}
+    for field, weight in value.items():
+        field = field.strip()
+        if field not in weights:
+            raise ValueError(f"Unknown field '{field}' in field weights (fields: {', '.join(FIELDS)})")
+        weights[field] = float(weight)
+    return weights
+
+
+class FieldIndex:
+    def __init__(self, embeddings: np.ndarray, fields=FIELDS):
+        self.embeddings = embeddings
+        self.fields = tuple(fields)
+        self.size = embeddings.shape[1]
+        # (fields * documents, dim) view of the same contiguous buffer
+        self.matrix = embeddings.reshape(-1, embeddings.shape[2])
+
+    @classmethod
+    def load(cls, path: str) -> "FieldIndex":
+        # mmap so pre-forked workers share the pages, like the FAISS index
+        mmap_mode = 'r' if os.environ.get("SHL_MMAP_INDEX", "1") == "1" else None
+        return cls(np.load(path, mmap_mode=mmap_mode))
+
+    def save(self, path: str):
+        np.save(path, self.embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes
+
+    def weight_vector(self, weights: Dict[str, float]) -> np.ndarray:
+        return np.array([weights.get(field, 0.0) for field in self.fields], dtype='float32')
+
+    def field_scores(self, query_vectors: np.ndarray) -> np.ndarray:
+        """(queries, fields, documents) cosine similarities, from one matrix multiply."""
+        query_vectors = normalize_rows(np.atleast_2d(query_vectors))
+        return (query_vectors @ self.matrix.T).reshape(len(query_vectors), len(self.fields), self.size)
+
+    def scores(self, query_vectors: np.ndarray, weights: Dict[str, float]) -> np.ndarray:
+        """(queries, documents) field-weighted similarities."""
+        return np.tensordot(self.field_scores(query_vectors), self.weight_vector(weights), axes=([1], [0]))
@@ -0,0 +1,188 @@
+import os
+import json
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+FUSION_CONFIG_FILE = os.path.join(DATA_DIR, "fusion_config.json")
+
+STRATEGIES = ("rrf", "combsum", "combmnz", "convex")
+
+# Defaults reproduce the original hybrid_search behaviour:
+# equal-weight RRF with k=60 over the top 20 of each retriever.
+DEFAULT_FUSION_CONFIG = {
+    "strategy": "rrf",
+    "rrf_k": 60,
+    "bm25_weight": 1.0,
+    "dense_weight": 1.0,
+    "depth": 20,
+    "normalization": "minmax",
+    "alpha": 0.5,
+}
+
+
+def load_fusion_config(path: str = FUSION_CONFIG_FILE) -> Dict[str, Any]:
+    """Load the tuned fusion config, falling back to the defaults for missing keys."""
+    config = dict(DEFAULT_FUSION_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                config.update(json.load(f))
+        except Exception as e:
+            print(f"Failed to load fusion config {path}: {e}")
+    if config["strategy"] not in STRATEGIES:
+        print(f"Unknown fusion strategy '{config['strategy']}', using rrf.")
+        config["strategy"] = "rrf"
+    return config
+
+
+def save_fusion_config(config: Dict[str, Any], path: str = FUSION_CONFIG_FILE):
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def score_ranks(scores: np.ndarray) -> np.ndarray:
+    """
+    0-based rank of every document along the last axis (0 = best score).
+    Works on a single score vector or a (queries x documents) matrix.
+    """
+    order = np.argsort(-scores, axis=-1, kind="stable")
+    ranks = np.empty_like(order)
+    positions = np.broadcast_to(np.arange(scores.shape[-1]), order.shape)
+    np.put_along_axis(ranks, order, positions, axis=-1)
+    return ranks
+
+
+def normalize_scores(scores: np.ndarray, method: str = "minmax") -> np.ndarray:
+    """Normalize scores along the last axis so retrievers are comparable."""
+    scores = np.asarray(scores, dtype=np.float64)
+    if method == "zscore":
+        mean = scores.mean(axis=-1, keepdims=True)
+        std = scores.std(axis=-1, keepdims=True)
+        return (scores - mean) / np.where(std > 0, std, 1.0)
+    low = scores.min(axis=-1, keepdims=True)
+    span = scores.max(axis=-1, keepdims=True) - low
+    return (scores - low) / np.where(span > 0, span, 1.0)
+
+
+def rrf_from_ranks(bm25_ranks: np.ndarray, dense_ranks: np.ndarray, rrf_k: float = 60,
+                   bm25_weight: float = 1.0, dense_weight: float = 1.0,
+                   depth: Optional[int] = None) -> np.ndarray:
+    """Weighted Reciprocal Rank Fusion. Ranks at or beyond `depth` contribute nothing."""
+    bm25_part = bm25_weight / (rrf_k + bm25_ranks + 1.0)
+    dense_part = dense_weight / (rrf_k + dense_ranks + 1.0)
+    if depth:
+        bm25_part = np.where(bm25_ranks < depth, bm25_part, 0.0)
+        dense_part = np.where(dense_ranks < depth, dense_part, 0.0)
+    return bm25_part + dense_part
+
+
+def comb_sum(bm25_norm: np.ndarray, dense_norm: np.ndarray,
+             bm25_weight: float = 1.0, dense_weight: float = 1.0) -> np.ndarray:
+    """CombSUM over already-normalized scores."""
+    return bm25_weight * bm25_norm + dense_weight * dense_norm
+
+
+def comb_mnz(bm25_norm: np.ndarray, dense_norm: np.ndarray, bm25_hits: np.ndarray,
+             dense_hits: np.ndarray, bm25_weight: float = 1.0,
+             dense_weight: float = 1.0) -> np.ndarray:
+    """CombMNZ: CombSUM multiplied by the number of retrievers that returned the document."""
+    hits = bm25_hits.astype(np.float64) + dense_hits.astype(np.float64)
+    return comb_sum(bm25_norm, dense_norm, bm25_weight, dense_weight) * hits
+
+
+def convex_combination(bm25_norm: np.ndarray, dense_norm: np.ndarray, alpha: float = 0.5) -> np.ndarray:
+    """alpha * dense + (1 - alpha) * bm25 over normalized scores."""
+    return alpha * dense_norm + (1.0 - alpha) * bm25_norm
+
+
+def fuse_scores(bm25_scores: np.ndarray, dense_scores: np.ndarray,
+                config: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """
+    Fuse full BM25 and dense score arrays (higher = better) into one score per document.
+    Accepts single vectors or (queries x documents) matrices.
+    """
+    config = config or DEFAULT_FUSION_CONFIG
+    strategy = config.get("strategy", "rrf")
+    bm25_weight = config.get("bm25_weight", 1.0)
+    dense_weight = config.get("dense_weight", 1.0)
+    depth = config.get("depth")
+
+    if strategy == "rrf":
+        return rrf_from_ranks(score_ranks(bm25_scores), score_ranks(dense_scores),
+                              rrf_k=config.get("rrf_k", 60), bm25_weight=bm25_weight,
+                              dense_weight=dense_weight, depth=depth)
+
+    method = config.get("normalization", "minmax")
+    bm25_norm = normalize_scores(bm25_scores, method)
+    dense_norm = normalize_scores(dense_scores, method)
+
+    if strategy == "combsum":
+        return comb_sum(bm25_norm, dense_norm, bm25_weight, dense_weight)
+    if strategy == "combmnz":
+        if depth:
+            bm25_hits = score_ranks(bm25_scores) < depth
+            dense_hits = score_ranks(dense_scores) < depth
+        else:
+            bm25_hits = np.asarray(bm25_scores) > 0
+            dense_hits = np.ones_like(bm25_hits)
+        return comb_mnz(bm25_norm, dense_norm, bm25_hits, dense_hits, bm25_weight, dense_weight)
+    if strategy == "convex":
+        return convex_combination(bm25_norm, dense_norm, config.get("alpha", 0.5))
+
+    raise ValueError(f"Unknown fusion strategy: {strategy}")
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores along the last axis, best first."""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(top, order, axis=-1)
+
+
+def window_spans(n: int, window: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    (start, end) of overlapping windows covering positions 0..n-1, e.g. n=20,
+    window=8, overlap=2 -> (0, 8), (6, 14), (12, 20). The last window is aligned
+    to the end, so it may overlap its neighbour by more than `overlap`.
+    """
+    if n <= window:
+        return [(0, n)]
+    step = max(1, window - overlap)
+    spans = [(start, start + window) for start in range(0, n - window + 1, step)]
+    if spans[-1][1] < n:
+        spans.append((n - window, n))
+    return spans
+
+
+def merge_window_rankings(n: int, spans: List[Tuple[int, int]],
+                          rankings: List[Optional[List[int]]]) -> List[int]:
+    """
+    Merge per-window rankings (window-local indices, best first; None for a
+    failed window) into one order over positions 0..n-1.
+
+    Each window places a candidate at `start + rank` on the global scale, and
+    candidates it left out at the bottom of the window. A candidate's position
+    is the mean over the successful windows containing it. Candidates no
+    window ranked keep their retrieval position, and ties go to the better
+    retrieval position, so the merge is deterministic.
+    """
+    estimates: List[List[float]] = [[] for _ in range(n)]
+    for (start, end), ranking in zip(spans, rankings):
+        if ranking is None:
+            continue
+        ranked = set()
+        for local in ranking:
+            if 0 <= local < end - start and local not in ranked:
+                estimates[start + local].append(start + len(ranked))
+                ranked.add(local)
+        for local in range(end - start):
+            if local not in ranked:
+                estimates[start + local].append(end)
+    positions = [float(np.mean(e)) if e else float(i) for i, e in enumerate(estimates)]
+    return sorted(range(n), key=lambda i: (positions[i], i))
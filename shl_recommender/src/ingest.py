@@ -1,9 +1,17 @@
+import re
 import json
 import os
+import time
+import argparse
 import pickle
+import hashlib
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+from .models import get_model, model_fingerprint, DEFAULT_MODEL_NAME
+from .expansion import LocalExpander, mine_expansion_dictionary, save_expansion_dictionary
+from .similarity import SimilarityGraph, build_similarity_graph, assessment_id, content_hash
+from .catalog_store import joined
+from .field_index import FIELDS, FieldIndex, build_field_embeddings
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,30 +19,76 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 INPUT_FILE = os.path.join(DATA_DIR, "raw_assessments.json")
 INDEX_FILE = os.path.join(DATA_DIR, "assessments.index")
 METADATA_FILE = os.path.join(DATA_DIR, "assessments.pkl")
+MANIFEST_FILE = os.path.join(DATA_DIR, "index_manifest.json")
+EXPANSION_FILE = os.path.join(DATA_DIR, "expansion_dictionary.json")
+SIMILARITY_FILE = os.path.join(DATA_DIR, "similarity_graph.npz")
+FIELDS_FILE = os.path.join(DATA_DIR, "field_embeddings.npy")
 
-def ingest_data():
-    print(f"Loading data from {INPUT_FILE}...")
-    with open(INPUT_FILE, 'r') as f:
-        assessments = json.load(f)
+def catalog_paths(data_dir=DATA_DIR):
+    """Input/output files of one catalog directory (see catalogs.py)."""
+    return {
+        "raw": os.path.join(data_dir, os.path.basename(INPUT_FILE)),
+        "index": os.path.join(data_dir, os.path.basename(INDEX_FILE)),
+        "metadata": os.path.join(data_dir, os.path.basename(METADATA_FILE)),
+        "manifest": os.path.join(data_dir, os.path.basename(MANIFEST_FILE)),
+        "expansion": os.path.join(data_dir, os.path.basename(EXPANSION_FILE)),
+        "similarity": os.path.join(data_dir, os.path.basename(SIMILARITY_FILE)),
+        "fields": os.path.join(data_dir, os.path.basename(FIELDS_FILE)),
+    }
+
+def document_text(item):
+    """Text embedded for an assessment: the key fields a user might query against."""
+    return (
+        f"Title: {item.get('name', '')}\n"
+        f"Description: {item.get('description', '')}\n"
+        f"Test Type: {joined(item, 'test_type')}\n"
+        f"Job Levels: {joined(item, 'job_levels')}\n"
+        f"Languages: {joined(item, 'languages')}"
+    )
+
+def document_tokens(item):
+    """BM25 tokens of an assessment: name, description and test types."""
+    text = f"{item['name']} {item.get('description', '')} {joined(item, 'test_type')}"
+    return re.findall(r'\w+', text.lower())
+
+def build_similarity(assessments, texts, embeddings, path, full=False):
+    """Write the "more like this" graph, reusing unchanged rows of the previous one (see similarity.py)."""
+    previous = None
+    if not full and os.path.exists(path):
+        try:
+            previous = SimilarityGraph.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable similarity graph {path}: {e}")
+    graph, recomputed = build_similarity_graph(
+        embeddings, [document_tokens(item) for item in assessments],
+        [assessment_id(item) for item in assessments], [content_hash(text) for text in texts],
+        previous=previous,
+    )
+    print(f"Saving similarity graph ({graph.k} neighbours, {recomputed}/{len(assessments)} rows recomputed) to {path}...")
+    graph.save(path)
+    return graph
+
+
+def ingest_data(model=None, model_name=DEFAULT_MODEL_NAME, data_dir=DATA_DIR, full_similarity=False):
+    """
+    Embed the catalog and write the FAISS index, metadata and manifest.
+    Pass the already-loaded model to avoid loading a second copy in-process.
+    data_dir selects the catalog directory (default: the individual-test catalog).
+    full_similarity rebuilds every row of the similarity graph instead of only changed ones.
+    """
+    paths = catalog_paths(data_dir)
+    print(f"Loading data from {paths['raw']}...")
+    with open(paths['raw'], 'rb') as f:
+        raw_bytes = f.read()
+    assessments = json.loads(raw_bytes)
     
     print(f"Found {len(assessments)} assessments.")
     
     # Prepare text for embedding
-    texts = []
-    for item in assessments:
-        # Construct a rich representation
-        # We include key fields that a user might query against
-        text = (
-            f"Title: {item.get('name', '')}\n"
-            f"Description: {item.get('description', '')}\n"
-            f"Test Type: {', '.join(item.get('test_type', []))}\n"
-            f"Job Levels: {', '.join(item.get('job_levels', []))}\n"
-            f"Languages: {', '.join(item.get('languages', []))}"
-        )
-        texts.append(text)
+    texts = [document_text(item) for item in assessments]
         
-    print("Loading SentenceTransformer model (all-mpnet-base-v2)...")
-    model = SentenceTransformer('all-mpnet-base-v2')
+    if model is None:
+        model = get_model(model_name)
     
     print("Generating embeddings...")
     embeddings = model.encode(texts, show_progress_bar=True)
@@ -47,15 +101,60 @@ def ingest_data():
     index.add(embeddings)
     
     # Save Index
-    print(f"Saving index to {INDEX_FILE}...")
-    faiss.write_index(index, INDEX_FILE)
+    print(f"Saving index to {paths['index']}...")
+    faiss.write_index(index, paths['index'])
+    
+    # Save per-field embeddings (field-weighted dense scoring, see field_index.py)
+    print(f"Generating per-field embeddings ({', '.join(FIELDS)})...")
+    field_index = FieldIndex(build_field_embeddings(model, assessments))
+    print(f"Saving field embeddings to {paths['fields']}...")
+    field_index.save(paths['fields'])
     
     # Save Metadata (to map ID -> Assessment)
-    print(f"Saving metadata to {METADATA_FILE}...")
-    with open(METADATA_FILE, 'wb') as f:
+    print(f"Saving metadata to {paths['metadata']}...")
+    with open(paths['metadata'], 'wb') as f:
         pickle.dump(assessments, f)
         
+    # Save local query-expansion dictionary (aliases mined from names/descriptions)
+    dictionary = mine_expansion_dictionary(assessments)
+    print(f"Saving {len(dictionary['terms'])} expansion terms ({len(dictionary['confident'])} confident) "
+          f"to {paths['expansion']}...")
+    save_expansion_dictionary(dictionary, paths['expansion'])
+    covered = LocalExpander.from_mined(dictionary).covered_probes()
+    if covered:
+        print(f"WARNING: the expansion dictionary would skip the LLM for job-ad probe queries: {covered}")
+    
+    # Save "more like this" neighbour graph (served by /similar/{assessment_id})
+    graph = build_similarity(assessments, texts, embeddings, paths['similarity'], full=full_similarity)
+    
+    # Save Manifest (model fingerprint + catalog hash, checked by the engine at load time)
+    fingerprint = model_fingerprint(model_name)
+    catalog_hash = hashlib.sha256(raw_bytes).hexdigest()
+    manifest = {
+        "model_name": model_name,
+        "model_fingerprint": fingerprint,
+        "catalog_sha256": catalog_hash,
+        "documents": len(assessments),
+        "dimension": int(dimension),
+        "similarity_neighbors": graph.k,
+        "fields": list(FIELDS),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "index_version": hashlib.sha256(f"{fingerprint}:{catalog_hash}".encode()).hexdigest()[:16],
+    }
+    print(f"Saving manifest to {paths['manifest']}...")
+    with open(paths['manifest'], 'w') as f:
+        json.dump(manifest, f, indent=2)
+        
     print("Ingestion complete!")
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Build the index artifacts of a catalog.")
+    # Non-default catalog, e.g. `python -m shl_recommender.src.ingest prepackaged`
+    parser.add_argument("catalog", nargs="?", help="Catalog id (default: the catalog in data/)")
+    parser.add_argument("--full", action="store_true", help="Rebuild every row of the similarity graph")
+    args = parser.parse_args()
+    if args.catalog:
+        from .catalogs import ingest_catalog
+        ingest_catalog(args.catalog, full_similarity=args.full)
+    else:
+        ingest_data(full_similarity=args.full)
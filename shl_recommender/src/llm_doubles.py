@@ -0,0 +1,89 @@
+"""
+Stand-in LLMs for offline runs of RecommendationEngine.
+
+- FakeLLM: deterministic, no network. Expansion echoes the query and rerank
+  keeps the retrieval order, so results depend only on retrieval.
+- RecordingLLM: wraps a real LLM and records every response to a cassette.
+- ReplayLLM: answers from a recorded cassette; unknown prompts raise, so the
+  engine falls back exactly as it would on an LLM failure.
+
+All of them are LangChain Runnables, so `prompt | llm` in the engine works unchanged.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+
+def prompt_text(prompt_value: Any) -> str:
+    if hasattr(prompt_value, "to_string"):
+        return prompt_value.to_string()
+    return str(prompt_value)
+
+
+def prompt_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class FakeLLM(Runnable):
+    def __init__(self, latency_ms: float = 0.0, ms_per_kchar: float = 0.0):
+        # Simulated latency: a fixed cost plus a cost per 1000 prompt characters
+        self.latency_ms = latency_ms
+        self.ms_per_kchar = ms_per_kchar
+
+    def respond(self, text: str) -> str:
+        if "Available Assessments:" in text:
+            # Rerank prompt: keep retrieval order
+            n_candidates = len(re.findall(r'^ID \d+:', text, re.MULTILINE))
+            match = re.search(r'Select the TOP (\d+)', text)
+            top_n = int(match.group(1)) if match else 10
+            return json.dumps(list(range(min(top_n, n_candidates))))
+        # Expansion prompt: echo the user query
+        match = re.search(r'User Query: "(.*)"\s*\n\s*Task:', text, re.DOTALL)
+        return match.group(1) if match else text
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
+        text = prompt_text(input)
+        latency_ms = self.latency_ms + self.ms_per_kchar * len(text) / 1000.0
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+        return AIMessage(content=self.respond(text))
+
+
+class RecordingLLM(Runnable):
+    def __init__(self, llm: Any, cassette_path: str):
+        self.llm = llm
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+        self.cassette: Dict[str, str] = {}
+        if os.path.exists(cassette_path):
+            with open(cassette_path, 'r') as f:
+                self.cassette = json.load(f)
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
+        response = self.llm.invoke(input, config, **kwargs)
+        with self._lock:
+            self.cassette[prompt_key(prompt_text(input))] = response.content
+            with open(self.cassette_path, 'w') as f:
+                json.dump(self.cassette, f, indent=2)
+        return response
+
+
+class ReplayLLM(Runnable):
+    def __init__(self, cassette_path: str):
+        with open(cassette_path, 'r') as f:
+            self.cassette: Dict[str, str] = json.load(f)
+        self.misses = 0
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
+        key = prompt_key(prompt_text(input))
+        if key not in self.cassette:
+            self.misses += 1
+            raise KeyError(f"Prompt {key[:12]} not found in cassette")
+        return AIMessage(content=self.cassette[key])
+
@@ -0,0 +1,177 @@
+"""
+LLM providers used by the engine for query expansion and reranking.
+
+The provider is chosen by configuration, and every provider is a LangChain
+Runnable returning an AIMessage, so `prompt | llm` in the engine (and the
+doubles in llm_doubles.py) work unchanged.
+
+    gemini   Google Generative AI (the original backend)
+    openai   any OpenAI-compatible HTTP server: llama.cpp, vLLM, or the local
+             stub in fake_llm_server.py
+    none     no LLM: expansion and rerank fall back to retrieval only
+
+Settings (environment variables):
+    SHL_LLM_PROVIDER        gemini | openai | none (default: gemini if GOOGLE_API_KEY is set, else none)
+    SHL_GEMINI_MODEL        default gemma-3-27b-it
+    SHL_GEMINI_TIMEOUT      seconds per call (default 30)
+    SHL_GEMINI_MAX_TOKENS   max output tokens (default 1024)
+    SHL_OPENAI_BASE_URL     e.g. http://127.0.0.1:8080/v1
+    SHL_OPENAI_MODEL        model name sent to the server (default "local")
+    SHL_OPENAI_API_KEY      optional bearer token
+    SHL_OPENAI_TIMEOUT      seconds per call (default 20)
+    SHL_OPENAI_MAX_TOKENS   max output tokens (default 512)
+    SHL_LLM_TEMPERATURE     sampling temperature for every provider (default 0.1)
+
+Token usage per request is accumulated in an LLMUsage (see engine.recommend);
+providers that report no usage are estimated at CHARS_PER_TOKEN.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+from .llm_doubles import prompt_text
+
+PROVIDERS = ("gemini", "openai", "none")
+# Rough token size of English prompt text, for providers that report no usage
+CHARS_PER_TOKEN = 4
+
+
+class LLMProviderError(RuntimeError):
+    pass
+
+
+class LLMUsage:
+    """LLM calls and tokens spent on one request."""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Calls whose tokens were estimated from characters
+        self.estimated_calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_chars: int, response: Any):
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            input_tokens, output_tokens, estimated = usage.get("input_tokens", 0), usage.get("output_tokens", 0), 0
+        else:
+            content = getattr(response, "content", "") or ""
+            input_tokens, output_tokens, estimated = prompt_chars // CHARS_PER_TOKEN, len(content) // CHARS_PER_TOKEN, 1
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.estimated_calls += estimated
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"calls": self.calls, "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+                "estimated_calls": self.estimated_calls}
+
+
+class OpenAICompatibleLLM(Runnable):
+    """Chat completions against an OpenAI-compatible server (one user message per prompt)."""
+
+    def __init__(self, base_url: str, model: str = "local", timeout: float = 20.0, max_tokens: int = 512,
+                 temperature: float = 0.1, api_key: Optional[str] = None):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # One keep-alive session per calling thread
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt_text(input)}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+        }
+        try:
+            response = self._session().post(self.url, json=payload, headers=self.headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise LLMProviderError(f"{self.url}: {e}") from e
+        if response.status_code != 200:
+            raise LLMProviderError(f"{self.url} returned {response.status_code}: {response.text[:200]}")
+        try:
+            body = response.json()
+            content = body["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMProviderError(f"{self.url} returned an unexpected body: {response.text[:200]}") from e
+        usage = body.get("usage") or {}
+        if "prompt_tokens" in usage:
+            input_tokens, output_tokens = usage["prompt_tokens"], usage.get("completion_tokens", 0)
+            return AIMessage(content=content or "", usage_metadata={
+                "input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": usage.get("total_tokens", input_tokens + output_tokens)})
+        return AIMessage(content=content or "")
+
+    def __repr__(self) -> str:
+        return f"OpenAICompatibleLLM(model={self.model!r}, url={self.url!r})"
+
+
+def create_gemini(api_key: Optional[str] = None, model: Optional[str] = None) -> Runnable:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        raise LLMProviderError("SHL_LLM_PROVIDER=gemini requires GOOGLE_API_KEY")
+    return ChatGoogleGenerativeAI(
+        model=model or os.environ.get("SHL_GEMINI_MODEL", "gemma-3-27b-it"),
+        google_api_key=api_key,
+        temperature=float(os.environ.get("SHL_LLM_TEMPERATURE", "0.1")),
+        max_output_tokens=int(os.environ.get("SHL_GEMINI_MAX_TOKENS", "1024")),
+        timeout=float(os.environ.get("SHL_GEMINI_TIMEOUT", "30")),
+    )
+
+
+def create_openai_compatible(base_url: Optional[str] = None, model: Optional[str] = None) -> Runnable:
+    base_url = base_url or os.environ.get("SHL_OPENAI_BASE_URL")
+    if not base_url:
+        raise LLMProviderError("SHL_LLM_PROVIDER=openai requires SHL_OPENAI_BASE_URL")
+    return OpenAICompatibleLLM(
+        base_url,
+        model=model or os.environ.get("SHL_OPENAI_MODEL", "local"),
+        timeout=float(os.environ.get("SHL_OPENAI_TIMEOUT", "20")),
+        max_tokens=int(os.environ.get("SHL_OPENAI_MAX_TOKENS", "512")),
+        temperature=float(os.environ.get("SHL_LLM_TEMPERATURE", "0.1")),
+        api_key=os.environ.get("SHL_OPENAI_API_KEY"),
+    )
+
+
+def configured_provider() -> str:
+    provider = os.environ.get("SHL_LLM_PROVIDER")
+    if provider is None:
+        provider = "gemini" if os.environ.get("GOOGLE_API_KEY") else "none"
+    provider = provider.lower()
+    if provider not in PROVIDERS:
+        raise LLMProviderError(f"Unknown SHL_LLM_PROVIDER '{provider}' (expected one of {', '.join(PROVIDERS)})")
+    return provider
+
+
+def create_llm(provider: Optional[str] = None, model: Optional[str] = None,
+               base_url: Optional[str] = None) -> Optional[Runnable]:
+    """
+    The configured LLM, or None when LLM features are disabled. `model` and
+    `base_url` override the provider's environment settings.
+    """
+    provider = provider or configured_provider()
+    if provider not in PROVIDERS:
+        raise LLMProviderError(f"Unknown LLM provider '{provider}' (expected one of {', '.join(PROVIDERS)})")
+    if provider == "gemini":
+        return create_gemini(model=model)
+    if provider == "openai":
+        return create_openai_compatible(base_url=base_url, model=model)
+    return None
@@ -0,0 +1,329 @@
+"""
+Open-loop load test of the /recommend API against a local fake LLM.
+
+For every server configuration the harness starts fake_llm_server.py and
+serve.py (with the configuration's environment overrides), then drives
+/recommend at each target rate with Poisson arrivals and queries sampled from
+train.csv/test.csv. Requests are sent on schedule whether or not earlier ones
+finished, and latency is measured from the scheduled send time, so a
+saturated server shows up as growing latency instead of a slower load
+generator. CPU and RSS/PSS of the server (master + workers) are sampled
+throughout.
+
+The report has, per configuration and rate: achieved throughput,
+p50/p95/p99 latency, error rate, fallback rate (X-Fallbacks header), mean CPU
+and peak memory, plus a side-by-side table when several configurations are
+given.
+
+Usage (from the project root):
+    python -m shl_recommender.src.loadtest --rates 1,2,4,8 --duration 30 \\
+        --config "1w:SHL_WORKERS=1" --config "4w-cache:SHL_WORKERS=4,SHL_SEMANTIC_CACHE=1" \\
+        --llm-latency lognormal:800,0.5 --output loadtest.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+from .process_memory import read_memory, read_cpu_seconds, child_pids
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+
+
+def load_queries(seed: int = 0) -> List[str]:
+    queries = []
+    for name in ("train.csv", "test.csv"):
+        path = os.path.join(DATA_DIR, name)
+        if os.path.exists(path):
+            queries.extend(pd.read_csv(path)['Query'].unique())
+    random.Random(seed).shuffle(queries)
+    return queries
+
+
+def parse_config(spec: str) -> Tuple[str, Dict[str, str]]:
+    """"name:KEY=VALUE,KEY=VALUE" -> (name, env overrides)."""
+    name, _, assignments = spec.partition(":")
+    env = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, _, value = assignment.partition("=")
+        env[key.strip()] = value.strip()
+    return name, env
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values)
+    return {
+        "count": int(array.size),
+        "mean": round(float(array.mean()), 1),
+        "p50": round(float(np.percentile(array, 50)), 1),
+        "p95": round(float(np.percentile(array, 95)), 1),
+        "p99": round(float(np.percentile(array, 99)), 1),
+    }
+
+
+class ResourceSampler:
+    """Samples CPU% and RSS/PSS of a process and its children on a background thread."""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self.label = "startup"
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _cpu_seconds(self) -> Dict[int, float]:
+        """CPU seconds per live pid (processes that exited before the read are left out)."""
+        cpu = {pid: read_cpu_seconds(pid) for pid in [self.pid] + child_pids(self.pid)}
+        return {pid: seconds for pid, seconds in cpu.items() if seconds > 0}
+
+    @staticmethod
+    def _cpu_delta(last: Dict[int, float], cpu: Dict[int, float]) -> float:
+        """
+        CPU used between two samples. Pids that exited are dropped rather than counted
+        as negative time; new pids (restarted workers) count from zero. Clamped per pid
+        in case a pid was reused.
+        """
+        return sum(max(seconds - last.get(pid, 0.0), 0.0) for pid, seconds in cpu.items())
+
+    def _run(self):
+        start = time.monotonic()
+        last_cpu, last_time = self._cpu_seconds(), start
+        while not self._stop.wait(self.interval):
+            now, cpu = time.monotonic(), self._cpu_seconds()
+            memory = [read_memory(pid) for pid in [self.pid] + child_pids(self.pid)]
+            self.samples.append({
+                "t": round(now - start, 2),
+                "step": self.label,
+                "cpu_percent": round(100.0 * self._cpu_delta(last_cpu, cpu) / max(now - last_time, 1e-9), 1),
+                "rss_mb": round(sum(m.get("rss_kb", 0) for m in memory) / 1024, 1),
+                "pss_mb": round(sum(m.get("pss_kb", 0) for m in memory) / 1024, 1),
+                # A worker exited or started: its CPU time outside the process lifetime is missing
+                "pids_changed": set(cpu) != set(last_cpu),
+            })
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def summary(self, label: str) -> Dict[str, float]:
+        samples = [s for s in self.samples if s["step"] == label]
+        if not samples:
+            return {}
+        return {
+            "cpu_percent_mean": round(float(np.mean([s["cpu_percent"] for s in samples])), 1),
+            "rss_mb_max": max(s["rss_mb"] for s in samples),
+            "pss_mb_max": max(s["pss_mb"] for s in samples),
+        }
+
+
+def wait_for_health(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} during startup")
+        try:
+            if requests.get(url + "/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} not healthy after {timeout:.0f}s")
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def send(url: str, query: str, scheduled: float, timeout: float) -> Dict[str, Any]:
+    try:
+        response = requests.post(url + "/recommend", json={"query": query}, timeout=timeout)
+        status = response.status_code
+        fallbacks = response.headers.get("X-Fallbacks", "")
+    except requests.RequestException as e:
+        status, fallbacks = type(e).__name__, ""
+    # Degraded = some LLM stage fell back for a reason other than being switched off
+    degraded = any(not item.endswith(":disabled") for item in fallbacks.split(",") if item)
+    return {"latency_ms": (time.perf_counter() - scheduled) * 1000, "status": status, "degraded": degraded}
+
+
+def run_step(url: str, queries: List[str], rate: float, duration: float, timeout: float,
+             max_in_flight: int, rng: random.Random) -> Dict[str, Any]:
+    """Open-loop Poisson arrivals at `rate` req/s for `duration` seconds."""
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        start = time.perf_counter()
+        scheduled = start
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled - start > duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, url, rng.choice(queries), scheduled, timeout))
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == 200]
+    return {
+        "target_rps": rate,
+        "sent": len(results),
+        "offered_rps": round(len(results) / duration, 2),
+        "achieved_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "fallback_rate": round(sum(r["degraded"] for r in ok) / len(ok), 4) if ok else 0.0,
+        "statuses": {str(k): sum(1 for r in results if r["status"] == k) for k in {r["status"] for r in results}},
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+    }
+
+
+def run_config(name: str, env_overrides: Dict[str, str], args, queries: List[str], llm_url: str) -> Dict[str, Any]:
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, PORT=str(args.port), SHL_LLM_PROVIDER="openai", SHL_OPENAI_BASE_URL=llm_url + "/v1",
+               PYTHONUNBUFFERED="1", SHL_MEMORY_REPORT_INTERVAL="0")
+    # Per-config settings may replace any of the defaults above
+    env.update(env_overrides)
+    log_path = f"{args.log_prefix}{name}.log"
+    print(f"\n=== {name} {env_overrides} (server log: {log_path}) ===")
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, "-m", "shl_recommender.src.serve", "--log-level", "warning"],
+                                  cwd=PROJECT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        sampler = ResourceSampler(server.pid, args.sample_interval)
+        try:
+            wait_for_health(url, server, args.startup_timeout)
+            sampler.start()
+            rng = random.Random(args.seed)
+            if args.warmup > 0:
+                sampler.label = "warmup"
+                run_step(url, queries, args.rates[0], args.warmup, args.timeout, args.max_in_flight, rng)
+            steps = []
+            for rate in args.rates:
+                sampler.label = f"{rate}rps"
+                step = run_step(url, queries, rate, args.duration, args.timeout, args.max_in_flight, rng)
+                step.update(sampler.summary(sampler.label))
+                steps.append(step)
+                latency = step["latency_ms"]
+                print(f"  {rate:6.1f} rps -> {step['achieved_rps']:6.2f} ok/s  p50={latency.get('p50', 0):7.0f} "
+                      f"p95={latency.get('p95', 0):7.0f} p99={latency.get('p99', 0):7.0f} ms  "
+                      f"err={step['error_rate']:.1%} fallback={step['fallback_rate']:.1%} "
+                      f"cpu={step.get('cpu_percent_mean', 0):.0f}% rss={step.get('rss_mb_max', 0):.0f}MB")
+                if step["error_rate"] > args.stop_error_rate:
+                    print(f"  Error rate above {args.stop_error_rate:.0%}; skipping higher rates.")
+                    break
+        finally:
+            sampler.stop()
+            stop_process(server)
+    return {"env": env_overrides, "steps": steps, "saturation_rps": saturation_point(steps, args.slo_ms),
+            "resources": sampler.samples}
+
+
+def saturation_point(steps: List[Dict[str, Any]], slo_ms: float) -> Optional[float]:
+    """First target rate the server could not keep up with (throughput < 90% of offered or p95 over the SLO)."""
+    for step in steps:
+        p95 = step["latency_ms"].get("p95", float("inf"))
+        if step["achieved_rps"] < 0.9 * step["offered_rps"] or p95 > slo_ms or step["error_rate"] > 0.01:
+            return step["target_rps"]
+    return None
+
+
+def print_comparison(report: Dict[str, Any]):
+    configs = list(report["configs"].keys())
+    rates = sorted({step["target_rps"] for c in report["configs"].values() for step in c["steps"]})
+    print(f"\n{'rps':>6s}" + "".join(f"{name[:22]:>24s}" for name in configs) + "   (ok/s | p95 ms | fallback)")
+    for rate in rates:
+        row = f"{rate:6.1f}"
+        for name in configs:
+            step = next((s for s in report["configs"][name]["steps"] if s["target_rps"] == rate), None)
+            if step is None:
+                row += f"{'-':>24s}"
+            else:
+                cell = f"{step['achieved_rps']:.1f} | {step['latency_ms'].get('p95', 0):.0f} | {step['fallback_rate']:.0%}"
+                row += f"{cell:>24s}"
+        print(row)
+    for name in configs:
+        saturation = report["configs"][name]["saturation_rps"]
+        print(f"  {name}: " + (f"saturates at ~{saturation} rps" if saturation else "no saturation in tested range"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of /recommend against a fake LLM.")
+    parser.add_argument("--rates", default="1,2,4,8", help="Comma-separated target request rates (req/s)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per rate step")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of untimed load before the first step")
+    parser.add_argument("--config", action="append", default=[],
+                        help='Server configuration "name:ENV=VALUE,..." (repeat to compare)')
+    parser.add_argument("--port", type=int, default=7870)
+    parser.add_argument("--llm-port", type=int, default=8900)
+    parser.add_argument("--llm-latency", default="lognormal:800,0.5", help="Fake LLM latency spec (ms)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request (s)")
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--slo-ms", type=float, default=10000.0, help="p95 latency counted as saturated")
+    parser.add_argument("--stop-error-rate", type=float, default=0.5)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-prefix", default="loadtest_server_")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+    args.rates = [float(r) for r in args.rates.split(",")]
+    configs = [parse_config(spec) for spec in args.config] or [("default", {})]
+
+    queries = load_queries(args.seed)
+    llm_url = f"http://127.0.0.1:{args.llm_port}"
+    llm_server = subprocess.Popen(
+        [sys.executable, "-m", "shl_recommender.src.fake_llm_server", "--port", str(args.llm_port),
+         "--latency", args.llm_latency, "--error-rate", str(args.llm_error_rate), "--seed", str(args.seed)],
+        cwd=PROJECT_DIR)
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "rates": args.rates, "duration": args.duration,
+                 "llm_latency": args.llm_latency, "llm_error_rate": args.llm_error_rate, "queries": len(queries)},
+        "configs": {},
+    }
+    try:
+        time.sleep(1.0)
+        for name, env_overrides in configs:
+            report["configs"][name] = run_config(name, env_overrides, args, queries, llm_url)
+        try:
+            report["meta"]["llm_stats"] = requests.get(llm_url + "/stats", timeout=5).json()
+        except requests.RequestException:
+            pass
+    finally:
+        stop_process(llm_server)
+
+    print_comparison(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved load test report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
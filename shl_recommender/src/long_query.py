@@ -0,0 +1,126 @@
+"""
+Long-document queries: chunked encoding and per-document score pooling.
+
+A full job description (pasted, or scraped from `url`) used to be scored as
+one string: mpnet truncates it at its maximum sequence length, so skills listed
+near the bottom never reach the embedding, and BM25 sums hundreds of low-value
+tokens. Queries longer than `min_words` are instead split into sentence windows
+of at most `chunk_words` words (consecutive windows share a sentence). The
+expanded query, when expansion added anything, is one more chunk. Every chunk is
+scored separately:
+
+    BM25   one get_scores() per chunk
+    dense  one batched encode of all chunks, one multi-row FAISS search
+
+Each document's chunk scores are then pooled into a single score per retriever
+before fusion: "max" keeps its best chunk, "mean_top" averages its best
+`pool_top` chunks. At most `max_chunks` windows are scored, spread evenly over
+the document, so the cost stays bounded at max_chunks * chunk_words words
+however long the input is. experiments/long_query_report.py compares pooling
+settings on the long queries of train.csv.
+
+Settings (environment variables):
+    SHL_LONG_QUERY             0 to always score the query as one string (default 1)
+    SHL_LONG_QUERY_MIN_WORDS   queries with more words are chunked (default 150)
+    SHL_LONG_QUERY_CHUNK_WORDS words per chunk (default 96)
+    SHL_LONG_QUERY_MAX_CHUNKS  chunks scored per query (default 16)
+    SHL_LONG_QUERY_POOLING     max | mean_top (default mean_top)
+    SHL_LONG_QUERY_POOL_TOP    chunks averaged by mean_top (default 2)
+"""
+import os
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .observability import Histogram
+
+LONG_QUERY_CHUNKS = Histogram("shl_long_query_chunks", "Chunks scored per long query.",
+                              buckets=(1, 2, 4, 8, 16, 32, 64))
+
+POOLING_METHODS = ("max", "mean_top")
+
+# Sentence ends, line breaks and bullets (scraped pages are flattened to one line)
+SENTENCE_BREAK = re.compile(r'(?<=[.!?;:])\s+|\s*[\n•▪●]+\s*')
+
+
+def split_sentences(text: str, max_words: int) -> List[List[str]]:
+    """Sentences of `text` as word lists; sentences longer than max_words are cut."""
+    sentences = []
+    for sentence in SENTENCE_BREAK.split(text):
+        words = sentence.split()
+        for start in range(0, len(words), max_words):
+            sentences.append(words[start:start + max_words])
+    return sentences
+
+
+def sentence_windows(text: str, chunk_words: int) -> List[str]:
+    """Consecutive sentences packed into windows of at most chunk_words words, overlapping by one sentence."""
+    windows = []
+    current: List[List[str]] = []
+    for sentence in split_sentences(text, chunk_words):
+        if current and sum(map(len, current)) + len(sentence) > chunk_words:
+            windows.append(current)
+            last = current[-1]
+            current = [last] if len(last) + len(sentence) <= chunk_words and len(current) > 1 else []
+        current.append(sentence)
+    if current:
+        windows.append(current)
+    return [" ".join(word for sentence in window for word in sentence) for window in windows]
+
+
+def pool_scores(matrix: np.ndarray, method: str = "mean_top", top: int = 2) -> np.ndarray:
+    """Pool a (chunks x documents) score matrix into one score per document."""
+    if matrix.shape[0] == 1:
+        return matrix[0]
+    if method == "max":
+        return matrix.max(axis=0)
+    top = max(1, min(top, matrix.shape[0]))
+    return np.sort(matrix, axis=0)[-top:].mean(axis=0)
+
+
+class LongQueryPolicy:
+    def __init__(self, min_words: int = 150, chunk_words: int = 96, max_chunks: int = 16,
+                 pooling: str = "mean_top", pool_top: int = 2):
+        if pooling not in POOLING_METHODS:
+            raise ValueError(f"pooling must be one of {', '.join(POOLING_METHODS)}")
+        self.min_words = min_words
+        self.chunk_words = max(1, chunk_words)
+        self.max_chunks = max(1, max_chunks)
+        self.pooling = pooling
+        self.pool_top = pool_top
+
+    @classmethod
+    def from_env(cls) -> Optional["LongQueryPolicy"]:
+        """The configured policy, or None when long queries are scored as one string."""
+        if os.environ.get("SHL_LONG_QUERY", "1") != "1":
+            return None
+        return cls(
+            min_words=int(os.environ.get("SHL_LONG_QUERY_MIN_WORDS", "150")),
+            chunk_words=int(os.environ.get("SHL_LONG_QUERY_CHUNK_WORDS", "96")),
+            max_chunks=int(os.environ.get("SHL_LONG_QUERY_MAX_CHUNKS", "16")),
+            pooling=os.environ.get("SHL_LONG_QUERY_POOLING", "mean_top"),
+            pool_top=int(os.environ.get("SHL_LONG_QUERY_POOL_TOP", "2")),
+        )
+
+    def settings(self) -> Dict:
+        return {"min_words": self.min_words, "chunk_words": self.chunk_words, "max_chunks": self.max_chunks,
+                "pooling": self.pooling, "pool_top": self.pool_top}
+
+    def chunks(self, query: str, expanded_query: str) -> Optional[List[str]]:
+        """Chunks to score for `query`, or None when it is short enough to score as one string."""
+        if len(query.split()) <= self.min_words:
+            return None
+        windows = sentence_windows(query, self.chunk_words)
+        # The expansion as its own chunk: local expansion appends to the query, the LLM rewrites it
+        extra = expanded_query[len(query):].strip(" .") if expanded_query.startswith(query) else expanded_query
+        limit = self.max_chunks - 1 if extra else self.max_chunks
+        if len(windows) > limit:
+            keep = np.unique(np.linspace(0, len(windows) - 1, max(1, limit)).round().astype(int))
+            windows = [windows[i] for i in keep]
+        if extra:
+            windows = [" ".join(extra.split()[:self.chunk_words])] + windows
+        return windows
+
+    def pool(self, matrix: np.ndarray) -> np.ndarray:
+        return pool_scores(matrix, self.pooling, self.pool_top)
@@ -1,3 +1,7 @@
+import os
+import json
+import argparse
+import functools
 import pandas as pd
 import numpy as np
 
@@ -30,65 +34,284 @@ def calculate_recall_at_k(predictions_df, ground_truth_df, k=10, exclude_prepack
     Returns:
         float: Mean Recall@K
     """
-    import json
-    import os
-    
-    # Load scraped Individual Tests to identify pre-packaged URLs
-    prepackaged_set = set()
+    evaluator = Evaluator(ground_truth_df, exclude_prepackaged=exclude_prepackaged)
     if exclude_prepackaged:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        raw_path = os.path.join(base_dir, "data", "raw_assessments.json")
-        if os.path.exists(raw_path):
-            with open(raw_path, 'r') as f:
-                assessments = json.load(f)
-            scraped_urls = set(normalize_url(a['url']) for a in assessments)
-            # URLs in GT but not in scraped = Pre-packaged
-            for url in ground_truth_df['Assessment_url'].unique():
-                if normalize_url(url) not in scraped_urls:
-                    prepackaged_set.add(normalize_url(url))
-            print(f"Excluding {len(prepackaged_set)} Pre-packaged URLs from Ground Truth:")
-            for url in sorted(prepackaged_set):
-                print(f"  - {url.split('/')[-1]}")
-    
-    # Group by Query
-    gt_grouped = ground_truth_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
-    pred_grouped = predictions_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
-    
-    total_recall = 0
-    count = 0
-    
-    print(f"\n--- Calculating Recall@{k} (Individual Tests Only) ---")
-    
-    for query, gt_urls in gt_grouped.items():
-        if query not in pred_grouped:
-            print(f"Warning: No predictions for query: {query[:30]}...")
-            continue
-            
-        # Get Top-K predictions
-        pred_urls = pred_grouped[query][:k]
-        
-        # Normalize and filter out pre-packaged
-        gt_normalized = [normalize_url(u) for u in gt_urls]
-        gt_filtered = [u for u in gt_normalized if u not in prepackaged_set]
-        
-        if len(gt_filtered) == 0:
-            continue
-            
-        gt_set = set(gt_filtered)
-        pred_set = set(normalize_url(u) for u in pred_urls)
-        
-        # Calculate Intersection
-        matches = len(gt_set.intersection(pred_set))
-        recall = matches / len(gt_set)
-        
-        total_recall += recall
-        count += 1
-            
-    mean_recall = total_recall / count if count > 0 else 0
-    print(f"Processed {count} queries.")
+        print(f"Excluding {evaluator.n_prepackaged} Pre-packaged URLs from Ground Truth.")
+    result = evaluator.evaluate(predictions_df, ks=(k,))
+    if result.missing:
+        print(f"Warning: No predictions for {result.missing} queries.")
+    mean_recall = result.mean(f"recall@{k}")
+    print(f"Processed {result.n_queries} queries.")
     print(f"Mean Recall@{k}: {mean_recall:.4f}")
     return mean_recall
 
+def recall_at_k(pred_urls, relevant_urls, k=10):
+    """Recall@K for one query. URLs must already be normalized."""
+    if not relevant_urls:
+        return 0.0
+    return len(set(pred_urls[:k]) & set(relevant_urls)) / len(set(relevant_urls))
+
+def average_precision_at_k(pred_urls, relevant_urls, k=10):
+    """AP@K for one query, normalized by min(|relevant|, K)."""
+    relevant = set(relevant_urls)
+    if not relevant:
+        return 0.0
+    hits = 0
+    precision_sum = 0.0
+    seen = set()
+    for i, url in enumerate(pred_urls[:k]):
+        if url in relevant and url not in seen:
+            hits += 1
+            precision_sum += hits / (i + 1)
+        seen.add(url)
+    return precision_sum / min(len(relevant), k)
+
+def ndcg_at_k(pred_urls, relevant_urls, k=10):
+    """Binary-relevance NDCG@K for one query."""
+    relevant = set(relevant_urls)
+    if not relevant:
+        return 0.0
+    seen = set()
+    dcg = 0.0
+    for i, url in enumerate(pred_urls[:k]):
+        if url in relevant and url not in seen:
+            dcg += 1.0 / np.log2(i + 2)
+        seen.add(url)
+    ideal = sum(1.0 / np.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / ideal
+
+# --- Vectorized evaluation -------------------------------------------------
+# URLs are normalized once per distinct value and interned to integer ids, so
+# every metric for every k is computed with array operations over all queries.
+
+DEFAULT_KS = (1, 3, 5, 10)
+METRICS = ("recall", "precision", "map", "ndcg")
+RAW_ASSESSMENTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "data", "raw_assessments.json")
+
+
+@functools.lru_cache(maxsize=8)
+def _catalog_urls_cached(path, mtime):
+    with open(path, 'r') as f:
+        assessments = json.load(f)
+    return frozenset(normalize_url(a['url']) for a in assessments)
+
+
+def catalog_urls(path=RAW_ASSESSMENTS_FILE):
+    """Normalized URLs of the scraped catalog (cached until the file changes)."""
+    if not os.path.exists(path):
+        return None
+    return _catalog_urls_cached(path, os.path.getmtime(path))
+
+
+class UrlInterner:
+    """Normalized URL <-> integer id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.urls = []
+
+    def intern(self, urls):
+        """Ids for raw URLs (normalized first); unseen URLs get new ids."""
+        codes, uniques = pd.factorize(pd.Series(urls), use_na_sentinel=False)
+        unique_ids = np.empty(len(uniques), dtype=np.int64)
+        for i, url in enumerate(uniques):
+            url = normalize_url(url)
+            url_id = self.ids.get(url)
+            if url_id is None:
+                url_id = self.ids[url] = len(self.urls)
+                self.urls.append(url)
+            unique_ids[i] = url_id
+        return unique_ids[codes] if len(codes) else np.array([], dtype=np.int64)
+
+
+class EvaluationResult:
+    """Per-query metric values (queries with at least one relevant URL and a prediction)."""
+
+    def __init__(self, queries, per_query, missing=0):
+        self.queries = queries
+        self.per_query = per_query
+        self.missing = missing
+
+    @property
+    def n_queries(self):
+        return len(self.queries)
+
+    def mean(self, metric):
+        values = self.per_query[metric]
+        return float(values.mean()) if len(values) else 0.0
+
+    def summary(self):
+        return {metric: round(self.mean(metric), 4) for metric in self.per_query}
+
+    def bootstrap_ci(self, metric, n_resamples=10000, alpha=0.05, seed=0):
+        """Percentile bootstrap confidence interval of the mean over queries."""
+        return bootstrap_ci(self.per_query[metric], n_resamples, alpha, seed)
+
+
+def _bootstrap_means(values, n_resamples, seed):
+    """
+    Means of bootstrap resamples. Resampling n values with replacement only
+    changes how often each distinct value is drawn, so the counts are drawn from
+    a multinomial over the distinct values: exact, and O(distinct values) per
+    resample instead of O(n) (per-query metrics take few distinct values).
+    """
+    rng = np.random.default_rng(seed)
+    distinct, counts = np.unique(values, return_counts=True)
+    draws = rng.multinomial(len(values), counts / len(values), size=n_resamples)
+    return draws @ distinct / len(values)
+
+
+def bootstrap_ci(values, n_resamples=10000, alpha=0.05, seed=0):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return (0.0, 0.0)
+    means = _bootstrap_means(values, n_resamples, seed)
+    low, high = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return (float(low), float(high))
+
+
+def paired_test(result_a, result_b, metric, n_resamples=10000, alpha=0.05, seed=0):
+    """
+    Compare two runs on the queries both answered: mean difference (b - a), its
+    bootstrap confidence interval, and a two-sided paired sign-flip permutation
+    p-value.
+    """
+    index_a = {query: i for i, query in enumerate(result_a.queries)}
+    pairs = [(index_a[query], j) for j, query in enumerate(result_b.queries) if query in index_a]
+    if not pairs:
+        return {"metric": metric, "n_queries": 0, "mean_a": 0.0, "mean_b": 0.0, "delta": 0.0,
+                "ci": (0.0, 0.0), "p_value": 1.0}
+    rows_a, rows_b = (np.array(column) for column in zip(*pairs))
+    a = result_a.per_query[metric][rows_a]
+    b = result_b.per_query[metric][rows_b]
+    diff = b - a
+    observed = abs(diff.mean())
+
+    # Sign flips grouped by distinct |difference|: each group contributes
+    # value * (2 * Binomial(count, 0.5) - count)
+    rng = np.random.default_rng(seed)
+    distinct, counts = np.unique(np.abs(diff), return_counts=True)
+    positive = rng.binomial(counts, 0.5, size=(n_resamples, len(counts)))
+    flipped_means = (2 * positive - counts) @ distinct / len(diff)
+    extreme = int((np.abs(flipped_means) >= observed - 1e-12).sum())
+    return {
+        "metric": metric,
+        "n_queries": len(diff),
+        "mean_a": float(a.mean()),
+        "mean_b": float(b.mean()),
+        "delta": float(diff.mean()),
+        "ci": bootstrap_ci(diff, n_resamples, alpha, seed),
+        "p_value": (extreme + 1) / (n_resamples + 1),
+    }
+
+
+class Evaluator:
+    """
+    Ground truth interned once; evaluate() scores a predictions DataFrame
+    (columns Query, Assessment_url, rows in rank order per query) for all metrics
+    and k values in one pass. Matches recall_at_k / average_precision_at_k /
+    ndcg_at_k: duplicate predictions keep their rank slot but only count once.
+    """
+
+    def __init__(self, ground_truth_df, exclude_prepackaged=True, catalog_path=RAW_ASSESSMENTS_FILE):
+        self.interner = UrlInterner()
+        gt = ground_truth_df[['Query', 'Assessment_url']]
+        url_ids = self.interner.intern(gt['Assessment_url'])
+        keep = np.ones(len(gt), dtype=bool)
+        self.n_prepackaged = 0
+        if exclude_prepackaged:
+            scraped = catalog_urls(catalog_path)
+            if scraped is not None:
+                # URLs in GT but not in the scraped catalog = Pre-packaged
+                in_catalog = np.array([url in scraped for url in self.interner.urls], dtype=bool)
+                keep = in_catalog[url_ids]
+                self.n_prepackaged = int((~in_catalog).sum())
+
+        self.queries = list(pd.unique(gt['Query']))
+        self.query_ids = {query: i for i, query in enumerate(self.queries)}
+        query_ids = gt['Query'].map(self.query_ids).to_numpy(dtype=np.int64)
+        # Relevant (query, url) pairs as sorted int64 keys
+        self._relevant_keys = np.unique(self._pair_keys(query_ids[keep], url_ids[keep]))
+        self.n_relevant = np.bincount(self._relevant_keys >> 32, minlength=len(self.queries))
+
+    @staticmethod
+    def _pair_keys(query_ids, url_ids):
+        return (query_ids.astype(np.int64) << 32) | url_ids.astype(np.int64)
+
+    def evaluate(self, predictions_df, ks=DEFAULT_KS, metrics=METRICS):
+        ks = sorted(set(int(k) for k in ks))
+        max_k = ks[-1]
+        query_ids = predictions_df['Query'].map(self.query_ids)
+        known = query_ids.notna().to_numpy()
+        query_ids = query_ids.to_numpy()[known].astype(np.int64)
+        ranks = pd.Series(query_ids).groupby(query_ids).cumcount().to_numpy()
+        in_depth = ranks < max_k
+        query_ids, ranks = query_ids[in_depth], ranks[in_depth]
+        url_ids = self.interner.intern(predictions_df['Assessment_url'].to_numpy()[known][in_depth])
+
+        keys = self._pair_keys(query_ids, url_ids)
+        # First occurrence of each (query, url) within the top max_k
+        _, first = np.unique(keys, return_index=True)
+        is_first = np.zeros(len(keys), dtype=bool)
+        is_first[first] = True
+        position = np.searchsorted(self._relevant_keys, keys)
+        position = np.minimum(position, max(len(self._relevant_keys) - 1, 0))
+        hit = is_first & (len(self._relevant_keys) > 0)
+        if len(self._relevant_keys):
+            hit &= self._relevant_keys[position] == keys
+
+        answered = np.zeros(len(self.queries), dtype=bool)
+        answered[query_ids] = True
+        scored = answered & (self.n_relevant > 0)
+        missing = int(((~answered) & (self.n_relevant > 0)).sum())
+
+        hits = np.zeros((len(self.queries), max_k), dtype=np.float64)
+        hits[query_ids[hit], ranks[hit]] = 1.0
+        hits = hits[scored]
+        n_relevant = self.n_relevant[scored].astype(np.float64)
+        cumulative = np.cumsum(hits, axis=1)
+        positions = np.arange(1, max_k + 1, dtype=np.float64)
+        precision_terms = np.cumsum(hits * cumulative / positions, axis=1)
+        discounts = 1.0 / np.log2(positions + 1)
+        dcg = np.cumsum(hits * discounts, axis=1)
+        ideal_dcg = np.cumsum(discounts)
+
+        per_query = {}
+        for k in ks:
+            found = cumulative[:, k - 1]
+            capped = np.minimum(n_relevant, k)
+            values = {
+                "recall": found / n_relevant,
+                "precision": found / k,
+                "map": precision_terms[:, k - 1] / capped,
+                "ndcg": dcg[:, k - 1] / ideal_dcg[capped.astype(np.int64) - 1],
+            }
+            for metric in metrics:
+                per_query[f"{metric}@{k}"] = values[metric]
+        queries = [self.queries[i] for i in np.flatnonzero(scored)]
+        return EvaluationResult(queries, per_query, missing)
+
+
+def print_evaluation(result, label="", n_resamples=10000):
+    print(f"\n--- {label or 'Evaluation'}: {result.n_queries} queries"
+          f"{f' ({result.missing} without predictions)' if result.missing else ''} ---")
+    for metric in result.per_query:
+        low, high = result.bootstrap_ci(metric, n_resamples)
+        print(f"{metric:14s} {result.mean(metric):.4f}  95% CI [{low:.4f}, {high:.4f}]")
+
+
+def print_comparison(result_a, result_b, n_resamples=10000):
+    print(f"\n{'metric':14s} {'a':>7s} {'b':>7s} {'delta':>8s}  {'95% CI':>19s} {'p':>7s}")
+    for metric in result_a.per_query:
+        if metric not in result_b.per_query:
+            continue
+        test = paired_test(result_a, result_b, metric, n_resamples)
+        low, high = test["ci"]
+        print(f"{metric:14s} {test['mean_a']:7.4f} {test['mean_b']:7.4f} {test['delta']:+8.4f}  "
+              f"[{low:+.4f}, {high:+.4f}] {test['p_value']:7.4f}")
+
+
 def calculate_diversity_score(predictions_df):
     """
     Calculate a heuristic 'Diversity Score' to measure balance.
@@ -100,7 +323,6 @@ def calculate_diversity_score(predictions_df):
     pass
 
 import requests
-import os
 
 def get_api_predictions(queries, api_url="http://localhost:8002/recommend"):
     results = []
@@ -121,19 +343,39 @@ if __name__ == "__main__":
     # Path to train.csv: ../data/train.csv relative to this script
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     train_path = os.path.join(base_dir, "data", "train.csv")
+
+    parser = argparse.ArgumentParser(description="Evaluate predictions against ground truth.")
+    parser.add_argument("--ground-truth", default=train_path)
+    parser.add_argument("--predictions", help="Predictions CSV (Query, Assessment_url); default: query the API")
+    parser.add_argument("--compare", help="Second predictions CSV for a paired comparison with --predictions")
+    parser.add_argument("--k", default=",".join(str(k) for k in DEFAULT_KS), help="Comma-separated k values")
+    parser.add_argument("--bootstrap", type=int, default=10000, help="Bootstrap / permutation resamples")
+    parser.add_argument("--include-prepackaged", action="store_true")
+    args = parser.parse_args()
     
-    if not os.path.exists(train_path):
-        print(f"Error: {train_path} not found.")
+    if not os.path.exists(args.ground_truth):
+        print(f"Error: {args.ground_truth} not found.")
         exit(1)
         
-    print(f"Loading Ground Truth from {train_path}...")
-    gt_df = pd.read_csv(train_path)
+    print(f"Loading Ground Truth from {args.ground_truth}...")
+    gt_df = pd.read_csv(args.ground_truth)
+    ks = [int(k) for k in args.k.split(",")]
+    evaluator = Evaluator(gt_df, exclude_prepackaged=not args.include_prepackaged)
     
-    unique_queries = gt_df['Query'].unique()
-    pred_df = get_api_predictions(unique_queries)
+    if args.predictions:
+        pred_df = pd.read_csv(args.predictions, usecols=['Query', 'Assessment_url'])
+    else:
+        unique_queries = gt_df['Query'].unique()
+        pred_df = get_api_predictions(unique_queries)
 
-    output_path = os.path.join(base_dir, "data", "train_output.csv")
-    print(f"Saving predictions to {output_path}...")
-    pred_df.to_csv(output_path, index=False)
+        output_path = os.path.join(base_dir, "data", "train_output.csv")
+        print(f"Saving predictions to {output_path}...")
+        pred_df.to_csv(output_path, index=False)
     
-    calculate_recall_at_k(pred_df, gt_df, k=10)
+    result = evaluator.evaluate(pred_df, ks)
+    print_evaluation(result, args.predictions or "API", args.bootstrap)
+    if args.compare:
+        result_b = evaluator.evaluate(pd.read_csv(args.compare, usecols=['Query', 'Assessment_url']), ks)
+        print_evaluation(result_b, args.compare, args.bootstrap)
+        print(f"\nPaired comparison (b = {args.compare} vs a = {args.predictions}):")
+        print_comparison(result, result_b, args.bootstrap)
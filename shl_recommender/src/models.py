@@ -0,0 +1,131 @@
+"""
+Offline embedding-model registry shared by ingest and serving.
+
+Models are loaded from a local directory only (SHL_MODEL_DIR, baked into the
+Docker image at /opt/models), never from the Hugging Face hub, and each model
+is loaded once per process. The model fingerprint (hash of its files) is
+recorded in the index manifest at ingest time and checked when the engine
+loads the index, so an index is never queried with a different model.
+
+Vendor a model for local development (needs network once):
+    python -m shl_recommender.src.models download [model_name]
+Precompute the fingerprint cache (e.g. at image build time):
+    python -m shl_recommender.src.models fingerprint [model_name]
+"""
+import os
+import sys
+import json
+import hashlib
+import threading
+from typing import Dict
+
+# Never resolve models against the hub at runtime
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from sentence_transformers import SentenceTransformer
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.environ.get("SHL_MODEL_DIR", os.path.join(BASE_DIR, "models"))
+DEFAULT_MODEL_NAME = os.environ.get("SHL_EMBEDDING_MODEL", "all-mpnet-base-v2")
+FINGERPRINT_CACHE = ".shl_fingerprint.json"
+
+_models: Dict[str, SentenceTransformer] = {}
+_lock = threading.Lock()
+
+
+class ModelNotFoundError(FileNotFoundError):
+    pass
+
+
+def resolve_model_path(name: str = DEFAULT_MODEL_NAME) -> str:
+    """Local directory for a model: an explicit path, or <SHL_MODEL_DIR>/<name>."""
+    for path in (name, os.path.join(MODEL_DIR, name), os.path.join(MODEL_DIR, os.path.basename(name))):
+        if os.path.isdir(path):
+            return os.path.abspath(path)
+    raise ModelNotFoundError(
+        f"Model '{name}' not found under {MODEL_DIR}. Vendor it with "
+        f"'python -m shl_recommender.src.models download {name}' or set SHL_MODEL_DIR."
+    )
+
+
+def get_model(name: str = DEFAULT_MODEL_NAME) -> SentenceTransformer:
+    """Load a model from local disk, once per process."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if name not in _models:
+            path = resolve_model_path(name)
+            print(f"Loading SentenceTransformer model {name} from {path}...")
+            _models[name] = SentenceTransformer(path)
+        return _models[name]
+
+
+def model_fingerprint(name: str = DEFAULT_MODEL_NAME) -> str:
+    """
+    SHA-256 over the model's files. Cached in the model directory and keyed on
+    file sizes and mtimes, so the weights are only hashed once.
+    """
+    path = resolve_model_path(name)
+    files = []
+    for root, dirs, filenames in os.walk(path):
+        # Skip hub download caches (.cache/huggingface) so re-downloads hash the same
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for filename in filenames:
+            if filename == FINGERPRINT_CACHE:
+                continue
+            full = os.path.join(root, filename)
+            stat = os.stat(full)
+            files.append((os.path.relpath(full, path), stat.st_size, int(stat.st_mtime)))
+    files.sort()
+    signature = hashlib.sha256(json.dumps(files).encode()).hexdigest()
+
+    cache_path = os.path.join(path, FINGERPRINT_CACHE)
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached.get("signature") == signature:
+            return cached["fingerprint"]
+    except (OSError, ValueError):
+        pass
+
+    digest = hashlib.sha256()
+    for relpath, _, _ in files:
+        digest.update(relpath.encode())
+        with open(os.path.join(path, relpath), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    fingerprint = digest.hexdigest()
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump({"signature": signature, "fingerprint": fingerprint}, f)
+    except OSError:
+        # Read-only model layer: fine, we just re-hash next start
+        pass
+    return fingerprint
+
+
+def download_model(name: str = DEFAULT_MODEL_NAME, target_dir: str = MODEL_DIR) -> str:
+    """Fetch a model snapshot from the hub once and save it for offline use (build time only)."""
+    import huggingface_hub.constants
+    from huggingface_hub import snapshot_download
+    huggingface_hub.constants.HF_HUB_OFFLINE = False
+
+    repo_id = name if "/" in name else f"sentence-transformers/{name}"
+    target = os.path.join(target_dir, os.path.basename(name))
+    print(f"Downloading {repo_id} to {target}...")
+    snapshot_download(repo_id, local_dir=target)
+    return target
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    model_name = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_NAME
+    if command == "download":
+        download_model(model_name)
+    elif command == "fingerprint":
+        print(model_fingerprint(model_name))
+    else:
+        print("Usage: python -m shl_recommender.src.models {download|fingerprint} [model_name]")
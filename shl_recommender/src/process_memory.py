@@ -0,0 +1,76 @@
+"""
+Per-process memory readings (RSS / PSS) from /proc, used to check that
+pre-forked workers really share the preloaded engine pages.
+
+PSS splits shared pages evenly between the processes mapping them, so the
+sum of PSS over master + workers is the real memory footprint, while RSS
+counts shared pages once per process.
+"""
+import os
+from typing import Dict, List, Optional
+
+
+def read_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """Memory figures in kB for one process (Linux only; empty dict elsewhere)."""
+    pid = pid or os.getpid()
+    fields = {"Rss": "rss_kb", "Pss": "pss_kb", "Shared_Clean": "shared_clean_kb",
+              "Shared_Dirty": "shared_dirty_kb", "Private_Clean": "private_clean_kb",
+              "Private_Dirty": "private_dirty_kb"}
+    stats: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    stats[fields[key]] = int(rest.split()[0])
+    except (OSError, ValueError):
+        # Older kernels: RSS only
+        try:
+            with open(f"/proc/{pid}/status", 'r') as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        stats["rss_kb"] = int(line.split()[1])
+        except OSError:
+            pass
+    return stats
+
+
+def read_cpu_seconds(pid: Optional[int] = None) -> float:
+    """User + system CPU time of one process in seconds (0.0 if unavailable)."""
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            # Fields after the ")" closing the command name; utime/stime are 14th/15th overall
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def child_pids(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", 'r') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def worker_group_memory(master_pid: int) -> Dict[str, object]:
+    """Memory of the master process and all of its workers, plus totals."""
+    processes = [{"pid": master_pid, "role": "master", **read_memory(master_pid)}]
+    for pid in child_pids(master_pid):
+        processes.append({"pid": pid, "role": "worker", **read_memory(pid)})
+    return {
+        "processes": processes,
+        "total_rss_kb": sum(p.get("rss_kb", 0) for p in processes),
+        "total_pss_kb": sum(p.get("pss_kb", 0) for p in processes),
+    }
+
+
+def format_memory_report(report: Dict[str, object]) -> str:
+    lines = []
+    for p in report["processes"]:
+        lines.append(f"  {p['role']:6s} pid={p['pid']:<7d} rss={p.get('rss_kb', 0) / 1024:8.1f}MB "
+                     f"pss={p.get('pss_kb', 0) / 1024:8.1f}MB")
+    lines.append(f"  total  rss={report['total_rss_kb'] / 1024:.1f}MB pss={report['total_pss_kb'] / 1024:.1f}MB")
+    return "\n".join(lines)
@@ -0,0 +1,215 @@
+"""
+On-demand profiling of single /recommend calls.
+
+A privileged request (matching X-Debug-Token, see app.py) sends `X-Profile: cpu` or `X-Profile: wall` (or an admin
+arms the next N requests via PUT /debug/profiles/arm) and that one call runs
+under a profiler:
+
+    cpu    cProfile on the request thread; download as .pstats
+           (python -m pstats, snakeviz)
+    wall   stack sampler on the request thread every SHL_PROFILE_INTERVAL_MS,
+           including time blocked on I/O such as LLM calls; download as
+           collapsed stacks (flamegraph.pl, speedscope)
+
+Only the request thread is profiled: work handed to other threads (encode
+batching, windowed rerank, catalog fan-out) shows up as the time spent waiting
+for it. Profiles are kept in a bounded in-memory buffer under the server-
+generated request id (reduced to [A-Za-z0-9_.-] for keys and filenames).
+Profiling is rate limited (one at a time, SHL_PROFILE_MAX_PER_MINUTE per
+worker), and requests over the limit are served unprofiled.
+
+Settings (environment variables):
+    SHL_PROFILE_MAX_PER_MINUTE  profiled requests per minute per worker (default 6)
+    SHL_PROFILE_INTERVAL_MS     wall-clock sampling interval (default 5)
+    SHL_PROFILE_BUFFER_SIZE     profiles kept in memory (default 20)
+"""
+import os
+import re
+import sys
+import time
+import marshal
+import cProfile
+import pstats
+import threading
+from collections import Counter as StackCounter, OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .observability import Counter
+
+MODES = ("cpu", "wall")
+
+UNSAFE_ID_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+PROFILES = Counter("shl_profiles_total", "Profiling requests, by mode and outcome.", ["mode", "outcome"])
+
+
+def safe_id(request_id: str) -> str:
+    """Request id usable as a buffer key and download filename."""
+    return UNSAFE_ID_CHARS.sub("_", request_id)[:64] or "profile"
+
+
+class Profile:
+    def __init__(self, request_id: str, mode: str, started_at: float, duration_ms: float, data: bytes,
+                 samples: Optional[int] = None):
+        self.request_id = safe_id(request_id)
+        self.mode = mode
+        self.started_at = started_at
+        self.duration_ms = duration_ms
+        self.data = data
+        self.samples = samples
+
+    @property
+    def filename(self) -> str:
+        return f"{self.request_id}.pstats" if self.mode == "cpu" else f"{self.request_id}.collapsed"
+
+    def summary(self) -> Dict:
+        return {
+            "request_id": self.request_id,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "bytes": len(self.data),
+            "samples": self.samples,
+            "filename": self.filename,
+        }
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: StackCounter = StackCounter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> bytes:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+class Profiler:
+    def __init__(self, max_per_minute: int = 6, interval_ms: float = 5.0, buffer_size: int = 20):
+        self.max_per_minute = max_per_minute
+        self.interval = interval_ms / 1000.0
+        self.buffer_size = buffer_size
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._recent: "deque[float]" = deque()
+        self._active = False
+        self._armed: List[str] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(
+            max_per_minute=int(os.environ.get("SHL_PROFILE_MAX_PER_MINUTE", "6")),
+            interval_ms=float(os.environ.get("SHL_PROFILE_INTERVAL_MS", "5")),
+            buffer_size=int(os.environ.get("SHL_PROFILE_BUFFER_SIZE", "20")),
+        )
+
+    def arm(self, mode: str, count: int = 1):
+        """Profile the next `count` requests (admin toggle)."""
+        with self._lock:
+            self._armed = [mode] * count
+
+    def armed(self) -> List[str]:
+        with self._lock:
+            return list(self._armed)
+
+    def take_armed(self) -> Optional[str]:
+        with self._lock:
+            return self._armed.pop(0) if self._armed else None
+
+    def _acquire(self) -> Optional[str]:
+        """None when profiling may start, otherwise why it may not."""
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self._active:
+                return "busy"
+            if len(self._recent) >= self.max_per_minute:
+                return "rate_limited"
+            self._active = True
+            self._recent.append(now)
+            return None
+
+    def _store(self, profile: Profile):
+        with self._lock:
+            self._active = False
+            self._profiles[profile.request_id] = profile
+            while len(self._profiles) > self.buffer_size:
+                self._profiles.popitem(last=False)
+
+    @contextmanager
+    def profile(self, request_id: str, mode: Optional[str]):
+        """
+        Profile the enclosed block in the current thread. Yields "profiled", or the
+        reason it was not ("rate_limited", "busy"), or None when no mode was requested.
+        """
+        if mode not in MODES:
+            yield None
+            return
+        refused = self._acquire()
+        if refused:
+            PROFILES.inc(mode=mode, outcome=refused)
+            yield refused
+            return
+
+        started_at = time.time()
+        start = time.perf_counter()
+        profiler = sampler = None
+        try:
+            if mode == "cpu":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                sampler = StackSampler(threading.get_ident(), self.interval)
+                sampler.start()
+            yield "profiled"
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            try:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.create_stats()
+                    # Same bytes pstats.Stats.dump_stats() writes
+                    data, samples = marshal.dumps(pstats.Stats(profiler).stats), None
+                else:
+                    sampler.stop()
+                    data, samples = sampler.collapsed(), sum(sampler.stacks.values())
+                self._store(Profile(request_id, mode, started_at, duration_ms, data, samples))
+                PROFILES.inc(mode=mode, outcome="profiled")
+            except Exception as e:
+                with self._lock:
+                    self._active = False
+                print(f"Failed to store profile {request_id}: {e}")
+
+    def recent(self, limit: int = 20) -> List[Profile]:
+        with self._lock:
+            return list(self._profiles.values())[-limit:][::-1]
+
+    def get(self, request_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._profiles.get(safe_id(request_id))
+
+
+PROFILER = Profiler.from_env()
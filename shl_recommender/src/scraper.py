@@ -6,7 +6,14 @@ import re
 import os
 
 BASE_URL = "https://www.shl.com/solutions/products/product-catalog/"
-OUTPUT_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "raw_assessments.json")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+OUTPUT_FILE = os.path.join(DATA_DIR, "raw_assessments.json")
+# Catalog listing types on the SHL site and where each one is saved (see catalogs.py)
+CATALOG_TYPES = {"individual": 1, "prepackaged": 2}
+CATALOG_OUTPUT_FILES = {
+    "individual": OUTPUT_FILE,
+    "prepackaged": os.path.join(DATA_DIR, "catalogs", "prepackaged", "raw_assessments.json"),
+}
 
 def get_soup(url):
     retries = 3
@@ -132,8 +139,7 @@ def scrape_product_details(url):
         remote_support = "Yes" if "remote" in full_text.lower() else "No"
         adaptive_support = "Yes" if "adaptive" in full_text.lower() else "No"
         
-        if "Pre-packaged Job Solutions" in full_text:
-            return None
+        solution_type = "prepackaged" if "Pre-packaged Job Solutions" in full_text else "individual"
             
         return {
             "name": name,
@@ -144,23 +150,27 @@ def scrape_product_details(url):
             "languages": languages,
             "test_type": test_type,
             "remote_support": remote_support,
-            "adaptive_support": adaptive_support
+            "adaptive_support": adaptive_support,
+            "solution_type": solution_type
         }
         
     except Exception as e:
         print(f"  Error parsing details: {e}")
         return None
 
-def scrape_catalog():
+def scrape_catalog(catalog="individual"):
+    """Scrape one catalog listing (individual tests or pre-packaged job solutions)."""
+    output_file = CATALOG_OUTPUT_FILES[catalog]
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
     assessments = []
     seen_urls = set()
     start = 0
     BATCH_SIZE = 12 # Updated batch size
     
     # Load existing data
-    if os.path.exists(OUTPUT_FILE):
+    if os.path.exists(output_file):
         try:
-            with open(OUTPUT_FILE, 'r') as f:
+            with open(output_file, 'r') as f:
                 assessments = json.load(f)
                 print(f"Loaded {len(assessments)} existing assessments.")
                 for item in assessments:
@@ -179,7 +189,7 @@ def scrape_catalog():
     
     while True:
         print(f"Scraping start={start}...")
-        url = f"{BASE_URL}?start={start}&type=1" # Updated URL structure
+        url = f"{BASE_URL}?start={start}&type={CATALOG_TYPES[catalog]}" # Updated URL structure
         soup = get_soup(url)
         
         if not soup:
@@ -214,15 +224,16 @@ def scrape_catalog():
             
             for link in product_links:
                 details = scrape_product_details(link)
-                if details:
+                if details and details["solution_type"] == catalog:
                     assessments.append(details)
                     # Save incrementally after each item to be safe
-                    with open(OUTPUT_FILE, 'w') as f:
+                    with open(output_file, 'w') as f:
                         json.dump(assessments, f, indent=2)
                 
         start += BATCH_SIZE
             
-    print(f"Final count: {len(assessments)} assessments saved to {OUTPUT_FILE}")
+    print(f"Final count: {len(assessments)} assessments saved to {output_file}")
 
 if __name__ == "__main__":
-    scrape_catalog()
+    import sys
+    scrape_catalog(sys.argv[1] if len(sys.argv) > 1 else "individual")
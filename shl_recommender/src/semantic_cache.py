@@ -0,0 +1,154 @@
+"""
+Semantic cache of final recommendations for near-duplicate queries.
+
+The raw query (before LLM expansion) is embedded and looked up in a small
+FAISS inner-product index of recently served queries. A cached result list is
+reused when cosine similarity clears the threshold AND the hard constraints
+extracted from both queries (duration limits, job levels, test types,
+languages, remote/adaptive) are identical. The engine adds the catalog id and
+its index version to those constraints, so entries from a replaced index are
+never served (and age out). Entries are evicted LRU and by TTL.
+
+Settings (environment variables, read by the engine):
+    SHL_SEMANTIC_CACHE            1 to enable (default 0)
+    SHL_SEMANTIC_CACHE_THRESHOLD  minimum cosine similarity (default 0.95)
+    SHL_SEMANTIC_CACHE_SIZE       max entries (default 1000)
+    SHL_SEMANTIC_CACHE_TTL        seconds an entry stays valid (default 3600)
+"""
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from .observability import Counter, Gauge
+
+CACHE_LOOKUPS = Counter(
+    "shl_semantic_cache_lookups_total", "Semantic cache lookups by result.", ["result"])
+CACHE_EVICTIONS = Counter(
+    "shl_semantic_cache_evictions_total", "Semantic cache evictions by reason.", ["reason"])
+CACHE_SIZE = Gauge("shl_semantic_cache_entries", "Entries currently in the semantic cache.")
+
+_DURATION_PATTERNS = [
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:-|to)\s*(\d+(?:\.\d+)?)\s*(?:min|mins|minutes)\b', re.I), 1),
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:min|mins|minutes)\b', re.I), 1),
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:hr|hrs|hour|hours)\b', re.I), 60),
+    (re.compile(r'\bhalf\s+an?\s+hour\b', re.I), 30),
+    (re.compile(r'\b(?:an|one)\s+hour\b', re.I), 60),
+]
+_KEYWORD_CONSTRAINTS = {
+    "job_levels": {
+        "entry": r'\bentry[- ]level\b|\bfreshers?\b|\bgraduates?\b|\bjunior\b',
+        "mid": r'\bmid[- ]level\b|\bmid[- ]professional\b|\bexperienced\b',
+        "senior": r'\bsenior\b|\blead\b',
+        "manager": r'\bmanagers?\b|\bsupervisors?\b',
+        "executive": r'\bexecutives?\b|\bdirectors?\b|\bcxo\b|\bcoo\b|\bceo\b',
+    },
+    "test_types": {
+        "ability": r'\bcognitive\b|\baptitude\b|\breasoning\b|\bnumerical\b|\bverbal\b',
+        "personality": r'\bpersonality\b|\bbehaviou?r(al)?\b',
+        "simulation": r'\bsimulations?\b|\bcoding tests?\b',
+        "knowledge": r'\bknowledge\b|\btechnical tests?\b',
+    },
+    "languages": {
+        lang: rf'\b{lang}\b' for lang in
+        ("english", "spanish", "french", "german", "chinese", "japanese", "portuguese", "arabic", "hindi")
+    },
+    "delivery": {
+        "remote": r'\bremote\b',
+        "adaptive": r'\badaptive\b',
+    },
+}
+
+
+def extract_constraints(query: str) -> Tuple:
+    """Hard constraints that must match exactly for two queries to share a cached result."""
+    text = query.lower()
+    durations = set()
+    for pattern, multiplier in _DURATION_PATTERNS:
+        for match in pattern.finditer(text):
+            numbers = [g for g in match.groups() if g] or ["1"]
+            for number in numbers:
+                durations.add(int(float(number) * multiplier))
+            # Avoid counting "40 minutes" again as part of a later pattern
+            text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+    constraints = [("duration", tuple(sorted(durations)))]
+    lowered = query.lower()
+    for group, patterns in _KEYWORD_CONSTRAINTS.items():
+        found = tuple(sorted(name for name, pattern in patterns.items() if re.search(pattern, lowered)))
+        constraints.append((group, found))
+    return tuple(constraints)
+
+
+class SemanticCache:
+    def __init__(self, dimension: int, threshold: float = 0.95, capacity: int = 1000,
+                 ttl_seconds: float = 3600.0):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        CACHE_SIZE.set(0)
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32').reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, entry_id: int, reason: str):
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.array([entry_id], dtype='int64'))
+        CACHE_EVICTIONS.inc(reason=reason)
+        CACHE_SIZE.set(len(self._entries))
+
+    def get(self, vector: np.ndarray, constraints: Tuple, top_n: int = 10) -> Optional[List[Dict]]:
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            if not self._entries:
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            similarities, ids = self._index.search(query, min(8, len(self._entries)))
+            for similarity, entry_id in zip(similarities[0], ids[0]):
+                if entry_id < 0 or similarity < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if now - entry["created"] > self.ttl_seconds:
+                    self._remove(int(entry_id), "ttl")
+                    continue
+                if entry["constraints"] != constraints or entry["top_n"] < top_n:
+                    continue
+                self._entries.move_to_end(int(entry_id))
+                CACHE_LOOKUPS.inc(result="hit")
+                return entry["results"][:top_n]
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(self, vector: np.ndarray, constraints: Tuple, results: List[Dict], top_n: int = 10, query: str = ""):
+        with self._lock:
+            while len(self._entries) >= self.capacity:
+                oldest = next(iter(self._entries))
+                self._remove(oldest, "lru")
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(self._normalize(vector), np.array([entry_id], dtype='int64'))
+            self._entries[entry_id] = {
+                "query": query, "constraints": constraints, "results": list(results),
+                "top_n": top_n, "created": time.time(),
+            }
+            CACHE_SIZE.set(len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
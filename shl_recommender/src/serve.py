@@ -0,0 +1,129 @@
+"""
+Pre-fork server for the recommender API.
+
+`uvicorn --workers N` starts every worker from scratch, so each one loads its
+own copy of the embedding model, FAISS index, metadata and BM25 index. Here
+the master process imports the app (building the engine) once, freezes the
+GC so collections in the workers do not touch the preloaded objects, binds
+the listening socket and forks the workers. Workers share the engine pages
+copy-on-write, and the FAISS index is mmap'd (see SHL_MMAP_INDEX).
+
+Usage (from the project root):
+    python -m shl_recommender.src.serve --workers 4 --port 7860
+
+The master restarts workers that die and logs per-process RSS/PSS every
+--memory-report-interval seconds; GET /debug/memory reports the same.
+"""
+import os
+import gc
+import sys
+import time
+import socket
+import signal
+import argparse
+
+from .process_memory import worker_group_memory, format_memory_report
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    # uvicorn installs its own SIGINT/SIGTERM handlers for graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(app, sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, log_level)
+        except Exception as e:
+            print(f"Worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"Started worker pid={pid}")
+    return pid
+
+
+def serve(host: str = "0.0.0.0", port: int = 7860, workers: int = 1,
+          log_level: str = "info", memory_report_interval: float = 60.0):
+    sock = bind_socket(host, port)
+
+    # The engine's thread budget splits the container's CPUs across the workers
+    os.environ["SHL_WORKERS"] = str(max(1, workers))
+    # Preload once in the master; workers inherit it copy-on-write
+    from .app import app
+    gc.collect()
+    gc.freeze()
+    os.environ["SHL_MASTER_PID"] = str(os.getpid())
+
+    if workers <= 1:
+        run_worker(app, sock, log_level)
+        return
+
+    children = set()
+    stopping = False
+
+    def handle_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    for _ in range(workers):
+        children.add(spawn_worker(app, sock, log_level))
+
+    last_report = time.monotonic()
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.discard(pid)
+            if not stopping:
+                print(f"Worker pid={pid} exited with status {status}; restarting.")
+                children.add(spawn_worker(app, sock, log_level))
+            continue
+        if memory_report_interval and time.monotonic() - last_report >= memory_report_interval:
+            last_report = time.monotonic()
+            print("Memory (master + workers):\n" + format_memory_report(worker_group_memory(os.getpid())))
+        time.sleep(0.5)
+
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server sharing one preloaded engine.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "7860")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SHL_WORKERS", "1")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--memory-report-interval", type=float,
+                        default=float(os.environ.get("SHL_MEMORY_REPORT_INTERVAL", "60")))
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.log_level, args.memory_report_interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Shadow evaluation of alternative pipeline configurations on live traffic.
+
+A sampled fraction of /recommend calls is mirrored, after the user's answer has
+been computed, to one or more engine variants (RecommendationEngine.variant)
+on a small dedicated executor. For every variant the runner records its
+latency, LLM calls and tokens, and how much of its top 10 overlaps the served
+top 10, next to the same numbers for the served request. GET /debug/shadow
+reports rolling aggregates.
+
+Shadow work never sits on the response path: mirroring only enqueues, the
+queue is bounded (further mirrors are dropped), nothing is mirrored while
+admission control has requests waiting, and variants share no batcher, cache
+or service metrics with the served pipeline. Shadows still spend CPU and LLM
+capacity, so keep the sample rate low on busy workers.
+
+Configurations (SHL_SHADOW_CONFIGS, a JSON list or the path of a JSON file):
+    [{"name": "no-expansion", "expansion": "off"},
+     {"name": "k10", "candidates": 10},
+     {"name": "windowed", "rerank_mode": "windowed"},
+     {"name": "minilm", "embedding_model": "all-MiniLM-L6-v2"},
+     {"name": "local-llm", "llm": {"provider": "openai", "base_url": "http://127.0.0.1:8080/v1"}}]
+Every key besides "name" is a variant setting (engine.VARIANT_SETTINGS).
+
+Settings (environment variables, per worker process):
+    SHL_SHADOW_CONFIGS      configurations to mirror to (default: none, shadow mode off)
+    SHL_SHADOW_SAMPLE_RATE  fraction of /recommend calls mirrored (default 0.05)
+    SHL_SHADOW_WORKERS      threads running shadow requests (default 1)
+    SHL_SHADOW_MAX_PENDING  mirrored requests waiting to run before new ones are dropped (default 16)
+    SHL_SHADOW_WINDOW       recent comparisons kept per configuration for the report (default 1000)
+"""
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import timing
+from .catalogs import UnknownCatalogError
+from .llm_providers import LLMUsage
+from .observability import Counter
+
+SHADOW_REQUESTS = Counter("shl_shadow_requests_total", "Shadow requests, by configuration and outcome.",
+                          ["config", "outcome"])
+SHADOW_DROPPED = Counter("shl_shadow_dropped_total", "Sampled requests not mirrored, by reason.", ["reason"])
+
+OVERLAP_K = 10
+
+
+def load_shadow_configs(value: Optional[str]) -> List[Dict[str, Any]]:
+    """Parse SHL_SHADOW_CONFIGS: inline JSON or a path to a JSON file."""
+    if not value:
+        return []
+    if not value.lstrip().startswith("["):
+        with open(value, 'r') as f:
+            value = f.read()
+    configs = json.loads(value)
+    names = [config.get("name") for config in configs]
+    if not all(names) or len(set(names)) != len(names):
+        raise ValueError("Every shadow configuration needs a unique 'name'")
+    return configs
+
+
+def _latency_summary(seconds: np.ndarray) -> Dict[str, float]:
+    return {
+        "p50": round(float(np.percentile(seconds, 50)) * 1000, 1),
+        "p95": round(float(np.percentile(seconds, 95)) * 1000, 1),
+        "mean": round(float(seconds.mean()) * 1000, 1),
+    }
+
+
+class ShadowStats:
+    """Rolling comparisons of one configuration against the served pipeline."""
+
+    # Columns of a comparison row
+    FIELDS = ("seconds", "primary_seconds", "overlap", "identical", "calls", "input_tokens", "output_tokens",
+              "primary_calls", "primary_input_tokens", "primary_output_tokens")
+
+    def __init__(self, window: int):
+        self.rows: "deque[tuple]" = deque(maxlen=window)
+        self.outcomes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def add(self, row: tuple):
+        with self._lock:
+            self.rows.append(row)
+            self.outcomes["ok"] = self.outcomes.get("ok", 0) + 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = list(self.rows)
+            report = {"outcomes": dict(self.outcomes), "compared": len(rows)}
+        if not rows:
+            return report
+        data = dict(zip(self.FIELDS, np.array(rows, dtype=np.float64).T))
+        report.update({
+            "latency_ms": _latency_summary(data["seconds"]),
+            "primary_latency_ms": _latency_summary(data["primary_seconds"]),
+            "latency_ratio": round(float(data["seconds"].sum() / max(data["primary_seconds"].sum(), 1e-9)), 3),
+            f"overlap_at_{OVERLAP_K}": round(float(data["overlap"].mean()), 4),
+            f"identical_top_{OVERLAP_K}": round(float(data["identical"].mean()), 4),
+            "llm_per_request": {
+                "calls": round(float(data["calls"].mean()), 2),
+                "input_tokens": round(float(data["input_tokens"].mean()), 1),
+                "output_tokens": round(float(data["output_tokens"].mean()), 1),
+            },
+            "primary_llm_per_request": {
+                "calls": round(float(data["primary_calls"].mean()), 2),
+                "input_tokens": round(float(data["primary_input_tokens"].mean()), 1),
+                "output_tokens": round(float(data["primary_output_tokens"].mean()), 1),
+            },
+        })
+        return report
+
+
+class ShadowRunner:
+    def __init__(self, engine: Any, configs: List[Dict[str, Any]], sample_rate: float = 0.05, workers: int = 1,
+                 max_pending: int = 16, window: int = 1000, busy: Optional[Callable[[], bool]] = None):
+        self.engine = engine
+        self.configs = configs
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.busy = busy
+        self.stats = {config["name"]: ShadowStats(window) for config in configs}
+        self._variants: Dict[str, Any] = {}
+        self._variant_lock = threading.Lock()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow") if configs else None
+        # Overrides are validated now so a bad configuration fails at startup, not in the background
+        for config in configs:
+            engine.variant({key: value for key, value in config.items()
+                            if key not in ("name", "embedding_model", "llm")})
+
+    @classmethod
+    def from_env(cls, engine: Any, busy: Optional[Callable[[], bool]] = None) -> "ShadowRunner":
+        return cls(
+            engine,
+            load_shadow_configs(os.environ.get("SHL_SHADOW_CONFIGS")),
+            sample_rate=float(os.environ.get("SHL_SHADOW_SAMPLE_RATE", "0.05")),
+            workers=int(os.environ.get("SHL_SHADOW_WORKERS", "1")),
+            max_pending=int(os.environ.get("SHL_SHADOW_MAX_PENDING", "16")),
+            window=int(os.environ.get("SHL_SHADOW_WINDOW", "1000")),
+            busy=busy,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.configs) and self.sample_rate > 0
+
+    def _variant(self, config: Dict[str, Any]) -> Any:
+        """Built on first use, on a shadow thread (an embedding-model variant may need to ingest)."""
+        name = config["name"]
+        with self._variant_lock:
+            if name not in self._variants:
+                self._variants[name] = self.engine.variant(
+                    {key: value for key, value in config.items() if key != "name"})
+            return self._variants[name]
+
+    def sampled(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def mirror(self, query: str, catalog: Optional[str], catalogs: Optional[List[str]], results: List[Dict],
+               primary_seconds: float, primary_usage: LLMUsage) -> bool:
+        """Queue one served request for every configuration. Never blocks; returns False when dropped."""
+        if self.busy is not None and self.busy():
+            SHADOW_DROPPED.inc(reason="busy")
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                SHADOW_DROPPED.inc(reason="queue_full")
+                return False
+            self._pending += 1
+        primary = [item['url'] for item in results[:OVERLAP_K]]
+        self._executor.submit(self._run, query, catalog, catalogs, primary, primary_seconds, primary_usage)
+        return True
+
+    def _run(self, query: str, catalog: Optional[str], catalogs: Optional[List[str]], primary: List[str],
+             primary_seconds: float, primary_usage: LLMUsage):
+        try:
+            for config in self.configs:
+                self._run_config(config, query, catalog, catalogs, primary, primary_seconds, primary_usage)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _run_config(self, config: Dict[str, Any], query: str, catalog: Optional[str],
+                    catalogs: Optional[List[str]], primary: List[str], primary_seconds: float,
+                    primary_usage: LLMUsage):
+        name = config["name"]
+        stats = self.stats[name]
+        usage = LLMUsage()
+        try:
+            variant = self._variant(config)
+            # Kept out of the stage latency / fallback metrics of the served pipeline
+            with timing.collect(observe=False):
+                start = time.perf_counter()
+                if catalogs:
+                    results = variant.recommend_fanout(query, catalogs, top_n=OVERLAP_K, usage=usage)
+                else:
+                    results = variant.recommend(query, top_n=OVERLAP_K, catalog=catalog, usage=usage)
+                seconds = time.perf_counter() - start
+        except UnknownCatalogError:
+            # e.g. an embedding-model variant asked for a catalog it does not index
+            stats.count("skipped")
+            SHADOW_REQUESTS.inc(config=name, outcome="skipped")
+            return
+        except Exception as e:
+            print(f"Shadow configuration '{name}' failed: {e}")
+            stats.count("error")
+            SHADOW_REQUESTS.inc(config=name, outcome="error")
+            return
+        urls = [item['url'] for item in results[:OVERLAP_K]]
+        overlap = len(set(urls) & set(primary)) / max(len(primary), 1)
+        stats.add((seconds, primary_seconds, overlap, float(urls == primary), usage.calls, usage.input_tokens,
+                   usage.output_tokens, primary_usage.calls, primary_usage.input_tokens,
+                   primary_usage.output_tokens))
+        SHADOW_REQUESTS.inc(config=name, outcome="ok")
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending
+        return {
+            "sample_rate": self.sample_rate,
+            "pending": pending,
+            "configs": [
+                dict(name=config["name"], overrides={k: v for k, v in config.items() if k != "name"},
+                     **self.stats[config["name"]].report())
+                for config in self.configs
+            ],
+        }
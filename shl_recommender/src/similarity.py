@@ -0,0 +1,176 @@
+"""
+Precomputed "more like this" graph over a catalog.
+
+ingest.py stores, for every assessment, its top-K neighbours by a blend of
+embedding cosine similarity and BM25 term overlap (BM25 score of the other
+assessment with this one's tokens as the query, divided by its self-score so
+it lands in [0, 1]). Serving a neighbour list is a dict lookup plus a filter
+over K entries.
+
+Rebuilds are incremental: only assessments that are new or changed (by content
+hash) are scored against the whole catalog; every other row keeps its stored
+neighbours and is only re-scored against the changed ones, unless one of its
+neighbours changed or was removed. Stored scores are not refreshed when the
+BM25 IDF statistics drift, so rebuild every row (`ingest --full`) after large
+catalog changes.
+
+Settings (environment variables):
+    SHL_SIMILAR_NEIGHBORS     neighbours stored per assessment (default 30)
+    SHL_SIMILAR_DENSE_WEIGHT  weight of cosine similarity vs BM25 overlap (default 0.7)
+"""
+import os
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from .catalog_store import has_any
+
+GRAPH_NEIGHBORS = int(os.environ.get("SHL_SIMILAR_NEIGHBORS", "30"))
+DENSE_WEIGHT = float(os.environ.get("SHL_SIMILAR_DENSE_WEIGHT", "0.7"))
+
+
+class UnknownAssessmentError(KeyError):
+    pass
+
+
+def assessment_id(item: Dict) -> str:
+    """Stable id of an assessment: the last path segment of its catalog URL."""
+    return item['url'].rstrip('/').split('/')[-1]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class SimilarityGraph:
+    def __init__(self, keys: List[str], hashes: List[str], neighbors: np.ndarray, scores: np.ndarray,
+                 dense_weight: float = DENSE_WEIGHT):
+        self.keys = list(keys)
+        self.hashes = list(hashes)
+        self.neighbors = neighbors
+        self.scores = scores
+        self.dense_weight = dense_weight
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        # Python lists: per-request lookups stay in the microsecond range
+        self._neighbor_lists = neighbors.tolist()
+        self._score_lists = scores.tolist()
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def save(self, path: str):
+        np.savez(path, keys=np.array(self.keys), hashes=np.array(self.hashes), neighbors=self.neighbors,
+                 scores=self.scores, dense_weight=np.array(self.dense_weight))
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityGraph":
+        with np.load(path) as data:
+            return cls(data["keys"].tolist(), data["hashes"].tolist(), data["neighbors"], data["scores"],
+                       float(data["dense_weight"]))
+
+    def similar(self, key: str, metadata: List[Dict], limit: int = 10, max_duration: Optional[int] = None,
+                test_types: Optional[Iterable[str]] = None) -> List[Tuple[int, float]]:
+        """
+        (row, score) of the nearest neighbours of `key`, best first. Assessments with
+        an unknown duration (0) pass the duration filter; test_types matches any.
+        """
+        row = self.rows.get(key)
+        if row is None:
+            raise UnknownAssessmentError(f"Unknown assessment '{key}'")
+        wanted = set(test_types) if test_types else None
+        results = []
+        for neighbor, score in zip(self._neighbor_lists[row], self._score_lists[row]):
+            if neighbor < 0:
+                break
+            item = metadata[neighbor]
+            if max_duration is not None and item.get('duration', 0) > max_duration:
+                continue
+            if wanted is not None and not has_any(item, 'test_type', wanted):
+                continue
+            results.append((neighbor, score))
+            if len(results) >= limit:
+                break
+        return results
+
+
+class _PairScorer:
+    """Blended similarity between catalog rows."""
+
+    def __init__(self, embeddings: np.ndarray, tokens: List[List[str]], dense_weight: float):
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.unit = embeddings / np.maximum(norms, 1e-12)
+        self.tokens = tokens
+        self.bm25 = BM25Okapi(tokens)
+        self.dense_weight = dense_weight
+
+    def scores(self, row: int, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        """Similarity of `row` to `columns` (default: every row)."""
+        if columns is None:
+            dense = self.unit @ self.unit[row]
+            lexical = np.asarray(self.bm25.get_scores(self.tokens[row]))
+        else:
+            dense = self.unit[columns] @ self.unit[row]
+            lexical = np.asarray(self.bm25.get_batch_scores(self.tokens[row], columns.tolist()))
+        self_score = self.bm25.get_batch_scores(self.tokens[row], [row])[0]
+        lexical = np.clip(lexical / self_score, 0.0, 1.0) if self_score > 0 else np.zeros_like(dense)
+        return self.dense_weight * dense + (1.0 - self.dense_weight) * lexical
+
+
+def _top_k(row: int, columns: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    keep = columns != row
+    columns, scores = columns[keep], scores[keep]
+    # Highest score first, ties by row for a deterministic graph
+    order = np.lexsort((columns, -scores))[:k]
+    neighbors = np.full(k, -1, dtype=np.int32)
+    top_scores = np.zeros(k, dtype=np.float32)
+    neighbors[:len(order)] = columns[order]
+    top_scores[:len(order)] = scores[order]
+    return neighbors, top_scores
+
+
+def build_similarity_graph(embeddings: np.ndarray, tokens: List[List[str]], keys: List[str], hashes: List[str],
+                           k: int = GRAPH_NEIGHBORS, dense_weight: float = DENSE_WEIGHT,
+                           previous: Optional[SimilarityGraph] = None) -> Tuple[SimilarityGraph, int]:
+    """Build the graph, reusing rows of `previous` where possible. Returns (graph, rows recomputed)."""
+    n = len(keys)
+    k = min(k, max(n - 1, 0))
+    scorer = _PairScorer(embeddings, tokens, dense_weight)
+    everything = np.arange(n)
+    if previous is not None and (previous.k != k or previous.dense_weight != dense_weight):
+        previous = None
+
+    changed = np.ones(n, dtype=bool)
+    old_to_new: Dict[int, int] = {}
+    if previous is not None:
+        for row, (key, digest) in enumerate(zip(keys, hashes)):
+            old_row = previous.rows.get(key)
+            if old_row is not None and previous.hashes[old_row] == digest:
+                changed[row] = False
+                old_to_new[old_row] = row
+    changed_rows = np.flatnonzero(changed)
+
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    recomputed = 0
+    for row in range(n):
+        old_row = None if changed[row] else previous.rows[keys[row]]
+        if old_row is not None:
+            stored = [c for c in previous.neighbors[old_row].tolist() if c >= 0]
+            # A stored neighbour that changed or was removed invalidates the row
+            if any(c not in old_to_new for c in stored):
+                old_row = None
+        if old_row is None:
+            neighbors[row], scores[row] = _top_k(row, everything, scorer.scores(row), k)
+            recomputed += 1
+            continue
+        # Unchanged row: merge its stored neighbours with the changed rows
+        columns = np.array([old_to_new[c] for c in stored], dtype=np.int64)
+        candidate_scores = previous.scores[old_row][:len(stored)].astype(np.float64)
+        if len(changed_rows):
+            columns = np.concatenate([columns, changed_rows])
+            candidate_scores = np.concatenate([candidate_scores, scorer.scores(row, changed_rows)])
+        neighbors[row], scores[row] = _top_k(row, columns, candidate_scores, k)
+    return SimilarityGraph(keys, hashes, neighbors, scores, dense_weight), recomputed
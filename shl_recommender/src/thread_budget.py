@@ -0,0 +1,149 @@
+"""
+CPU thread budget for one worker process.
+
+torch (intra-op threads for model.encode), FAISS (OpenMP) and the request
+threadpool each default to one thread per host core. In a container with a
+CPU quota of a few cores on a large host, concurrent requests then run far more
+runnable threads than there are CPUs. The kernel throttles the quota, and
+latency grows with traffic. The budget is derived from the CPUs the container
+may actually use (cgroup v2 cpu.max or v1 cfs quota, capped by the CPU
+affinity mask), split across the pre-forked workers, and applied once at engine
+startup:
+
+    torch intra-op    CPUs per worker          torch.set_num_threads
+    torch inter-op    1                        torch.set_num_interop_threads
+    FAISS OpenMP      CPUs per worker          faiss.omp_set_num_threads
+    encode            1 concurrent encode      unbatched model.encode calls (the
+                                               batcher is already one thread)
+    I/O threads       8 per CPU, 40..128       AnyIO threadpool running requests,
+                                               which mostly wait on LLM calls
+
+experiments/bench_thread_budget.py sweeps budgets under concurrent load.
+
+Settings (environment variables, per worker process):
+    SHL_THREAD_BUDGET          0 to leave every library at its own default (default 1)
+    SHL_CPU_LIMIT              CPUs available (default: cgroup quota, else affinity)
+    SHL_WORKERS                workers sharing those CPUs (default 1, set by serve.py)
+    SHL_TORCH_THREADS          torch intra-op threads
+    SHL_TORCH_INTEROP_THREADS  torch inter-op threads
+    SHL_FAISS_THREADS          FAISS OpenMP threads
+    SHL_ENCODE_THREADS         concurrent unbatched encodes
+    SHL_THREADPOOL_SIZE        request / blocking I/O threads
+"""
+import os
+import math
+from typing import Dict, Optional
+
+from .observability import Gauge
+
+THREAD_BUDGET = Gauge("shl_thread_budget", "Threads allowed per pool in this worker.", ["pool"])
+CPU_LIMIT = Gauge("shl_cpu_limit", "CPUs available to this container (cgroup quota or affinity).")
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_v2_dirs():
+    """This process's own cgroup v2 directory (if visible), then the namespace root."""
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        if line.startswith("0::"):
+            yield os.path.join(CGROUP_ROOT, line[3:].lstrip("/"))
+    yield CGROUP_ROOT
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota, or None when unlimited or unknown."""
+    for directory in _cgroup_v2_dirs():
+        value = _read(os.path.join(directory, "cpu.max"))
+        if value:
+            quota, _, period = value.partition(" ")
+            if quota == "max":
+                return None
+            return int(quota) / int(period or 100000)
+    for directory in ("cpu", "cpu,cpuacct"):
+        quota = _read(os.path.join(CGROUP_ROOT, directory, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(CGROUP_ROOT, directory, "cpu.cfs_period_us"))
+        if quota and period:
+            return int(quota) / int(period) if int(quota) > 0 else None
+    return None
+
+
+def available_cpus() -> float:
+    """CPUs this process may use: the cgroup quota, capped by the affinity mask."""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+    quota = cgroup_cpu_quota()
+    return min(cpus, quota) if quota else cpus
+
+
+class ThreadBudget:
+    def __init__(self, cpus: float, workers: int = 1, torch_threads: Optional[int] = None,
+                 torch_interop_threads: int = 1, faiss_threads: Optional[int] = None, encode_threads: int = 1,
+                 io_threads: Optional[int] = None, enabled: bool = True):
+        self.cpus = cpus
+        self.workers = max(1, workers)
+        per_worker = max(1, math.floor(cpus / self.workers))
+        self.torch_threads = torch_threads or per_worker
+        self.torch_interop_threads = torch_interop_threads
+        self.faiss_threads = faiss_threads or per_worker
+        self.encode_threads = encode_threads
+        self.io_threads = io_threads or min(128, max(40, 8 * per_worker))
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls) -> "ThreadBudget":
+        def optional_int(name):
+            value = os.environ.get(name)
+            return int(value) if value else None
+
+        cpu_limit = os.environ.get("SHL_CPU_LIMIT")
+        return cls(
+            cpus=float(cpu_limit) if cpu_limit else available_cpus(),
+            workers=int(os.environ.get("SHL_WORKERS", "1")),
+            torch_threads=optional_int("SHL_TORCH_THREADS"),
+            torch_interop_threads=int(os.environ.get("SHL_TORCH_INTEROP_THREADS", "1")),
+            faiss_threads=optional_int("SHL_FAISS_THREADS"),
+            encode_threads=int(os.environ.get("SHL_ENCODE_THREADS", "1")),
+            io_threads=optional_int("SHL_THREADPOOL_SIZE"),
+            enabled=os.environ.get("SHL_THREAD_BUDGET", "1") == "1",
+        )
+
+    def pools(self) -> Dict[str, int]:
+        return {"torch": self.torch_threads, "torch_interop": self.torch_interop_threads,
+                "faiss": self.faiss_threads, "encode": self.encode_threads, "io": self.io_threads}
+
+    def apply(self):
+        """Set torch and FAISS thread counts. Call before the first encode or search."""
+        CPU_LIMIT.set(self.cpus)
+        if not self.enabled:
+            print(f"Thread budget disabled ({self.cpus:g} CPUs available); library defaults apply.")
+            return
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        if torch is not None:
+            torch.set_num_threads(self.torch_threads)
+            try:
+                torch.set_num_interop_threads(self.torch_interop_threads)
+            except RuntimeError as e:
+                # Only settable before torch starts inter-op work
+                print(f"Could not set torch inter-op threads: {e}")
+        try:
+            import faiss
+            faiss.omp_set_num_threads(self.faiss_threads)
+        except ImportError:
+            pass
+        for pool, threads in self.pools().items():
+            THREAD_BUDGET.set(threads, pool=pool)
+        print(f"Thread budget: {self.cpus:g} CPUs / {self.workers} worker(s) -> "
+              + ", ".join(f"{pool} {threads}" for pool, threads in self.pools().items()))
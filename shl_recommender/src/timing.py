@@ -0,0 +1,69 @@
+"""
+Lightweight per-stage timing for the recommendation pipeline.
+
+Engine stages are wrapped in `stage(name)`. Durations are added to the
+timings dict of the enclosing `collect()` block (if any) and passed to every
+registered observer, so benchmarks, metrics and tracing all share one hook.
+`collect(observe=False)` keeps a block's stages out of the observers (shadow
+requests must not show up in the served latency metrics).
+"""
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+_current_timings = contextvars.ContextVar("stage_timings", default=None)
+_observe = contextvars.ContextVar("stage_observe", default=True)
+_observers: List[Callable[[str, float], None]] = []
+
+
+def add_observer(observer: Callable[[str, float], None]):
+    """Register a callback invoked as observer(stage_name, seconds) for every stage."""
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def remove_observer(observer: Callable[[str, float], None]):
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+def record(name: str, seconds: float):
+    """Record a duration measured elsewhere (e.g. on a batching thread) for the current request."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+    if not _observe.get():
+        return
+    for observer in _observers:
+        try:
+            observer(name, seconds)
+        except Exception as e:
+            print(f"Timing observer failed for stage {name}: {e}")
+
+
+def observed() -> bool:
+    """False inside collect(observe=False): the work must not be counted in service metrics."""
+    return _observe.get()
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect(observe: bool = True):
+    """Collect stage durations (seconds) for everything run inside this block."""
+    timings: Dict[str, float] = {}
+    token = _current_timings.set(timings)
+    observe_token = _observe.set(observe)
+    try:
+        yield timings
+    finally:
+        _observe.reset(observe_token)
+        _current_timings.reset(token)
@@ -0,0 +1,202 @@
+"""
+Per-request tracing for /recommend.
+
+A trace is started per sampled request and collects one span per pipeline
+stage (from the timing.stage() hook) plus stage attributes added by the
+engine via annotate(): inputs/outputs (truncated), candidate lists, prompt
+sizes and fallback reasons. Finished traces are kept in a bounded in-memory
+ring buffer and optionally appended to a JSONL file.
+
+Settings (environment variables):
+    SHL_TRACE_SAMPLE_RATE   fraction of requests traced (default 0.1)
+    SHL_TRACE_BUFFER_SIZE   traces kept in memory (default 200)
+    SHL_TRACE_EXPORT_FILE   optional JSONL file every finished trace is appended to
+"""
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from . import timing
+
+MAX_STRING_LENGTH = 500
+MAX_LIST_ITEMS = 20
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _truncate(value: Any) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= MAX_STRING_LENGTH else value[:MAX_STRING_LENGTH] + "...[truncated]"
+    if isinstance(value, (list, tuple)):
+        return [_truncate(v) for v in value[:MAX_LIST_ITEMS]]
+    if isinstance(value, dict):
+        return {k: _truncate(v) for k, v in value.items()}
+    if hasattr(value, "item"):
+        # numpy scalars
+        return value.item()
+    return value
+
+
+class Trace:
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.spans: List[Dict[str, Any]] = []
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, seconds: float):
+        end = time.perf_counter() - self._start
+        with self._lock:
+            span = {
+                "stage": stage,
+                "start_ms": round((end - seconds) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3),
+            }
+            attributes = self._pending.pop(stage, None)
+            if attributes:
+                span["attributes"] = attributes
+            self.spans.append(span)
+
+    def annotate(self, stage: Optional[str], attributes: Dict[str, Any]):
+        attributes = _truncate(attributes)
+        with self._lock:
+            if stage is None:
+                self.attributes.update(attributes)
+                return
+            # Attach to the stage's span if it already closed, otherwise hold until it does
+            for span in reversed(self.spans):
+                if span["stage"] == stage:
+                    span.setdefault("attributes", {}).update(attributes)
+                    return
+            self._pending.setdefault(stage, {}).update(attributes)
+
+    def finish(self, status: int):
+        self.status = status
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        with self._lock:
+            # Attributes for stages that never closed (e.g. an exception mid-stage)
+            for stage, attributes in self._pending.items():
+                self.spans.append({"stage": stage, "attributes": attributes})
+            self._pending = {}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "fallbacks": self.attributes.get("fallbacks", []),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.summary()
+        data["attributes"] = self.attributes
+        data["spans"] = self.spans
+        return data
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.1, buffer_size: int = 200, export_file: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.export_file = export_file
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def should_sample(self, force: bool = False) -> bool:
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def trace(self, name: str, request_id: Optional[str] = None, force: bool = False):
+        """Trace the enclosed block if sampled. Yields the Trace, or None when not sampled."""
+        if not self.should_sample(force):
+            yield None
+            return
+        trace = Trace(request_id or uuid.uuid4().hex, name)
+        token = _current_trace.set(trace)
+        status = 500
+        try:
+            yield trace
+            status = 200
+        except Exception as e:
+            status = getattr(e, "status_code", 500)
+            trace.annotate(None, {"error": repr(e)})
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.finish(trace.status or status)
+            self._store(trace)
+
+    def _store(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            while len(self._traces) > self.buffer_size:
+                self._traces.popitem(last=False)
+        if self.export_file:
+            try:
+                with self._lock, open(self.export_file, 'a') as f:
+                    f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+            except Exception as e:
+                print(f"Failed to export trace {trace.request_id}: {e}")
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(request_id)
+
+    def recent(self, limit: int = 50) -> List[Trace]:
+        with self._lock:
+            traces = list(self._traces.values())
+        return traces[::-1][:limit]
+
+
+TRACER = Tracer(
+    sample_rate=float(os.environ.get("SHL_TRACE_SAMPLE_RATE", "0.1")),
+    buffer_size=int(os.environ.get("SHL_TRACE_BUFFER_SIZE", "200")),
+    export_file=os.environ.get("SHL_TRACE_EXPORT_FILE") or None,
+)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def active() -> bool:
+    """True when the current request is being traced; use it to skip building expensive attributes."""
+    return _current_trace.get() is not None
+
+
+def annotate(stage: Optional[str] = None, **attributes):
+    """Attach attributes to the span of `stage` (or to the trace itself when stage is None)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.annotate(stage, attributes)
+
+
+def record_fallback(stage: str, reason: str):
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.attributes.setdefault("fallbacks", []).append({"stage": stage, "reason": reason})
+
+
+def _observe_stage(name: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, seconds)
+
+
+timing.add_observer(_observe_stage)
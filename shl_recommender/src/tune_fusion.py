@@ -0,0 +1,144 @@
+"""
+Offline tuner for hybrid_search fusion parameters.
+
+Scores every train.csv query against the full catalog once (BM25 and FAISS),
+caches the score matrices, then grid-searches fusion configs. Every config is
+scored with fusion.fuse_scores over the whole (queries x documents) matrix, the
+same code the engine runs, so each configuration costs milliseconds. The best
+Recall@10 setting is written to fusion_config.json, which RecommendationEngine
+loads at startup; its Recall@10 is only printed.
+
+Usage (from the project root):
+    python -m shl_recommender.src.tune_fusion [--rebuild] [--k 10] [--dry-run]
+"""
+import os
+import time
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Tuple
+
+from .fusion import FUSION_CONFIG_FILE, DEFAULT_FUSION_CONFIG, fuse_scores, top_k_indices, save_fusion_config
+from .metrics import normalize_url
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+TRAIN_FILE = os.path.join(DATA_DIR, "train.csv")
+CACHE_FILE = os.path.join(DATA_DIR, "fusion_cache.npz")
+
+RRF_KS = [5, 10, 20, 30, 60, 100]
+BM25_WEIGHTS = [0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0]
+DEPTHS = [10, 20, 50, None]
+NORMALIZATIONS = ["minmax", "zscore"]
+ALPHAS = [round(float(a), 2) for a in np.arange(0.0, 1.01, 0.05)]
+
+
+def build_score_cache(train_file: str = TRAIN_FILE, cache_file: str = CACHE_FILE):
+    """Run expansion + BM25 + FAISS for every training query and cache the full score matrices."""
+    from .engine import RecommendationEngine
+
+    gt_df = pd.read_csv(train_file)
+    gt_grouped = gt_df.groupby('Query')['Assessment_url'].apply(list).to_dict()
+    queries = list(gt_grouped.keys())
+
+    engine = RecommendationEngine()
+    catalog_urls = [normalize_url(item['url']) for item in engine.metadata]
+
+    bm25_rows, dense_rows, relevant_rows = [], [], []
+    for i, query in enumerate(queries):
+        print(f"Scoring query {i + 1}/{len(queries)}...")
+        expanded = engine.expand_query(query)
+        bm25_rows.append(engine.bm25_scores(expanded))
+        dense_rows.append(engine.dense_scores(expanded))
+        gt_set = set(normalize_url(u) for u in gt_grouped[query])
+        relevant_rows.append([url in gt_set for url in catalog_urls])
+
+    np.savez(
+        cache_file,
+        queries=np.array(queries),
+        bm25=np.vstack(bm25_rows),
+        dense=np.vstack(dense_rows),
+        relevant=np.array(relevant_rows, dtype=bool),
+    )
+    print(f"Saved score cache for {len(queries)} queries to {cache_file}")
+
+
+def load_score_cache(cache_file: str = CACHE_FILE) -> Dict[str, np.ndarray]:
+    with np.load(cache_file) as data:
+        return {key: data[key] for key in data.files}
+
+
+def recall_at_k(fused: np.ndarray, relevant: np.ndarray, k: int = 10) -> float:
+    """Mean Recall@K over queries that have at least one relevant catalog document."""
+    n_relevant = relevant.sum(axis=1)
+    mask = n_relevant > 0
+    top = top_k_indices(fused[mask], k)
+    hits = np.take_along_axis(relevant[mask], top, axis=1).sum(axis=1)
+    return float(np.mean(hits / n_relevant[mask])) if mask.any() else 0.0
+
+
+def candidate_configs() -> List[Dict[str, Any]]:
+    configs = []
+    for rrf_k, weight, depth in itertools.product(RRF_KS, BM25_WEIGHTS, DEPTHS):
+        configs.append({"strategy": "rrf", "rrf_k": rrf_k, "bm25_weight": weight,
+                        "dense_weight": 1.0, "depth": depth})
+    for method, weight in itertools.product(NORMALIZATIONS, BM25_WEIGHTS):
+        configs.append({"strategy": "combsum", "normalization": method,
+                        "bm25_weight": weight, "dense_weight": 1.0})
+    for method, weight, depth in itertools.product(NORMALIZATIONS, BM25_WEIGHTS, DEPTHS):
+        configs.append({"strategy": "combmnz", "normalization": method,
+                        "bm25_weight": weight, "dense_weight": 1.0, "depth": depth})
+    for method, alpha in itertools.product(NORMALIZATIONS, ALPHAS):
+        configs.append({"strategy": "convex", "normalization": method, "alpha": alpha})
+    return configs
+
+
+def grid_search(cache: Dict[str, np.ndarray], k: int = 10) -> List[Tuple[float, Dict[str, Any]]]:
+    """Score every candidate config with fuse_scores, exactly as the engine would fuse it."""
+    bm25, dense, relevant = cache["bm25"], cache["dense"], cache["relevant"]
+    results = []
+    for config in candidate_configs():
+        results.append((recall_at_k(fuse_scores(bm25, dense, config), relevant, k), config))
+
+    # Stable sort keeps the earlier (simpler) config on ties
+    results.sort(key=lambda r: r[0], reverse=True)
+    return results
+
+
+def tune(rebuild: bool = False, k: int = 10, save: bool = True) -> Dict[str, Any]:
+    if rebuild or not os.path.exists(CACHE_FILE):
+        build_score_cache()
+    cache = load_score_cache()
+    print(f"Loaded cached scores: {cache['bm25'].shape[0]} queries x {cache['bm25'].shape[1]} documents")
+
+    baseline_recall = recall_at_k(
+        fuse_scores(cache["bm25"], cache["dense"], DEFAULT_FUSION_CONFIG), cache["relevant"], k)
+
+    start = time.perf_counter()
+    results = grid_search(cache, k)
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(results)} configs in {elapsed:.2f}s "
+          f"({elapsed / len(results) * 1000:.2f} ms/config)")
+
+    print(f"\nBaseline (default RRF): Recall@{k} = {baseline_recall:.4f}")
+    print(f"Top configs by Recall@{k}:")
+    for score, config in results[:10]:
+        print(f"  {score:.4f}  {config}")
+
+    best_recall, best_config = results[0]
+    print(f"\nBest: Recall@{k} = {best_recall:.4f}  {best_config}")
+    if save:
+        save_fusion_config(best_config, FUSION_CONFIG_FILE)
+        print(f"\nSaved best config to {FUSION_CONFIG_FILE}")
+    return best_config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid-search hybrid_search fusion parameters.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the cached score matrices")
+    parser.add_argument("--k", type=int, default=10, help="Cutoff for Recall@K")
+    parser.add_argument("--dry-run", action="store_true", help="Do not write fusion_config.json")
+    args = parser.parse_args()
+    tune(rebuild=args.rebuild, k=args.k, save=not args.dry_run)